@@ -7,6 +7,7 @@ from options_monitor.utilities_hv import sort_hv20250
 from options_monitor.schedule_manager import ScheduleManager
 from options_monitor.util_dingding import send_html_msg, scp_data
 from options_monitor.data_manager import calendar_manager, SIVManager
+from options_monitor.utilities_options import IVSolverMode
 from options_monitor.logger import logger
 from datetime import datetime
 from time import sleep
@@ -22,11 +23,15 @@ class MonitorScheduleManager(ScheduleManager):
     _crontab = f'05 {SCHEDULE_HOUR} * * *'
     day_pushed = None
 
-    def __init__(self, immediately: bool = False, push_msg: bool = False, recalculate_siv: bool = False, scp_data: bool = False):
+    def __init__(self, immediately: bool = False, push_msg: bool = False, recalculate_siv: bool = False, scp_data: bool = False,
+                 rebuild_state: bool = False, solver_mode: IVSolverMode = None, recalculate_index: bool = False):
         """"""
         self._immediately = immediately
         self._push_msg = push_msg
         self._recalculate_siv = recalculate_siv
+        self._rebuild_state = rebuild_state
+        self._recalculate_index = recalculate_index
+        self._solver_mode = solver_mode
         self._scp_data = scp_data
         super(MonitorScheduleManager, self).__init__(immediately)
 
@@ -43,7 +48,8 @@ class MonitorScheduleManager(ScheduleManager):
             if self._immediately is not True:
                 return self.clear_and_return_true()
         siv_manager = SIVManager()
-        all_dfs = siv_manager.prepare(dates, now_date_str, True, self._recalculate_siv)
+        all_dfs = siv_manager.prepare(dates, now_date_str, True, self._recalculate_siv,
+                                      self._rebuild_state, self._solver_mode, self._recalculate_index)
         if all_dfs is False:
             logger.info('options info fetch failed. ')
             return False
@@ -54,6 +60,8 @@ class MonitorScheduleManager(ScheduleManager):
         self._push_msg = True
         self._immediately = False
         self._recalculate_siv = False
+        self._rebuild_state = False
+        self._recalculate_index = False
         self.day_pushed = now_date_str
         logger.info(f'{now_date_str} schedule task done. ')
         return self.clear_and_return_true()
@@ -75,9 +83,20 @@ if __name__ == '__main__':
     arg_parser.add_argument('--scp', type = bool, dest = 'scp_data',
                             default = False,
                             help = 'scp the data to remote server. ')
+    arg_parser.add_argument('--rebuild_state', type = bool, dest = 'rebuild_state',
+                            default = False,
+                            help = 'rebuild the analytics states from the whole history before analyze. ')
+    arg_parser.add_argument('--recalculate_index', type = bool, dest = 'recalculate_index',
+                            default = False,
+                            help = 'recalculate the index of the local futures before analyze, this may be used when index calculation method changed. ')
+    arg_parser.add_argument('--iv_solver', type = str, dest = 'iv_solver',
+                            default = None, choices = [mode.name.lower() for mode in IVSolverMode],
+                            help = 'the iv solver of the options, the recalculated siv uses it too. ')
     args = arg_parser.parse_args()
     # logger.info('', args.immediately, type(args.immediately), args.push_msg, type(args.push_msg), args.recalculate_siv, type(args.recalculate_siv))
-    mgr = MonitorScheduleManager(args.immediately, args.push_msg, args.recalculate_siv, args.scp_data)
+    solver_mode = IVSolverMode[args.iv_solver.upper()] if args.iv_solver else None
+    mgr = MonitorScheduleManager(args.immediately, args.push_msg, args.recalculate_siv, args.scp_data,
+                                 args.rebuild_state, solver_mode, args.recalculate_index)
     logger.info('options monitor started. ')
     while True:
         sleep(1)
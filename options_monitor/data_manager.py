@@ -3,13 +3,15 @@
 from .data_ref import \
     DATE_FORMAT, sse_calendar, \
     INDEX_KEY, PRODUCT_ID_NAME, PRODUCT_GROUP_NAME, \
-    CLOSE_PRICE_NAME, TOTAL_ROW_KEY, \
+    OPEN_PRICE_NAME, HIGH_PRICE_NAME, LOW_PRICE_NAME, CLOSE_PRICE_NAME, TOTAL_ROW_KEY, \
+    VOLUME_NAME, OPEN_INTEREST_NAME, REMAIN_DAYS_NAME, \
     HV_20_NAME, HV_250_NAME, HV_20_250_NAME, HV_PER, IV_NAME, IV_PER, \
-    HV_MAX, HV_MIN, IV_MAX, IV_MIN
+    HV_MAX, HV_MIN, IV_MAX, IV_MIN, HV_YZ_NAME, HV_YZ_PER
 from .utilities_hv import \
-    HV_DISTRIBUTION_PERIODS, historical_volatility, \
-    calc_percentage, historical_max_min
+    HV_DISTRIBUTION_PERIODS, append_historical_volatilities, \
+    calc_percentage, historical_max_min, range_volatility, analyze_hv_panel, RangeEstimator
 from .data_ref import SYNC_DATA_MODE
+from .hv_state import HVState, HVStates, HV_STATE_DIR
 from .logger import logger
 from functools import cached_property
 from .singleton import Singleton
@@ -25,13 +27,17 @@ class DataManager():
 
     data_mode = None
     local = ''
+    # the columns loaded for the analysis, all of them if None
+    columns = None
 
     #----------------------------------------------------------------------
-    def __init__(self, trade_dates: pd.Index = None, df_extra: pd.DataFrame = None):
-        """Constructor"""
+    def __init__(self, trade_dates: pd.Index = None, df_extra: pd.DataFrame = None,
+                 solver_mode = None):
+        """Constructor, solver_mode is the iv solver of the options data"""
         self._trade_dates = trade_dates
         self._remote_data = None
         self._df_extra = df_extra
+        self._solver_mode = solver_mode
         self.post_initialized()
 
     #----------------------------------------------------------------------
@@ -45,7 +51,7 @@ class DataManager():
         if self._remote_data is None or force_reset is True:
             from .remote_data import remote_data_fac
             self._remote_data = remote_data_fac.create(
-                self.local, self.data_mode, self._trade_dates, self._df_extra)
+                self.local, self.data_mode, self._trade_dates, self._df_extra, self._solver_mode)
 
     #----------------------------------------------------------------------
     def download_raw_data(self):
@@ -57,18 +63,23 @@ class DataManager():
         logger.info(f'{self.data_mode} all data downloaded. ')
 
     #----------------------------------------------------------------------
-    def get_products_dataframe(self, date_str: str = None):
-        """get the products' dataframe"""
+    def get_products_dataframe(self, date_str: str = None, start: str = None):
+        """get the products' dataframe, only the rows from the start date are
+        loaded if given"""
         self.init_remote_data()
-        lindex, df_raw = self._remote_data.get_last_index()
-        if date_str and date_str > lindex:
+        # the last date is answered by the manifest, the data is loaded only
+        # when the date is in it
+        lindex = self._remote_data.get_last_date()
+        if lindex is None or (date_str and date_str > lindex):
             return False, None, None
+        df_raw = self._remote_data.get_dates_data(start, self.columns)
         df = df_raw[df_raw[PRODUCT_ID_NAME] == TOTAL_ROW_KEY]
         df.reset_index(inplace = True)
         df.drop_duplicates(subset = [INDEX_KEY, PRODUCT_ID_NAME, PRODUCT_GROUP_NAME],
                            keep = 'last', inplace = True)
         df.set_index(INDEX_KEY, inplace = True)
-        group = df.groupby(PRODUCT_GROUP_NAME)
+        # the ids are categorical, only the products in the data are grouped
+        group = df.groupby(PRODUCT_GROUP_NAME, observed = True)
         dfs = []
         for pid in group.groups.keys():
             dfs.append(group.get_group(pid))
@@ -83,29 +94,75 @@ class DataManager():
 #----------------------------------------------------------------------
 class FuturesDataManager(DataManager):
 
+    # the close is for the hv and the underlying price of the options, the
+    # others for the range based hv
+    columns = [PRODUCT_ID_NAME, PRODUCT_GROUP_NAME, OPEN_PRICE_NAME, HIGH_PRICE_NAME,
+               LOW_PRICE_NAME, CLOSE_PRICE_NAME]
+    # the windows of the hv and their columns, calculated in one pass
+    hv_windows = {20: HV_20_NAME, 250: HV_250_NAME}
+    # the range based hv, RangeEstimator: (window, hv key, percentage key),
+    # by the open, high and low of the total rows
+    range_hv_estimators = {RangeEstimator.YANG_ZHANG: (20, HV_YZ_NAME, HV_YZ_PER)}
+    # analyze all the products in one panel instead of one by one
+    panel = True
+
     #----------------------------------------------------------------------
     def analyze_one_hv(self, df: pd.DataFrame):
         """analyze the hv of on product based on index"""
-        df[HV_20_NAME] = historical_volatility(df[CLOSE_PRICE_NAME], 20)
-        df[HV_250_NAME] = historical_volatility(df[CLOSE_PRICE_NAME], 250)
+        append_historical_volatilities(df, self.hv_windows)
         df[HV_20_250_NAME] = df[HV_20_NAME] / df[HV_250_NAME]
         df[HV_PER] = calc_percentage(df[HV_20_NAME])
         historical_max_min(df, HV_20_NAME, HV_MAX, HV_MIN)
+        return self.append_range_hvs(df)
+
+    #----------------------------------------------------------------------
+    def append_range_hvs(self, df: pd.DataFrame):
+        """append the range based hv and their percentage"""
+        for estimator, (n, key, per_key) in self.range_hv_estimators.items():
+            df[key] = range_volatility(df, n, estimator)
+            df[per_key] = calc_percentage(df[key])
         return df
 
+    #----------------------------------------------------------------------
+    def analyze_products(self, products: list):
+        """analyze the hv of the products"""
+        if self.panel is not True:
+            return [self.analyze_one_hv(df) for df in products]
+        products = analyze_hv_panel(products, self.hv_windows)
+        return [self.append_range_hvs(df) for df in products]
+
+    #----------------------------------------------------------------------
+    def get_states_path(self):
+        """get the analytics states file path"""
+        self.init_remote_data()
+        return os.path.join(self._remote_data.data_path, HV_STATE_DIR, f'{self.local}.json')
+
+    #----------------------------------------------------------------------
+    def recalculate_index(self):
+        """recalculate the index of the total rows in the local data"""
+        self.init_remote_data()
+        self._remote_data.recalculate_index_test()
+
+    #----------------------------------------------------------------------
+    def get_states_start(self):
+        """the first date of the windows of the persisted states, None for
+        the whole history"""
+        return HVStates(self.get_states_path()).get_start()
+
     #----------------------------------------------------------------------
     def analyze(self, date_str: str = None):
         """analyze the data"""
         result, products, df_all = self.get_products_dataframe(date_str)
         if result is True:
-            dfs = map(lambda df: self.analyze_one_hv(df), products)
-            return True, list(dfs), df_all
+            return True, self.analyze_products(products), df_all
         return False, None, None
 
 
 #----------------------------------------------------------------------
 class OptionsDataManager(DataManager):
 
+    columns = [PRODUCT_ID_NAME, PRODUCT_GROUP_NAME, CLOSE_PRICE_NAME, IV_NAME,
+               VOLUME_NAME, OPEN_INTEREST_NAME, REMAIN_DAYS_NAME]
     futures_options_map = {}
 
     #----------------------------------------------------------------------
@@ -140,6 +197,46 @@ class OptionsDataManager(DataManager):
             joined.append(df_f)
         return joined
 
+    #----------------------------------------------------------------------
+    def analyze_incremental(self, futures_mgr: FuturesDataManager, futures_dfs: list,
+                            date_str: str = None, rebuild: bool = False):
+        """analyze the last day of the futures by the persisted states, the
+        futures without a state, changed or rebuild are analyzed in full. the
+        futures_dfs are the rows from futures_mgr.get_states_start() unless
+        rebuild, only the options after the states are loaded."""
+        states = HVStates(futures_mgr.get_states_path())
+        start = None if rebuild is True else states.get_date()
+        result, options, df_all = self.get_products_dataframe(date_str, start)
+        if result is not True:
+            return False, None, None
+        stale = []
+        for df_f in futures_dfs:
+            futures_id = df_f[PRODUCT_GROUP_NAME][-1]
+            state = None if rebuild is True else states.get(futures_id)
+            # the states without the range based hv of the manager are rebuilt
+            if state is None or state.ranges != futures_mgr.range_hv_estimators or \
+               not state.can_step(df_f):
+                stale.append(futures_id)
+            else:
+                o_df = self.get_options_df(futures_id, options)
+                ivs = pd.Series(np.nan, index = df_f.index) if o_df is None else \
+                    o_df[IV_NAME].reindex(df_f.index)
+                state.update(df_f, ivs)
+        history = futures_dfs
+        if stale and start is not None:
+            # the stale ones need the whole history
+            _result, history, _df = futures_mgr.get_products_dataframe(date_str)
+            _result, options, _df = self.get_products_dataframe(date_str)
+        stale = [df_f for df_f in history if df_f[PRODUCT_GROUP_NAME][-1] in stale]
+        # the stale ones are analyzed at once
+        for df_f in self.join_options(futures_mgr.analyze_products(stale), options):
+            states.set(df_f[PRODUCT_GROUP_NAME][-1],
+                       HVState.from_history(df_f, futures_mgr.hv_windows,
+                                            futures_mgr.range_hv_estimators))
+        states.save()
+        dfs = [states.get(df_f[PRODUCT_GROUP_NAME][-1]).to_frame() for df_f in futures_dfs]
+        return True, dfs, df_all
+
     #----------------------------------------------------------------------
     def analyze(self, futures_dfs: list, date_str: str = None):
         """analyze the data"""
@@ -157,6 +254,9 @@ class CSIndex000300DataManager(FuturesDataManager):
     data_mode = SYNC_DATA_MODE.HTTP_DOWNLOAD_CSINDEX_000300
     data_mode2 = SYNC_DATA_MODE.HTTP_DOWNLOAD_CSINDEX_000300_DAILY
     local = 'csindex_000300'
+    # the index has only the close, no range based hv
+    columns = [PRODUCT_GROUP_NAME, CLOSE_PRICE_NAME]
+    range_hv_estimators = {}
 
     #----------------------------------------------------------------------
     def init_remote_data(self, force_reset: bool = False):
@@ -180,12 +280,13 @@ class CSIndex000300DataManager(FuturesDataManager):
         logger.info(f'{self.data_mode2} all data downloaded. ')
 
     #----------------------------------------------------------------------
-    def get_products_dataframe(self, date_str: str = None):
+    def get_products_dataframe(self, date_str: str = None, start: str = None):
         """"""
         self.init_remote_data()
-        lindex, df = self._remote_data.get_last_index()
-        if date_str and date_str > lindex:
+        lindex = self._remote_data.get_last_date()
+        if lindex is None or (date_str and date_str > lindex):
             return False, None, None
+        df = self._remote_data.get_dates_data(start, self.columns)
         return True, [df], df
 
 
@@ -311,10 +412,22 @@ class CZCEOptionsDataManager(OptionsDataManager):
 class SIVManager(metaclass = Singleton):
 
     pool_size = 10
+    # recalculate the history of all the options in a process pool
+    recalc_in_parallel = True
+    # analyze the last day by the persisted states instead of the whole history
+    incremental = True
+    # the iv solver of the options, None for the default one
+    solver_mode = None
 
     def prepare(self, dates: pd.DataFrame, now_date_str: str,
-                download: bool = False, recalc_siv: bool = False):
-        """prepare the data"""
+                download: bool = False, recalc_siv: bool = False,
+                rebuild_state: bool = False, solver_mode = None, recalc_index: bool = False):
+        """prepare the data, rebuild_state analyzes the whole history again,
+        recalc_index recalculates the index of the local futures once, e.g.
+        the open, high and low of the data saved before they were weighted"""
+        solver_mode = solver_mode or self.solver_mode
+        # the states are stepped from the old index
+        rebuild_state = rebuild_state or recalc_index
         if dates is None:
             # reset the download flag
             download = False
@@ -331,41 +444,66 @@ class SIVManager(metaclass = Singleton):
             dce_mgr.download_raw_data()
             czce_mgr.download_raw_data()
             logger.info('all futures data downloaded. ')
-        res_idx300, csindex300_dfs, csindex300_df_all = csindex000300_mgr.analyze(now_date_str)
-        res_cffe, cffe_dfs, cffe_df_all = cffe_mgr.analyze(now_date_str)
-        res_shfe, shfe_dfs, shfe_df_all = shfe_mgr.analyze(now_date_str)
-        res_dce, dce_dfs, dce_df_all = dce_mgr.analyze(now_date_str)
-        res_czce, czce_dfs, czce_df_all = czce_mgr.analyze(now_date_str)
+        if recalc_index is True:
+            # the csindex has no total rows
+            [mgr.recalculate_index() for mgr in [cffe_mgr, shfe_mgr, dce_mgr, czce_mgr]]
+        # in the incremental mode, the futures are analyzed with the options'
+        # states, only the rows of their windows are loaded
+        rebuild_all = rebuild_state or recalc_siv
+        analyze_futures = lambda mgr: mgr.get_products_dataframe(
+            now_date_str, None if rebuild_all is True else mgr.get_states_start()) \
+            if self.incremental is True else mgr.analyze(now_date_str)
+        res_idx300, csindex300_dfs, csindex300_df_all = analyze_futures(csindex000300_mgr)
+        res_cffe, cffe_dfs, cffe_df_all = analyze_futures(cffe_mgr)
+        res_shfe, shfe_dfs, shfe_df_all = analyze_futures(shfe_mgr)
+        res_dce, dce_dfs, dce_df_all = analyze_futures(dce_mgr)
+        res_czce, czce_dfs, czce_df_all = analyze_futures(czce_mgr)
         if not all([res_idx300, res_cffe, res_shfe, res_dce, res_czce]):
             # failed
             logger.info('futures info fetch failed. ')
             return False
-        # for options
-        cffe_options_mgr = CFFEOptionsDataManager(dates, csindex300_df_all)
-        shfe_options_mgr = SHFEOptionsDataManager(dates, shfe_df_all)
-        dce_options_mgr = DCEOptionsDataManager(dates, dce_df_all)
-        czce_options_mgr = CZCEOptionsDataManager(dates, czce_df_all)
+        # for options, the expiry dates of all the contract months are
+        # precomputed once before the iv calculation
+        from .utilities_options import expiry_mgr
+        expiry_mgr.build()
+        cffe_options_mgr = CFFEOptionsDataManager(dates, csindex300_df_all, solver_mode)
+        shfe_options_mgr = SHFEOptionsDataManager(dates, shfe_df_all, solver_mode)
+        dce_options_mgr = DCEOptionsDataManager(dates, dce_df_all, solver_mode)
+        czce_options_mgr = CZCEOptionsDataManager(dates, czce_df_all, solver_mode)
         if download is True:
             cffe_options_mgr.download_raw_data()
             shfe_options_mgr.download_raw_data()
             dce_options_mgr.download_raw_data()
             czce_options_mgr.download_raw_data()
             logger.info('all options data downloaded. ')
-        all_dfs = self.analyze([(cffe_options_mgr, csindex300_dfs),
-                                (shfe_options_mgr, shfe_dfs),
-                                (dce_options_mgr,  dce_dfs),
-                                (czce_options_mgr, czce_dfs)], now_date_str, recalc_siv)
+        all_dfs = self.analyze([(cffe_options_mgr, csindex000300_mgr, csindex300_dfs),
+                                (shfe_options_mgr, shfe_mgr, shfe_dfs),
+                                (dce_options_mgr,  dce_mgr,  dce_dfs),
+                                (czce_options_mgr, czce_mgr, czce_dfs)],
+                               now_date_str, recalc_siv, rebuild_state)
         return all_dfs
 
     #----------------------------------------------------------------------
-    def analyze(self, mgrs: list, date_str: str, recalc_siv: bool):
+    def analyze(self, mgrs: list, date_str: str, recalc_siv: bool,
+                rebuild_state: bool = False):
         """analyze the options data"""
         if recalc_siv is True:
             logger.info('recalculate siv for all. ')
             # only need recalculate siv once
-            [mgr._remote_data.recalculate_siv_test(True) for mgr, _ in mgrs]
+            [mgr.init_remote_data() for mgr, _, _ in mgrs]
+            if self.recalc_in_parallel is True:
+                from .remote_data import recalculate_siv_parallel
+                recalculate_siv_parallel([mgr._remote_data for mgr, _, _ in mgrs], self.pool_size)
+            else:
+                [mgr._remote_data.recalculate_siv_test(True) for mgr, _, _ in mgrs]
         # do analyze
-        results = map(lambda mgr: mgr[0].analyze(mgr[1], date_str), mgrs)
+        if self.incremental is True:
+            # the states keep the iv history, so they are rebuilt with the siv
+            rebuild_state = rebuild_state or recalc_siv
+            results = map(lambda mgr: mgr[0].analyze_incremental(
+                mgr[1], mgr[2], date_str, rebuild_state), mgrs)
+        else:
+            results = map(lambda mgr: mgr[0].analyze(mgr[2], date_str), mgrs)
         all_dfs = []
         for result, analyze_dfs, _data_all in results:
             if result is False:
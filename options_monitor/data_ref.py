@@ -80,6 +80,15 @@ HV_MAX = 'hmh'
 IV_PER = 'ivp'
 IV_MIN = 'ivl'
 IV_MAX = 'ivh'
+# range based hv key
+HV_PK_NAME = 'hpk'
+HV_GK_NAME = 'hgk'
+HV_YZ_NAME = 'hyz'
+HV_PK_PER = 'hpkp'
+HV_GK_PER = 'hgkp'
+HV_YZ_PER = 'hyzp'
+RANGE_HV_NAMES = [HV_PK_NAME, HV_GK_NAME, HV_YZ_NAME]
+RANGE_HV_PERS = [HV_PK_PER, HV_GK_PER, HV_YZ_PER]
 
 # total key for future's index
 TOTAL_ROW_KEY = 'total'
@@ -92,6 +101,47 @@ O_COLUMN_NAMES = [PRODUCT_ID_NAME, PRODUCT_GROUP_NAME, OPTION_TYPE_NAME, S_PRICE
                   U_PRICE_NAME, CLOSE_PRICE_NAME, VOLUME_NAME, OPEN_INTEREST_NAME]
 
 
+# the dtypes of the columns in the local datasets, the others are inferred
+FUTURES_DTYPES = {INDEX_KEY: str, PRODUCT_ID_NAME: 'category', PRODUCT_GROUP_NAME: 'category',
+                  PRE_SETTLE_PRICE_NAME: float, OPEN_PRICE_NAME: float, HIGH_PRICE_NAME: float,
+                  LOW_PRICE_NAME: float, CLOSE_PRICE_NAME: float, SETTLE_PRICE_NAME: float,
+                  OPEN_INTEREST_NAME: 'int64', OI_CHG_NAME: 'int64', VOLUME_NAME: 'int64'}
+
+O_DTYPES = {INDEX_KEY: str, PRODUCT_ID_NAME: 'category', PRODUCT_GROUP_NAME: 'category',
+            U_PRODUCT_ID_NAME: 'category', OPTION_TYPE_NAME: 'category', S_PRICE_NAME: float,
+            U_PRICE_NAME: float, CLOSE_PRICE_NAME: float, VOLUME_NAME: 'int64',
+            OPEN_INTEREST_NAME: 'int64', IV_NAME: float, REMAIN_DAYS_NAME: float}
+
+INDEX_DTYPES = {INDEX_KEY: str, PRODUCT_GROUP_NAME: 'category', CLOSE_PRICE_NAME: float}
+
+CALENDAR_DTYPES = {INDEX_KEY: str, 'title': str, 'closed': bool}
+
+# the smaller dtypes of the frames held in memory where the values fit, the
+# prices are kept in float64 as the iv cache keys and the index weights need
+# them exactly
+COMPACT_DTYPES = {OPEN_INTEREST_NAME: 'int32', OI_CHG_NAME: 'int32', VOLUME_NAME: 'int32',
+                  IV_NAME: 'float32', REMAIN_DAYS_NAME: 'int16'}
+
+# the decimals of the floats written to the local datasets, so the compact
+# floats are written back as they were loaded
+STORE_DECIMALS = {IV_NAME: 6}
+
+# the schema registry of the local datasets
+DATA_DTYPES = {
+    SYNC_DATA_MODE.HTTP_DOWNLOAD_CSINDEX_000300 : INDEX_DTYPES,
+    SYNC_DATA_MODE.HTTP_DOWNLOAD_CSINDEX_000300_DAILY : INDEX_DTYPES,
+    SYNC_DATA_MODE.HTTP_DOWNLOAD_CFFE_CALENDAR : CALENDAR_DTYPES,
+    SYNC_DATA_MODE.HTTP_DOWNLOAD_CFFE : FUTURES_DTYPES,
+    SYNC_DATA_MODE.HTTP_DOWNLOAD_SHFE : FUTURES_DTYPES,
+    SYNC_DATA_MODE.HTTP_DOWNLOAD_DCE : FUTURES_DTYPES,
+    SYNC_DATA_MODE.HTTP_DOWNLOAD_CZCE : FUTURES_DTYPES,
+    SYNC_DATA_MODE.HTTP_DOWNLOAD_CFFE_OPTIONS : O_DTYPES,
+    SYNC_DATA_MODE.HTTP_DOWNLOAD_SHFE_OPTIONS : O_DTYPES,
+    SYNC_DATA_MODE.HTTP_DOWNLOAD_DCE_OPTIONS : O_DTYPES,
+    SYNC_DATA_MODE.HTTP_DOWNLOAD_CZCE_OPTIONS : O_DTYPES,
+}
+
+
 # futures names for hv notification
 FUTURE_HV_NAMES = {
     # cs
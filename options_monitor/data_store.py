@@ -0,0 +1,749 @@
+# encoding: UTF-8
+
+from .data_ref import DATA_ROOT, INDEX_KEY, make_sure_dirs_exist
+from .utilities import load_futures_by_csv, compact_frame, expand_frame
+from .logger import logger
+
+from abc import ABCMeta, abstractmethod
+from enum import Enum
+import os, io, glob, json, shutil, hashlib, argparse
+import pandas as pd
+
+try:
+    import pyarrow, pyarrow.parquet
+    PARQUET_ENABLED = True
+except ImportError:
+    PARQUET_ENABLED = False
+
+
+#----------------------------------------------------------------------
+class STORE_MODE(Enum):
+    CSV     = 1
+    PARQUET = 2
+
+
+# the mode of the new datasets, the existing ones keep the mode they are in
+DATA_STORE_MODE = STORE_MODE.PARQUET if PARQUET_ENABLED else STORE_MODE.CSV
+
+# partition by the date's prefix, 4 for the year 'YYYY', 7 for the month 'YYYY-MM'
+PARTITION_BY_YEAR = 4
+PARTITION_BY_MONTH = 7
+
+MANIFEST_FILE = 'manifest.json'
+
+# write each merge as a segment instead of rewriting the dataset
+MERGE_BY_SEGMENTS = True
+# compact the segments at once when there are so many of them
+COMPACT_SEGMENTS = 64
+SEGMENTS_DIR = 'segments'
+
+# the loaded frames are compact in memory and widened back when stored
+COMPACT_FRAME_MODE = True
+
+
+#----------------------------------------------------------------------
+def schema_hash(columns: list):
+    """the hash of the columns of a dataset"""
+    return hashlib.md5(','.join([str(column) for column in columns]).encode('utf-8')).hexdigest()
+
+
+#----------------------------------------------------------------------
+def filter_dates(df: pd.DataFrame, start: str = None, end: str = None):
+    """the rows between the start and the end date"""
+    if start is not None:
+        df = df[df.index >= start]
+    if end is not None:
+        df = df[df.index <= end]
+    return df
+
+
+#----------------------------------------------------------------------
+def merge_frames(ldf: pd.DataFrame, data: pd.DataFrame):
+    """merge the data into the local one, the last row of the same date wins"""
+    data = pd.concat([ldf, data])
+    # drop the duplicated index rows
+    return data[~data.index.duplicated(keep = 'last')]
+
+
+#----------------------------------------------------------------------
+class DataManifest(object):
+    """the sidecar of a dataset: the first offset and the row count of each
+    date in order, the size of the dataset and the hash of its columns. it is
+    replaced at once after every write, a manifest that does not match the
+    size of the dataset is rebuilt."""
+
+    def __init__(self, path: str):
+        """Constructor"""
+        self.path = path
+        # date: [offset, rows]
+        self.dates = {}
+        self.size = -1
+        self.schema = None
+        try:
+            with open(path, 'r') as f:
+                values = json.load(f)
+            self.dates = values['dates']
+            self.size = values['size']
+            self.schema = values['schema']
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+
+    #----------------------------------------------------------------------
+    @property
+    def last_date(self):
+        """the last trade date, None if empty"""
+        return next(reversed(self.dates)) if self.dates else None
+
+    #----------------------------------------------------------------------
+    @property
+    def rows(self):
+        """the row count"""
+        return sum([rows for _offset, rows in self.dates.values()])
+
+    #----------------------------------------------------------------------
+    def reset(self, schema: str):
+        """clear the dates before a scan"""
+        self.dates = {}
+        self.size = 0
+        self.schema = schema
+
+    #----------------------------------------------------------------------
+    def add(self, date: str, offset: int, rows: int = 1):
+        """add the rows of the date at the offset"""
+        if date in self.dates:
+            self.dates[date][1] += rows
+        else:
+            self.dates[date] = [offset, rows]
+
+    #----------------------------------------------------------------------
+    def get_range(self, start: str = None, end: str = None):
+        """the offsets of the first row from the start and the first row after
+        the end"""
+        items = self.dates.items()
+        begin = next((offset for date, (offset, _rows) in items
+                      if start is None or date >= start), self.size)
+        finish = next((offset for date, (offset, _rows) in items
+                       if end is not None and date > end), self.size)
+        return begin, max(begin, finish)
+
+    #----------------------------------------------------------------------
+    def save(self):
+        """save the manifest, replaced at once"""
+        tmp_path = f'{self.path}.{os.getpid()}'
+        with open(tmp_path, 'w') as f:
+            json.dump({'last_date': self.last_date, 'rows': self.rows, 'size': self.size,
+                       'schema': self.schema, 'dates': self.dates}, f)
+        os.replace(tmp_path, self.path)
+
+
+#----------------------------------------------------------------------
+class IDataStore(metaclass = ABCMeta):
+    """the local store of a dataset, indexed by the trade date. in the merge
+    mode each merge is written as a small segment beside the base dataset, the
+    segments are read over the base with the last write wins and folded into
+    it by the compaction."""
+
+    segment_suffix = None
+
+    def __init__(self, data_path: str, local: str, segmented: bool = None,
+                 dtypes: dict = None, compact: bool = None):
+        """Constructor"""
+        self.data_path = data_path
+        self.local = local
+        self.segmented = MERGE_BY_SEGMENTS if segmented is None else segmented
+        # the dtypes of the columns, as data_ref.DATA_DTYPES
+        self.dtypes = dtypes
+        self.compact_mode = COMPACT_FRAME_MODE if compact is None else compact
+
+    #----------------------------------------------------------------------
+    @abstractmethod
+    def get_local_path(self):
+        """get the path of the dataset"""
+        raise NotImplementedError
+
+    #----------------------------------------------------------------------
+    def exists(self):
+        """check if the dataset exists"""
+        return os.path.exists(self.get_local_path()) or len(self.list_segments()) > 0
+
+    #----------------------------------------------------------------------
+    @abstractmethod
+    def get_manifest_path(self):
+        """get the path of the manifest"""
+        raise NotImplementedError
+
+    #----------------------------------------------------------------------
+    @abstractmethod
+    def get_size(self):
+        """the size of the dataset in bytes"""
+        raise NotImplementedError
+
+    #----------------------------------------------------------------------
+    @abstractmethod
+    def scan_manifest(self, manifest: DataManifest):
+        """rebuild the manifest from the dataset"""
+        raise NotImplementedError
+
+    #----------------------------------------------------------------------
+    def get_manifest(self, rebuild: bool = False):
+        """the manifest of the base dataset, rebuilt if it does not match"""
+        manifest = DataManifest(self.get_manifest_path())
+        if rebuild is True or manifest.size != self.get_size():
+            self.scan_manifest(manifest)
+            manifest.save()
+        return manifest
+
+    #----------------------------------------------------------------------
+    def get_last_date(self):
+        """the last trade date by the manifest or the last segment, None if no
+        data"""
+        segments = self.list_segments()
+        if segments:
+            return self.load_segment(segments[-1]).index[-1]
+        if not os.path.exists(self.get_local_path()):
+            return None
+        return self.get_manifest().last_date
+
+    #----------------------------------------------------------------------
+    @abstractmethod
+    def get_segments_path(self):
+        """get the directory of the segments"""
+        raise NotImplementedError
+
+    #----------------------------------------------------------------------
+    def list_segments(self):
+        """the segment files in the order written"""
+        return sorted(glob.glob(os.path.join(self.get_segments_path(), f'*.{self.segment_suffix}')))
+
+    #----------------------------------------------------------------------
+    @abstractmethod
+    def load_segment(self, path: str, columns: list = None):
+        """load one segment"""
+        raise NotImplementedError
+
+    #----------------------------------------------------------------------
+    @abstractmethod
+    def save_segment(self, path: str, df: pd.DataFrame):
+        """save one segment, replaced at once"""
+        raise NotImplementedError
+
+    #----------------------------------------------------------------------
+    def append_segment(self, data: pd.DataFrame):
+        """write the data as the next segment"""
+        segments = self.list_segments()
+        seq = int(os.path.basename(segments[-1]).split('.')[0]) + 1 if segments else 0
+        make_sure_dirs_exist(self.get_segments_path())
+        path = os.path.join(self.get_segments_path(), f'{seq:08d}.{self.segment_suffix}')
+        self.save_segment(path, data)
+        return path
+
+    #----------------------------------------------------------------------
+    def remove_segments(self, segments: list = None):
+        """remove the segments, all of them by default"""
+        for path in self.list_segments() if segments is None else segments:
+            os.remove(path)
+
+    #----------------------------------------------------------------------
+    def compact(self):
+        """fold the segments into the base dataset, the segments are removed
+        after the base is written, so a break between only leaves the rows to
+        be applied once more"""
+        segments = self.list_segments()
+        if not segments:
+            return False
+        data = pd.concat([self.load_segment(path) for path in segments])
+        try:
+            self.merge_base(self.load_base(), data)
+        except FileNotFoundError:
+            self.save_base(merge_frames(None, data))
+        self.remove_segments(segments)
+        logger.info(f'{len(segments)} segments compacted into {self.get_local_path()}. ')
+        return True
+
+    #----------------------------------------------------------------------
+    @abstractmethod
+    def load_base(self, columns: list = None):
+        """load the base dataset, only the columns if given, raise
+        FileNotFoundError if not exists"""
+        raise NotImplementedError
+
+    #----------------------------------------------------------------------
+    def load(self, columns: list = None):
+        """load the dataset with the segments over the base, raise
+        FileNotFoundError if not exists"""
+        segments = self.list_segments()
+        try:
+            df = self.load_base(columns)
+        except FileNotFoundError:
+            if not segments:
+                raise
+            df = None
+        if segments:
+            df = merge_frames(df, pd.concat([self.load_segment(path, columns)
+                                             for path in segments]))
+        return self.to_memory(df)
+
+    #----------------------------------------------------------------------
+    def to_memory(self, df: pd.DataFrame):
+        """the loaded frame in memory, compact in the compact mode"""
+        return compact_frame(df, self.dtypes) if self.compact_mode is True else df
+
+    #----------------------------------------------------------------------
+    def load_base_dates(self, start: str = None, end: str = None, columns: list = None):
+        """load the rows of the base dataset between the start and the end date"""
+        return filter_dates(self.load_base(columns), start, end)
+
+    #----------------------------------------------------------------------
+    def load_dates(self, start: str = None, end: str = None, columns: list = None):
+        """load the rows between the start and the end date"""
+        if self.list_segments():
+            return filter_dates(self.load(columns), start, end)
+        return self.to_memory(self.load_base_dates(start, end, columns))
+
+    #----------------------------------------------------------------------
+    def drop_base_last_date(self):
+        """drop the rows of the last date of the base dataset"""
+        last_date = self.get_last_date()
+        if last_date is not None:
+            df = self.load_base()
+            self.save_base(df[df.index != last_date])
+        return last_date
+
+    #----------------------------------------------------------------------
+    def drop_last_date(self):
+        """drop the rows of the last date, return the date"""
+        self.compact()
+        return self.drop_base_last_date()
+
+    #----------------------------------------------------------------------
+    @abstractmethod
+    def save_base(self, df: pd.DataFrame):
+        """save the whole base dataset"""
+        raise NotImplementedError
+
+    #----------------------------------------------------------------------
+    def save(self, df: pd.DataFrame):
+        """save the whole dataset, the segments are replaced too"""
+        self.save_base(expand_frame(df, self.dtypes))
+        self.remove_segments()
+
+    #----------------------------------------------------------------------
+    @abstractmethod
+    def append(self, data: pd.DataFrame):
+        """append the data of the new dates"""
+        raise NotImplementedError
+
+    #----------------------------------------------------------------------
+    def merge_base(self, ldf: pd.DataFrame, data: pd.DataFrame):
+        """merge the data into the base dataset, return the merged"""
+        data = merge_frames(ldf, data)
+        self.save_base(data)
+        return data
+
+    #----------------------------------------------------------------------
+    def merge(self, ldf: pd.DataFrame, data: pd.DataFrame):
+        """merge the data into the local one, the rows of the same date are
+        replaced, return the merged. the data is only written as a segment if
+        segmented, and compacted when the segments are too many."""
+        data = expand_frame(data, self.dtypes)
+        if not self.segmented:
+            return self.merge_base(expand_frame(ldf, self.dtypes), data)
+        self.append_segment(data)
+        if len(self.list_segments()) >= COMPACT_SEGMENTS:
+            self.compact()
+        return merge_frames(ldf, data)
+
+    #----------------------------------------------------------------------
+    def export_csv(self, path: str = None):
+        """export the dataset to a csv file, default to the csv store's path"""
+        if path is None:
+            path = CSVDataStore(self.data_path, self.local).get_local_path()
+        expand_frame(self.load(), self.dtypes).to_csv(path_or_buf = path)
+        return path
+
+
+#----------------------------------------------------------------------
+class CSVDataStore(IDataStore):
+    """the dataset in one csv file"""
+
+    segment_suffix = 'csv'
+
+    #----------------------------------------------------------------------
+    def get_local_path(self):
+        """get the path of the dataset"""
+        return os.path.join(self.data_path, f'{self.local}.csv')
+
+    #----------------------------------------------------------------------
+    def get_manifest_path(self):
+        """get the path of the manifest"""
+        return os.path.join(self.data_path, f'{self.local}.{MANIFEST_FILE}')
+
+    #----------------------------------------------------------------------
+    def get_size(self):
+        """the size of the dataset in bytes"""
+        return os.path.getsize(self.get_local_path())
+
+    #----------------------------------------------------------------------
+    def scan_manifest(self, manifest: DataManifest):
+        """rebuild the manifest by the first field of each line"""
+        with open(self.get_local_path(), 'rb') as f:
+            header = f.readline()
+            manifest.reset(schema_hash(header.decode('utf-8').rstrip('\r\n').split(',')[1:]))
+            offset = len(header)
+            for line in f:
+                manifest.add(line.split(b',', 1)[0].decode('utf-8'), offset)
+                offset += len(line)
+        manifest.size = offset
+
+    #----------------------------------------------------------------------
+    def get_segments_path(self):
+        """get the directory of the segments"""
+        return os.path.join(self.data_path, f'{self.local}.{SEGMENTS_DIR}')
+
+    #----------------------------------------------------------------------
+    def load_segment(self, path: str, columns: list = None):
+        """load one segment"""
+        df = load_futures_by_csv(path, columns, self.dtypes)
+        return df if columns is None else df[columns]
+
+    #----------------------------------------------------------------------
+    def save_segment(self, path: str, df: pd.DataFrame):
+        """save one segment, replaced at once"""
+        tmp_path = f'{path}.{os.getpid()}'
+        df.to_csv(path_or_buf = tmp_path)
+        os.replace(tmp_path, path)
+
+    #----------------------------------------------------------------------
+    def load_base(self, columns: list = None):
+        """load the base dataset"""
+        df = load_futures_by_csv(self.get_local_path(), columns, self.dtypes)
+        return df if columns is None else df[columns]
+
+    #----------------------------------------------------------------------
+    def load_base_dates(self, start: str = None, end: str = None, columns: list = None):
+        """load the rows between the start and the end date, only the bytes of
+        them are read by the offsets in the manifest"""
+        begin, finish = self.get_manifest().get_range(start, end)
+        with open(self.get_local_path(), 'rb') as f:
+            header = f.readline()
+            f.seek(begin)
+            chunk = f.read(finish - begin)
+        df = load_futures_by_csv(io.BytesIO(header + chunk), columns, self.dtypes)
+        return df if columns is None else df[columns]
+
+    #----------------------------------------------------------------------
+    def save_base(self, df: pd.DataFrame):
+        """save the whole base dataset"""
+        tmp_path = f'{self.get_local_path()}.{os.getpid()}'
+        df.to_csv(path_or_buf = tmp_path)
+        os.replace(tmp_path, self.get_local_path())
+        self.get_manifest(True)
+
+    #----------------------------------------------------------------------
+    def append(self, data: pd.DataFrame):
+        """append the data of the new dates, the manifest is extended by the
+        lines appended"""
+        data = expand_frame(data, self.dtypes)
+        manifest = self.get_manifest()
+        if manifest.schema != schema_hash(data.columns):
+            logger.warning(f'the columns appended to {self.get_local_path()} are changed. ')
+        text = data.to_csv(header = False).encode('utf-8')
+        with open(self.get_local_path(), 'ab') as f:
+            f.write(text)
+        offset = manifest.size
+        for date, line in zip(data.index.astype(str), text.splitlines(keepends = True)):
+            manifest.add(date, offset)
+            offset += len(line)
+        manifest.size = offset
+        manifest.save()
+
+    #----------------------------------------------------------------------
+    def drop_base_last_date(self):
+        """drop the rows of the last date by truncating the file at its offset"""
+        if not os.path.exists(self.get_local_path()):
+            return None
+        manifest = self.get_manifest()
+        last_date = manifest.last_date
+        if last_date is not None:
+            offset, _rows = manifest.dates.pop(last_date)
+            with open(self.get_local_path(), 'r+b') as f:
+                f.truncate(offset)
+            manifest.size = offset
+            manifest.save()
+        return last_date
+
+    #----------------------------------------------------------------------
+    def export_csv(self, path: str = None):
+        """the dataset is the csv itself once compacted"""
+        self.compact()
+        if path is None or path == self.get_local_path():
+            return self.get_local_path()
+        shutil.copyfile(self.get_local_path(), path)
+        return path
+
+
+#----------------------------------------------------------------------
+class ParquetDataStore(IDataStore):
+    """the dataset in the typed columnar parquet files of a directory, one
+    file for each month of the dates, so an append only rewrites the month
+    touched and only the columns asked are read"""
+
+    partition_length = PARTITION_BY_MONTH
+    segment_suffix = 'parquet'
+
+    #----------------------------------------------------------------------
+    def get_local_path(self):
+        """get the directory of the dataset"""
+        return os.path.join(self.data_path, self.local)
+
+    #----------------------------------------------------------------------
+    def get_segments_path(self):
+        """get the directory of the segments"""
+        return os.path.join(self.get_local_path(), SEGMENTS_DIR)
+
+    #----------------------------------------------------------------------
+    def get_manifest_path(self):
+        """get the path of the manifest"""
+        return os.path.join(self.get_local_path(), MANIFEST_FILE)
+
+    #----------------------------------------------------------------------
+    def get_size(self):
+        """the size of the partitions in bytes"""
+        return sum([os.path.getsize(self.get_partition_path(partition))
+                    for partition in self.list_partitions()])
+
+    #----------------------------------------------------------------------
+    def scan_manifest(self, manifest: DataManifest):
+        """rebuild the manifest by the index column of the partitions, the
+        offset is the row number in the dataset"""
+        manifest.reset(None)
+        offset = 0
+        for partition in self.list_partitions():
+            if manifest.schema is None:
+                schema = pyarrow.parquet.read_schema(self.get_partition_path(partition))
+                manifest.schema = schema_hash([name for name in schema.names if name != INDEX_KEY])
+            dates = self.load_partition(partition, [INDEX_KEY]).index
+            for date, rows in dates.value_counts(sort = False).items():
+                manifest.add(date, offset, rows)
+                offset += rows
+        manifest.size = self.get_size()
+
+    #----------------------------------------------------------------------
+    def get_partition_path(self, partition: str):
+        """get the file path of the partition"""
+        return os.path.join(self.get_local_path(), f'{partition}.parquet')
+
+    #----------------------------------------------------------------------
+    def get_partitions(self, df: pd.DataFrame):
+        """the partition of each row"""
+        return df.index.astype(str).str.slice(0, self.partition_length)
+
+    #----------------------------------------------------------------------
+    def load_segment(self, path: str, columns: list = None):
+        """load one parquet file of the dataset"""
+        if columns is not None:
+            columns = [INDEX_KEY] + [column for column in columns if column != INDEX_KEY]
+        df = pd.read_parquet(path, engine = 'pyarrow', columns = columns)
+        return df.set_index(INDEX_KEY)
+
+    #----------------------------------------------------------------------
+    def save_segment(self, path: str, df: pd.DataFrame):
+        """save one parquet file of the dataset, replaced at once"""
+        tmp_path = f'{path}.{os.getpid()}'
+        df = df.rename_axis(INDEX_KEY).reset_index()
+        df[INDEX_KEY] = df[INDEX_KEY].astype(str)
+        df.to_parquet(tmp_path, engine = 'pyarrow', index = False)
+        os.replace(tmp_path, path)
+
+    #----------------------------------------------------------------------
+    def load_partition(self, partition: str, columns: list = None):
+        """load one partition"""
+        return self.load_segment(self.get_partition_path(partition), columns)
+
+    #----------------------------------------------------------------------
+    def save_partition(self, partition: str, df: pd.DataFrame):
+        """save one partition, replaced at once"""
+        self.save_segment(self.get_partition_path(partition), df)
+
+    #----------------------------------------------------------------------
+    def list_partitions(self):
+        """the partitions in order"""
+        paths = glob.glob(os.path.join(self.get_local_path(), '*.parquet'))
+        return sorted([os.path.basename(path)[:-len('.parquet')] for path in paths])
+
+    #----------------------------------------------------------------------
+    def load_base(self, columns: list = None):
+        """load the base dataset"""
+        partitions = self.list_partitions()
+        if not partitions:
+            raise FileNotFoundError(self.get_local_path())
+        return pd.concat([self.load_partition(partition, columns) for partition in partitions])
+
+    #----------------------------------------------------------------------
+    def load_base_dates(self, start: str = None, end: str = None, columns: list = None):
+        """load the rows between the start and the end date, only the
+        partitions of them are read"""
+        # by the length of each partition, the ones not re-partitioned yet too
+        partitions = [partition for partition in self.list_partitions()
+                      if (start is None or partition >= start[:len(partition)]) and
+                      (end is None or partition <= end[:len(partition)])]
+        if not partitions:
+            return self.load_base(columns).iloc[:0]
+        df = pd.concat([self.load_partition(partition, columns) for partition in partitions])
+        return filter_dates(df, start, end)
+
+    #----------------------------------------------------------------------
+    def repartition(self):
+        """re-partition the partitions of another length, e.g. the years
+        written before the months. the new ones are written from the old ones
+        before they are removed, so it is run again after a break"""
+        old = [partition for partition in self.list_partitions()
+               if len(partition) != self.partition_length]
+        if not old:
+            return False
+        df = pd.concat([self.load_partition(partition) for partition in old])
+        partitions = self.get_partitions(df)
+        for partition in partitions.unique():
+            self.save_partition(partition, df[partitions == partition])
+        for partition in old:
+            os.remove(self.get_partition_path(partition))
+        self.get_manifest(True)
+        logger.info(f'{old} of {self.get_local_path()} re-partitioned. ')
+        return True
+
+    #----------------------------------------------------------------------
+    def save_base(self, df: pd.DataFrame):
+        """save the whole base dataset, the partitions not in the data are
+        removed"""
+        make_sure_dirs_exist(self.get_local_path())
+        partitions = self.get_partitions(df)
+        for partition in partitions.unique():
+            self.save_partition(partition, df[partitions == partition])
+        for partition in set(self.list_partitions()) - set(partitions):
+            os.remove(self.get_partition_path(partition))
+        self.get_manifest(True)
+
+    #----------------------------------------------------------------------
+    def append(self, data: pd.DataFrame):
+        """append the data of the new dates, only the partitions of them are
+        written"""
+        data = expand_frame(data, self.dtypes)
+        make_sure_dirs_exist(self.get_local_path())
+        self.repartition()
+        partitions = self.get_partitions(data)
+        existed = self.list_partitions()
+        for partition in partitions.unique():
+            df = data[partitions == partition]
+            if partition in existed:
+                df = pd.concat([self.load_partition(partition), df])
+            self.save_partition(partition, df)
+        self.get_manifest(True)
+
+    #----------------------------------------------------------------------
+    def merge_base(self, ldf: pd.DataFrame, data: pd.DataFrame):
+        """merge the data into the base dataset, only the partitions of the
+        data are written, return the merged"""
+        merged = merge_frames(ldf, data)
+        make_sure_dirs_exist(self.get_local_path())
+        self.repartition()
+        partitions = self.get_partitions(merged)
+        for partition in self.get_partitions(data).unique():
+            self.save_partition(partition, merged[partitions == partition])
+        self.get_manifest(True)
+        return merged
+
+
+#----------------------------------------------------------------------
+def create_data_store(data_path: str, local: str, mode: STORE_MODE = None,
+                      dtypes: dict = None):
+    """the store of the dataset, an existing dataset keeps its mode until it
+    is migrated, the new ones are in the mode given or DATA_STORE_MODE"""
+    parquet_store = ParquetDataStore(data_path, local, dtypes = dtypes)
+    csv_store = CSVDataStore(data_path, local, dtypes = dtypes)
+    if parquet_store.exists():
+        if not PARQUET_ENABLED:
+            raise ImportError(f'pyarrow is needed by {parquet_store.get_local_path()}')
+        return parquet_store
+    if csv_store.exists():
+        return csv_store
+    if mode is None:
+        mode = DATA_STORE_MODE
+    if STORE_MODE.PARQUET == mode and PARQUET_ENABLED:
+        return parquet_store
+    return csv_store
+
+
+#----------------------------------------------------------------------
+def is_dataset_csv(path: str):
+    """check the csv is a dataset by its header"""
+    with open(path, 'r') as f:
+        return f.readline().startswith(INDEX_KEY)
+
+
+#----------------------------------------------------------------------
+def migrate_csv_to_parquet(data_path: str = DATA_ROOT):
+    """migrate the csv datasets to parquet, the csv files are kept as the
+    export for the scp"""
+    if not PARQUET_ENABLED:
+        raise ImportError('pyarrow is needed by the parquet store, pip3 install pyarrow')
+    migrated = []
+    for path in sorted(glob.glob(os.path.join(data_path, '*.csv'))):
+        if not is_dataset_csv(path):
+            continue
+        local = os.path.basename(path)[:-len('.csv')]
+        # the rows are copied as they are stored, not compacted
+        parquet_store = ParquetDataStore(data_path, local, compact = False)
+        if parquet_store.exists():
+            continue
+        csv_store = CSVDataStore(data_path, local, compact = False)
+        csv_store.compact()
+        parquet_store.save(csv_store.load())
+        logger.info(f'{path} migrated to {parquet_store.get_local_path()}')
+        migrated.append(local)
+    return migrated
+
+
+#----------------------------------------------------------------------
+def export_csv(data_path: str = DATA_ROOT):
+    """export the parquet datasets to csv for the csv consumers"""
+    exported = []
+    for path in sorted(glob.glob(os.path.join(data_path, '*', '*.parquet'))):
+        local = os.path.basename(os.path.dirname(path))
+        if local in exported:
+            continue
+        ParquetDataStore(data_path, local, compact = False).export_csv()
+        exported.append(local)
+    return exported
+
+
+#----------------------------------------------------------------------
+def compact(data_path: str = DATA_ROOT):
+    """compact the segments of all the datasets"""
+    compacted = []
+    paths = glob.glob(os.path.join(data_path, f'*.{SEGMENTS_DIR}')) + \
+        glob.glob(os.path.join(data_path, '*', SEGMENTS_DIR))
+    for path in sorted(paths):
+        if os.path.basename(path) == SEGMENTS_DIR:
+            store = ParquetDataStore(data_path, os.path.basename(os.path.dirname(path)))
+        else:
+            store = CSVDataStore(data_path, os.path.basename(path)[:-len(SEGMENTS_DIR) - 1])
+        if store.compact():
+            compacted.append(store.local)
+    return compacted
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--migrate', type = bool, dest = 'migrate', default = False,
+                            help = 'migrate the csv datasets to parquet. ')
+    arg_parser.add_argument('--export', type = bool, dest = 'export', default = False,
+                            help = 'export the parquet datasets to csv. ')
+    arg_parser.add_argument('--compact', type = bool, dest = 'compact', default = False,
+                            help = 'compact the segments into the datasets. ')
+    args = arg_parser.parse_args()
+    if args.migrate:
+        migrate_csv_to_parquet()
+    if args.compact:
+        compact()
+    if args.export:
+        export_csv()
@@ -0,0 +1,277 @@
+# encoding: UTF-8
+
+from .data_ref import INDEX_KEY, PRODUCT_GROUP_NAME, CLOSE_PRICE_NAME, \
+    OPEN_PRICE_NAME, HIGH_PRICE_NAME, LOW_PRICE_NAME, HV_20_NAME, HV_20_250_NAME, HV_PER, HV_MAX, HV_MIN, \
+    IV_NAME, IV_PER, IV_MAX, IV_MIN, make_sure_dirs_exist
+from .utilities_hv import HV_DISTRIBUTION_PERIODS, index_distribution_of_per, \
+    range_volatility, RangeEstimator
+from .logger import logger
+
+import os, sys, json, hashlib
+import pandas as pd
+import numpy as np
+
+
+# sub directory of the analytics states in the data path
+HV_STATE_DIR = 'hv_state'
+# the columns of the bars for the range based hv
+RANGE_COLUMNS = [OPEN_PRICE_NAME, HIGH_PRICE_NAME, LOW_PRICE_NAME, CLOSE_PRICE_NAME]
+
+
+#----------------------------------------------------------------------
+def percentage_of_last(values: np.ndarray, n: int = HV_DISTRIBUTION_PERIODS):
+    """the percentage of the last value in the last n values, as calc_percentage"""
+    if values.shape[0] < n or np.isnan(values[-n:]).any():
+        return np.nan
+    window = values[-n:]
+    less = (window < window[-1]).sum()
+    return float(np.searchsorted(index_distribution_of_per(n), less, side = 'left'))
+
+
+#----------------------------------------------------------------------
+def window_checksum(closes: np.ndarray):
+    """the checksum of the closes of the window"""
+    return hashlib.md5(np.ascontiguousarray(closes, dtype = float).tobytes()).hexdigest()
+
+
+#----------------------------------------------------------------------
+def running_max_min(val: float, max_: float, min_: float):
+    """step the running max and min as historical_max_min"""
+    if val >= sys.float_info.min:
+        max_ = max(max_, val)
+    if val <= sys.float_info.max:
+        min_ = min(min_, val)
+    return max_, min_
+
+
+#----------------------------------------------------------------------
+def max_min_value(max_: float, min_: float):
+    """the marked max and min, '-' when there is no value yet"""
+    if sys.float_info.min == max_ and sys.float_info.max == min_:
+        return '-', '-'
+    return max_, min_
+
+
+#----------------------------------------------------------------------
+class HVState(object):
+    """the analytics state of one product: the last close, the log returns of
+    the longest hv window, the hv and iv of the percentage window and the
+    running extremes. with the range based hv, the bars of their windows and
+    the range hv of the percentage window too. stepping one day only touches
+    the windows, so it does not grow with the history. the first date and the
+    checksum of the window tell if the history is changed, only the rows from
+    the first date are needed to step it."""
+
+    def __init__(self, pid: str, windows: dict, date: str = None, close: float = np.nan,
+                 returns: list = [], hvs: list = [], ivs: list = [],
+                 hv_max: float = sys.float_info.min, hv_min: float = sys.float_info.max,
+                 iv_max: float = sys.float_info.min, iv_min: float = sys.float_info.max,
+                 start: str = None, checksum: str = None,
+                 ranges: dict = {}, bars: list = [], range_hvs: dict = {}):
+        """Constructor"""
+        self.pid = pid
+        # the window to the hv column, as FuturesDataManager.hv_windows
+        self.windows = {int(n): key for n, key in windows.items()}
+        # the estimator to its window and columns, as
+        # FuturesDataManager.range_hv_estimators, persisted by the names
+        self.ranges = {RangeEstimator[estimator] if isinstance(estimator, str) else estimator:
+                       tuple(values) for estimator, values in ranges.items()}
+        self.date = date
+        self.close = close
+        self.start = start
+        self.checksum = checksum
+        self.returns = np.asarray(returns, dtype = float)
+        self.hvs = np.asarray(hvs, dtype = float)
+        self.ivs = np.asarray(ivs, dtype = float)
+        self.hv_max = hv_max
+        self.hv_min = hv_min
+        self.iv_max = iv_max
+        self.iv_min = iv_min
+        self.bars = np.asarray(bars, dtype = float).reshape(-1, len(RANGE_COLUMNS))
+        self.range_hvs = {key: np.asarray(hvs, dtype = float) for key, hvs in range_hvs.items()}
+
+    #----------------------------------------------------------------------
+    @classmethod
+    def from_history(cls, df: pd.DataFrame, windows: dict, ranges: dict = {}):
+        """build the state from the tail of the analyzed history"""
+        size = max(windows.keys())
+        closes = df[CLOSE_PRICE_NAME].to_numpy(dtype = float)[-size - 1:]
+        returns = np.full(closes.shape[0], np.nan)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            returns[1:] = np.log(closes[1:] / closes[:-1])
+        to_float = lambda val, default: default if '-' == val else float(val)
+        state = cls(df[PRODUCT_GROUP_NAME].iloc[-1], windows, df.index[-1], closes[-1],
+                    returns[-size:] if closes.shape[0] > size else returns,
+                    df[HV_20_NAME].to_numpy(dtype = float)[-HV_DISTRIBUTION_PERIODS:],
+                    df[IV_NAME].to_numpy(dtype = float)[-HV_DISTRIBUTION_PERIODS:],
+                    to_float(df[HV_MAX].iloc[-1], sys.float_info.min),
+                    to_float(df[HV_MIN].iloc[-1], sys.float_info.max),
+                    to_float(df[IV_MAX].iloc[-1], sys.float_info.min),
+                    to_float(df[IV_MIN].iloc[-1], sys.float_info.max), ranges = ranges)
+        if state.ranges:
+            state.bars = df[RANGE_COLUMNS].to_numpy(dtype = float)[-state.get_bars_size():]
+            state.range_hvs = {key: df[key].to_numpy(dtype = float)[-HV_DISTRIBUTION_PERIODS:]
+                               for _n, key, _per_key in state.ranges.values()}
+        state.set_window(df)
+        return state
+
+    #----------------------------------------------------------------------
+    @classmethod
+    def from_dict(cls, values: dict):
+        """load the state from the persisted values"""
+        return cls(**values)
+
+    #----------------------------------------------------------------------
+    def to_dict(self):
+        """the values to persist"""
+        return {'pid': self.pid, 'windows': self.windows, 'date': self.date,
+                'close': float(self.close), 'returns': self.returns.tolist(),
+                'hvs': self.hvs.tolist(), 'ivs': self.ivs.tolist(),
+                'hv_max': self.hv_max, 'hv_min': self.hv_min,
+                'iv_max': self.iv_max, 'iv_min': self.iv_min,
+                'start': self.start, 'checksum': self.checksum,
+                'ranges': {estimator.name: list(values) for estimator, values in self.ranges.items()},
+                'bars': self.bars.tolist(),
+                'range_hvs': {key: hvs.tolist() for key, hvs in self.range_hvs.items()}}
+
+    #----------------------------------------------------------------------
+    def get_hv(self, n: int):
+        """the hv of the last n returns, nan if any of them is not finite"""
+        returns = self.returns[-n:]
+        if returns.shape[0] < n or not np.isfinite(returns).all():
+            return np.nan
+        return np.sqrt(HV_DISTRIBUTION_PERIODS * returns.var(ddof = 1))
+
+    #----------------------------------------------------------------------
+    def get_range_hv(self, estimator: RangeEstimator, n: int):
+        """the range based hv of the last n bars"""
+        bars = pd.DataFrame(self.bars, columns = RANGE_COLUMNS)
+        return range_volatility(bars, n, estimator).iloc[-1]
+
+    #----------------------------------------------------------------------
+    def get_bars_size(self):
+        """the bars kept for the range based hv, the overnight return needs
+        the close before the window"""
+        return max([n for n, _key, _per_key in self.ranges.values()], default = 0) + 1
+
+    #----------------------------------------------------------------------
+    def get_window(self, df: pd.DataFrame):
+        """the closes of the window ended at the date of the state, so are
+        the open, high and low with the range based hv"""
+        columns = RANGE_COLUMNS if self.ranges else [CLOSE_PRICE_NAME]
+        rows = df[columns][df.index <= self.date]
+        return rows[-max(self.windows.keys()) - 1:]
+
+    #----------------------------------------------------------------------
+    def set_window(self, df: pd.DataFrame):
+        """keep the first date and the checksum of the window"""
+        rows = self.get_window(df)
+        self.start = rows.index[0]
+        self.checksum = window_checksum(rows.to_numpy(dtype = float))
+
+    #----------------------------------------------------------------------
+    def can_step(self, df: pd.DataFrame):
+        """check the window the state built from is not changed, the data
+        must have the rows from the first date of the window"""
+        if self.start is None or self.checksum is None:
+            return False
+        rows = self.get_window(df[df.index >= self.start])
+        if rows.empty or rows.index[0] != self.start or rows.index[-1] != self.date:
+            return False
+        return window_checksum(rows.to_numpy(dtype = float)) == self.checksum
+
+    #----------------------------------------------------------------------
+    def step(self, date: str, close: float, iv: float, bar: np.ndarray = None):
+        """step the state by one trading day, the bar is the open, high, low
+        and close for the range based hv"""
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            ret = np.log(np.float64(close) / self.close)
+        size = max(self.windows.keys())
+        self.returns = np.append(self.returns, ret)[-size:]
+        hv = self.get_hv(min(self.windows.keys()))
+        self.hvs = np.append(self.hvs, hv)[-HV_DISTRIBUTION_PERIODS:]
+        self.ivs = np.append(self.ivs, iv)[-HV_DISTRIBUTION_PERIODS:]
+        self.hv_max, self.hv_min = running_max_min(hv, self.hv_max, self.hv_min)
+        self.iv_max, self.iv_min = running_max_min(iv, self.iv_max, self.iv_min)
+        if self.ranges:
+            self.bars = np.append(self.bars, [bar], axis = 0)[-self.get_bars_size():]
+            for estimator, (n, key, _per_key) in self.ranges.items():
+                self.range_hvs[key] = np.append(self.range_hvs.get(key, []), self.get_range_hv(
+                    estimator, n))[-HV_DISTRIBUTION_PERIODS:]
+        self.date = date
+        self.close = float(close)
+
+    #----------------------------------------------------------------------
+    def update(self, df: pd.DataFrame, ivs: pd.Series):
+        """step the state by the days after the last one"""
+        new = df.index > self.date
+        bars = df[RANGE_COLUMNS].to_numpy(dtype = float)[new] if self.ranges else [None] * new.sum()
+        for date, close, iv, bar in zip(df.index[new], df[CLOSE_PRICE_NAME][new], ivs[new], bars):
+            self.step(date, close, float(iv), bar)
+        self.set_window(df)
+
+    #----------------------------------------------------------------------
+    def to_frame(self):
+        """the last day of the product, the columns are the ones of sort_hv20250"""
+        row = {PRODUCT_GROUP_NAME: self.pid, CLOSE_PRICE_NAME: self.close}
+        for n, key in self.windows.items():
+            row[key] = self.get_hv(n)
+        row[HV_20_250_NAME] = row[self.windows[min(self.windows.keys())]] / \
+            row[self.windows[max(self.windows.keys())]]
+        row[HV_PER] = percentage_of_last(self.hvs)
+        row[HV_MAX], row[HV_MIN] = max_min_value(self.hv_max, self.hv_min)
+        for _n, key, per_key in self.ranges.values():
+            hvs = self.range_hvs.get(key, np.empty(0))
+            row[key] = hvs[-1] if hvs.shape[0] > 0 else np.nan
+            row[per_key] = percentage_of_last(hvs)
+        row[IV_NAME] = self.ivs[-1] if self.ivs.shape[0] > 0 else np.nan
+        row[IV_PER] = percentage_of_last(self.ivs)
+        row[IV_MAX], row[IV_MIN] = max_min_value(self.iv_max, self.iv_min)
+        return pd.DataFrame([row], index = pd.Index([self.date], name = INDEX_KEY))
+
+
+#----------------------------------------------------------------------
+class HVStates(object):
+    """the persisted analytics states of the products"""
+
+    def __init__(self, path: str):
+        """Constructor"""
+        self.path = path
+        try:
+            with open(path, 'r') as f:
+                self.states = {pid: HVState.from_dict(values)
+                               for pid, values in json.load(f).items()}
+        except FileNotFoundError:
+            self.states = {}
+
+    #----------------------------------------------------------------------
+    def get_start(self):
+        """the first date of the windows of the states, None if no state"""
+        starts = [state.start for state in self.states.values()]
+        return min(starts) if starts and None not in starts else None
+
+    #----------------------------------------------------------------------
+    def get_date(self):
+        """the earliest date of the states, None if no state"""
+        dates = [state.date for state in self.states.values()]
+        return min(dates) if dates and None not in dates else None
+
+    #----------------------------------------------------------------------
+    def get(self, pid: str):
+        """get the state of the product, None if not built"""
+        return self.states.get(pid, None)
+
+    #----------------------------------------------------------------------
+    def set(self, pid: str, state: HVState):
+        """set the state of the product"""
+        self.states[pid] = state
+
+    #----------------------------------------------------------------------
+    def save(self):
+        """save the states"""
+        make_sure_dirs_exist(os.path.dirname(self.path))
+        tmp_path = f'{self.path}.{os.getpid()}'
+        with open(tmp_path, 'w') as f:
+            json.dump({pid: state.to_dict() for pid, state in self.states.items()}, f)
+        os.replace(tmp_path, self.path)
+        logger.info(f'{self.path} saved with {len(self.states)} states. ')
@@ -0,0 +1,94 @@
+# encoding: UTF-8
+
+from .data_ref import INDEX_KEY, PRODUCT_ID_NAME, CLOSE_PRICE_NAME, U_PRICE_NAME, \
+    IV_NAME, REMAIN_DAYS_NAME, make_sure_dirs_exist
+from .utilities_options import oc_mgr, INTEREST_RATE, IVSolverMode
+from .logger import logger
+
+import os
+import pandas as pd
+import numpy as np
+
+
+# sub directory of the iv cache in the data path
+IV_CACHE_DIR = 'iv_cache'
+
+RATE_NAME = 'rate'
+MODEL_NAME = 'model'
+
+KEY_NAMES = [INDEX_KEY, PRODUCT_ID_NAME, CLOSE_PRICE_NAME, U_PRICE_NAME, RATE_NAME, MODEL_NAME,
+             REMAIN_DAYS_NAME]
+
+CACHE_DTYPES = {
+    INDEX_KEY: str,
+    PRODUCT_ID_NAME: str,
+    CLOSE_PRICE_NAME: float,
+    U_PRICE_NAME: float,
+    RATE_NAME: float,
+    MODEL_NAME: str,
+    IV_NAME: float,
+    REMAIN_DAYS_NAME: int
+}
+
+
+#----------------------------------------------------------------------
+class IVCache(object):
+    """the solved iv and remained days keyed by the inputs of the pricing,
+    changing any input or the model's version misses the cache"""
+
+    def __init__(self, path: str, solver_mode: IVSolverMode = None):
+        """Constructor"""
+        self.path = path
+        # the iv solver of the keys, the global one by default
+        self.solver_mode = solver_mode
+        # the solved ones, merged into the cache on saving
+        self.updates = []
+        try:
+            self.df = pd.read_csv(path, float_precision = 'round_trip', dtype = CACHE_DTYPES)
+        except FileNotFoundError:
+            self.df = pd.DataFrame(columns = list(CACHE_DTYPES.keys())).astype(CACHE_DTYPES)
+
+    #----------------------------------------------------------------------
+    def get_keys(self, df: pd.DataFrame, interest_rate: float = INTEREST_RATE):
+        """get the cache keys of the options data"""
+        return pd.DataFrame({
+            INDEX_KEY: df.index.to_numpy(dtype = str),
+            PRODUCT_ID_NAME: df[PRODUCT_ID_NAME].to_numpy(dtype = str),
+            CLOSE_PRICE_NAME: df[CLOSE_PRICE_NAME].to_numpy(dtype = float),
+            U_PRICE_NAME: df[U_PRICE_NAME].to_numpy(dtype = float),
+            RATE_NAME: interest_rate,
+            MODEL_NAME: oc_mgr.get_iv_model_keys(df[PRODUCT_ID_NAME].to_numpy(),
+                                                 self.solver_mode),
+            # the changed expiry date, e.g. by a holiday, misses the cache
+            REMAIN_DAYS_NAME: oc_mgr.calc_rdays_batch(df[PRODUCT_ID_NAME].to_numpy(),
+                                                      df.index.to_numpy())})
+
+    #----------------------------------------------------------------------
+    def lookup(self, keys: pd.DataFrame):
+        """get the cached iv and remained days, nan for the missed ones"""
+        df = keys.merge(self.df, how = 'left', on = KEY_NAMES)
+        return df[IV_NAME].to_numpy(dtype = float), \
+            np.where(df[IV_NAME].isna(), np.nan, df[REMAIN_DAYS_NAME].to_numpy(dtype = float))
+
+    #----------------------------------------------------------------------
+    def update(self, keys: pd.DataFrame, ivs: np.ndarray, rdays: np.ndarray):
+        """cache the solved iv and remained days"""
+        if keys.empty:
+            return
+        df = keys.copy()
+        df[IV_NAME] = ivs
+        df[REMAIN_DAYS_NAME] = rdays
+        self.updates.append(df)
+
+    #----------------------------------------------------------------------
+    def save(self):
+        """save the cache if changed"""
+        if not self.updates:
+            return
+        # only the last solved one of each contract and date is kept
+        self.df = pd.concat([self.df] + self.updates).drop_duplicates(
+            [INDEX_KEY, PRODUCT_ID_NAME], keep = 'last')
+        self.updates = []
+        make_sure_dirs_exist(os.path.dirname(self.path))
+        self.df.to_csv(path_or_buf = self.path, index = False)
+        logger.info(f'{self.path} saved with {self.df.shape[0]} iv. ')
@@ -1,7 +1,7 @@
 #encoding: UTF-8
 
 
-from .data_ref import SYNC_DATA_MODE, DATA_ROOT, make_sure_dirs_exist
+from .data_ref import SYNC_DATA_MODE, DATA_DTYPES, DATA_ROOT, make_sure_dirs_exist
 from .data_ref import INDEX_KEY, DATE_FORMAT
 from .data_ref import PRODUCT_ID_NAME, PRODUCT_GROUP_NAME, \
     OPEN_PRICE_NAME, HIGH_PRICE_NAME, LOW_PRICE_NAME, CLOSE_PRICE_NAME, \
@@ -10,8 +10,10 @@ from .data_ref import PRODUCT_ID_NAME, PRODUCT_GROUP_NAME, \
     TURNOVER_RDAYS_NAME
 from .data_ref import IV_NAME, U_PRODUCT_ID_NAME, S_PRICE_NAME, \
     U_PRICE_NAME, OPTION_TYPE_NAME, O_COLUMN_NAMES, EXPIRY_NAME
-from .utilities import load_futures_by_csv
-from .utilities_options import oc_mgr
+from .utilities_options import oc_mgr, IVSolverMode
+from . import utilities_options
+from .iv_cache import IVCache, IV_CACHE_DIR
+from .data_store import create_data_store
 from .xml_to_pandas_dataframe import xml_to_pandas_dataframe
 from .soup_to_pandas_dataframe import soup_to_pandas_dataframe
 from .singleton import Singleton
@@ -32,6 +34,7 @@ import os, re, json, traceback, urllib, urllib3, requests, http, time
 from urllib.parse import urlparse
 from bs4 import BeautifulSoup
 from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
 
@@ -54,6 +57,8 @@ OPTION_BIAS_AA = 0.25
 
 OPTIONS_NAME_RE = '(\w+\d+)(C|P)(\d+)'
 OPTIONS_NAME_DASH_RE = '(\w+\d+)-(C|P)-(\d+)'
+# the contract name without the strike price, e.g. cu2103C, IO2106-P-
+OPTIONS_CHAIN_RE = '\d+$'
 
 
 PROXY_STATUS = [304, 504]
@@ -235,18 +240,57 @@ def fix_close_data(df: pd.DataFrame):
     return df
 
 
+#----------------------------------------------------------------------
+def grouped_weighted_average(df: pd.DataFrame, values: np.ndarray, weights: np.ndarray):
+    """the average of the values weighted by the weights of each date and
+    group, from the grouped sums. the groups without weight are nan, so are the
+    ones with a nan value or weight as np.average"""
+    weighted = values * weights
+    sums = pd.DataFrame({'weighted': weighted, 'weights': weights,
+                         'nans': np.isnan(weighted)}).groupby(
+        [df.index.to_numpy(), df[PRODUCT_GROUP_NAME].to_numpy()]).sum()
+    return (sums['weighted'] / sums['weights']).where(
+        (sums['weights'] != 0) & (sums['nans'] == 0))
+
+
+#----------------------------------------------------------------------
+def set_total_rows(df_in: pd.DataFrame, column: str, averages: pd.Series,
+                   total_key: str = TOTAL_ROW_KEY):
+    """set the column of the total rows by the averages of each date and group"""
+    totals = (df_in[PRODUCT_ID_NAME] == total_key).to_numpy()
+    keys = pd.MultiIndex.from_arrays([df_in.index[totals], df_in[PRODUCT_GROUP_NAME][totals]])
+    values = df_in[column].to_numpy(dtype = float).copy()
+    values[totals] = np.round(averages.reindex(keys).to_numpy(), 3)
+    df_in[column] = values
+    return df_in
+
+
 #----------------------------------------------------------------------
 def calculate_index(df_in: pd.DataFrame, total_key: str = TOTAL_ROW_KEY):
-    """calculate the index, weighted average close price by open interest"""
-    # https://stackoverflow.com/questions/31521027/groupby-weighted-average-and-sum-in-pandas-dataframe
-    # https://stackoverflow.com/questions/26205922/calculate-weighted-average-using-a-pandas-dataframe
+    """calculate the index, weighted average close price by open interest, so
+    are the open, high and low for the range based hv"""
     df = df_in[df_in[PRODUCT_ID_NAME] != TOTAL_ROW_KEY]
-    wm = lambda x: np.average(x[CLOSE_PRICE_NAME], weights = x[OPEN_INTEREST_NAME])
-    group = df.groupby([df.index, PRODUCT_GROUP_NAME]).apply(wm)
-    df_in[CLOSE_PRICE_NAME] = np.where(
-        df_in[PRODUCT_ID_NAME] == total_key,
-        round(group[pd.MultiIndex.from_arrays([df_in.index, df_in[PRODUCT_GROUP_NAME]])], 3),
-        df_in[CLOSE_PRICE_NAME])
+    weights = df[OPEN_INTEREST_NAME].to_numpy(dtype = float)
+    index = grouped_weighted_average(df, df[CLOSE_PRICE_NAME].to_numpy(dtype = float), weights)
+    df_in = set_total_rows(df_in, CLOSE_PRICE_NAME, index, total_key)
+    ranges = [key for key in [OPEN_PRICE_NAME, HIGH_PRICE_NAME, LOW_PRICE_NAME] if key in df_in.columns]
+    for key in ranges:
+        # the contracts not traded have no open, high and low
+        values = df[key].to_numpy(dtype = float)
+        valid = values > 0
+        index = grouped_weighted_average(df, np.where(valid, values, 0), weights * valid)
+        df_in = set_total_rows(df_in, key, index, total_key)
+    if len(ranges) == 3:
+        # the averages of the contracts may cross, keep the open and close in
+        # the range
+        totals = (df_in[PRODUCT_ID_NAME] == total_key).to_numpy()
+        open_, high, low, close = [df_in[key].to_numpy(dtype = float).copy() for key in
+                                   [OPEN_PRICE_NAME, HIGH_PRICE_NAME, LOW_PRICE_NAME, CLOSE_PRICE_NAME]]
+        high[totals] = np.fmax(high, np.fmax(open_, close))[totals]
+        low[totals] = np.fmin(low, np.fmin(open_, close))[totals]
+        # nan if the contracts are not traded
+        df_in[HIGH_PRICE_NAME] = np.where(np.isnan(df_in[HIGH_PRICE_NAME]), np.nan, high)
+        df_in[LOW_PRICE_NAME] = np.where(np.isnan(df_in[LOW_PRICE_NAME]), np.nan, low)
     return df_in
 
 
@@ -257,25 +301,149 @@ def parse_options_name(df: pd.DataFrame, pattern: str = OPTIONS_NAME_RE):
 
 
 #----------------------------------------------------------------------
-def calc_iv_helper(row, total_key: str):
-    if row[PRODUCT_ID_NAME] == total_key:
-        # for total key, pass the old iv directly
-        return 0., 0
+def calculate_iv(df: pd.DataFrame, total_key: str = TOTAL_ROW_KEY,
+                 seeds: pd.DataFrame = None, cache: IVCache = None,
+                 solver_mode: IVSolverMode = None):
+    """calculate single product's iv, seeds are the last solved iv for the
+    incremental mode, only the ones missed in the cache are solved"""
+    solver_mode = solver_mode or utilities_options.IV_SOLVER_MODE
+    ivs, rdays, mask = lookup_iv_cache(df, cache, total_key)
+    if mask.any():
+        v0 = None
+        # only the incremental solver starts from the guesses
+        if seeds is not None and IVSolverMode.INCREMENTAL == solver_mode:
+            v0 = get_iv_guesses(df[mask], seeds)
+        ivs[mask], rdays[mask] = oc_mgr.calc_iv_and_rdays_batch(
+            df[PRODUCT_ID_NAME].to_numpy()[mask],
+            df[CLOSE_PRICE_NAME].to_numpy()[mask],
+            df[U_PRICE_NAME].to_numpy()[mask],
+            df.index.to_numpy()[mask], solver_mode = solver_mode, v0 = v0)
+        if cache is not None:
+            cache.update(cache.get_keys(df[mask]), ivs[mask], rdays[mask])
+    df[IV_NAME] = ivs
+    df[REMAIN_DAYS_NAME] = rdays
+    return df
+
+
+#----------------------------------------------------------------------
+def lookup_iv_cache(df: pd.DataFrame, cache: IVCache = None, total_key: str = TOTAL_ROW_KEY):
+    """get the cached iv and remained days, and the mask of the rows to solve"""
+    ivs = np.zeros(df.shape[0])
+    rdays = np.zeros(df.shape[0], dtype = int)
+    # for total key, pass 0 directly
+    mask = (df[PRODUCT_ID_NAME] != total_key).to_numpy()
+    if cache is not None and mask.any():
+        cached_ivs, cached_rdays = cache.lookup(cache.get_keys(df[mask]))
+        hit = ~np.isnan(cached_ivs)
+        ivs[mask] = np.where(hit, cached_ivs, 0)
+        rdays[mask] = np.where(hit, cached_rdays, 0)
+        mask[mask] = ~hit
+    return ivs, rdays, mask
+
+
+#----------------------------------------------------------------------
+def get_iv_seeds(df: pd.DataFrame, total_key: str = TOTAL_ROW_KEY):
+    """get the solved iv of the last date, the seeds of the incremental iv"""
+    if df is None or df.empty or IV_NAME not in df.columns:
+        return None
+    seeds = df[(df.index == df.index[-1]) & (df[PRODUCT_ID_NAME] != total_key)]
+    seeds = seeds[seeds[IV_NAME] > 0]
+    return seeds[[PRODUCT_ID_NAME, S_PRICE_NAME, IV_NAME]]
+
+
+#----------------------------------------------------------------------
+def get_iv_guesses(df: pd.DataFrame, seeds: pd.DataFrame):
+    """get the initial guess of iv by the contract's last iv, the new listed
+    contract uses the nearest strike's in the same chain, 0 for no guess"""
+    guesses = df[PRODUCT_ID_NAME].map(
+        seeds.drop_duplicates(PRODUCT_ID_NAME, keep = 'last').set_index(PRODUCT_ID_NAME)[IV_NAME])
+    missing = guesses.isna().to_numpy()
+    if missing.any() and not seeds.empty:
+        to_chain = lambda x: pd.DataFrame({
+            'chain': x[PRODUCT_ID_NAME].str.replace(OPTIONS_CHAIN_RE, '', regex = True).to_numpy(),
+            S_PRICE_NAME: x[S_PRICE_NAME].to_numpy(dtype = float)})
+        left = to_chain(df[missing])
+        left['pos'] = np.flatnonzero(missing)
+        right = to_chain(seeds)
+        right[IV_NAME] = seeds[IV_NAME].to_numpy()
+        nearest = pd.merge_asof(left.sort_values(S_PRICE_NAME), right.sort_values(S_PRICE_NAME),
+                                on = S_PRICE_NAME, by = 'chain', direction = 'nearest')
+        guesses.iloc[nearest['pos'].to_numpy()] = nearest[IV_NAME].to_numpy()
+    return guesses.fillna(0).to_numpy(dtype = float)
+
+
+#----------------------------------------------------------------------
+def calculate_iv_incremental(df: pd.DataFrame, total_key: str = TOTAL_ROW_KEY,
+                             cache: IVCache = None):
+    """calculate the iv date by date, each date starts from the previous date's"""
+    days = []
+    seeds = None
+    for _date, day_df in df.groupby(level = 0, sort = False):
+        day_df = calculate_iv(day_df, total_key, seeds, cache, IVSolverMode.INCREMENTAL)
+        seeds = get_iv_seeds(day_df, total_key)
+        days.append(day_df)
+    return pd.concat(days)
+
+
+#----------------------------------------------------------------------
+def sort_by_dates(df: pd.DataFrame):
+    """the positions of the rows sorted by the trade dates, stable in a date"""
+    return np.argsort(df.index.to_numpy(dtype = str), kind = 'stable')
+
+
+#----------------------------------------------------------------------
+def split_by_dates(df: pd.DataFrame, chunks: int):
+    """split the data into chunks of continuous trade dates, the rows of the
+    chunks are in the order of sort_by_dates"""
+    df = df.take(sort_by_dates(df))
+    # the first row of each unique date
+    dates, starts = np.unique(df.index.to_numpy(dtype = str), return_index = True)
+    if not dates.size:
+        return []
+    edges = np.linspace(0, dates.size, min(chunks, dates.size) + 1).astype(int)
+    bounds = np.append(starts, df.shape[0])[edges]
+    return [df.iloc[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+#----------------------------------------------------------------------
+def calculate_iv_chunk(df: pd.DataFrame, solver_mode: IVSolverMode):
+    """calculate the iv of a chunk of trade dates in the worker process"""
+    if IVSolverMode.INCREMENTAL == solver_mode:
+        df = calculate_iv_incremental(df)
     else:
-        iv, rdays = oc_mgr.calc_iv_and_rdays(row[PRODUCT_ID_NAME], row[CLOSE_PRICE_NAME], row[U_PRICE_NAME], row.name)
-        return iv, rdays
+        df = calculate_iv(df, solver_mode = solver_mode)
+    return df[IV_NAME].to_numpy(), df[REMAIN_DAYS_NAME].to_numpy()
 
 
 #----------------------------------------------------------------------
-def calculate_iv(df: pd.DataFrame, total_key: str = TOTAL_ROW_KEY):
-    """calculate single product's iv"""
-    def calc_one_by_one(row):
-        iv, rdays = calc_iv_helper(row, total_key)
-        row[IV_NAME] = iv
-        row[REMAIN_DAYS_NAME] = rdays
-        return row
-    df = df.apply(calc_one_by_one, axis = 1)
-    return df
+def recalculate_siv_parallel(remotes: list, pool_size: int, chunks: int = None):
+    """recalculate the iv and siv of the options data, the history of all
+    the remotes is split by trade dates and solved in a process pool"""
+    chunks = chunks or pool_size
+    jobs = []
+    with ProcessPoolExecutor(max_workers = pool_size) as executor:
+        # schedule all the remotes at once
+        for remote in remotes:
+            _li, df = remote.get_last_index()
+            cache = IVCache(remote.get_iv_cache_path(), remote.solver_mode)
+            ivs, rdays, mask = lookup_iv_cache(df, cache)
+            futures = [executor.submit(calculate_iv_chunk, chunk, remote.solver_mode)
+                       for chunk in split_by_dates(df[mask], chunks)]
+            jobs.append((remote, df, cache, ivs, rdays, mask, futures))
+        # merge the results back to the rows, the chunks are sorted by dates
+        for remote, df, cache, ivs, rdays, mask, futures in jobs:
+            if futures:
+                results = [future.result() for future in futures]
+                positions = np.flatnonzero(mask)[sort_by_dates(df[mask])]
+                ivs[positions] = np.concatenate([result[0] for result in results])
+                rdays[positions] = np.concatenate([result[1] for result in results])
+                cache.update(cache.get_keys(df[mask]), ivs[mask], rdays[mask])
+                cache.save()
+            df[IV_NAME] = ivs
+            df[REMAIN_DAYS_NAME] = rdays
+            df = calculate_siv(df)
+            remote.save_data_test(df)
+            logger.info(f'{remote.get_local_path()} recalculated. ')
 
 
 #----------------------------------------------------------------------
@@ -308,32 +476,33 @@ def calculate_siv_by_tr(df_in: pd.DataFrame, total_key: str = TOTAL_ROW_KEY):
     return calculate_siv_by_column(df_in, TURNOVER_RDAYS_NAME, total_key)
 
 
+#----------------------------------------------------------------------
+def get_siv_weights(df: pd.DataFrame, column: str):
+    """the weights of the iv, the strike bias multiplied by the column"""
+    u_prices = df[U_PRICE_NAME].to_numpy(dtype = float)
+    bias = np.abs(df[S_PRICE_NAME].to_numpy(dtype = float) - u_prices) / u_prices
+    bias = np.where(bias > OPTION_BIAS_AA, 0, np.square((bias - OPTION_BIAS_AA) / OPTION_BIAS_AA))
+    # use price * volumes as turnovers
+    if column in [TURNOVER_NAME, TURNOVER_RDAYS_NAME]:
+        values = df[CLOSE_PRICE_NAME].to_numpy(dtype = float) * df[VOLUME_NAME].to_numpy(dtype = float)
+        if TURNOVER_RDAYS_NAME == column:
+            rdays = df[REMAIN_DAYS_NAME].to_numpy(dtype = float)
+            values = np.where(rdays > 10, values * 10, values * rdays)
+    else:
+        values = df[column].to_numpy(dtype = float)
+    return bias * values
+
+
 #----------------------------------------------------------------------
 def calculate_siv_by_column(df_in: pd.DataFrame, column: str, total_key: str = TOTAL_ROW_KEY):
-    """calculate the siv by the column,  maybe VOLUME_NAME or TURNOVER_NAME"""
+    """calculate the siv by the column, maybe VOLUME_NAME, TURNOVER_NAME,
+    REMAIN_DAYS_NAME or TURNOVER_RDAYS_NAME, the dates without weight are nan"""
     df = df_in[df_in[PRODUCT_ID_NAME] != TOTAL_ROW_KEY]
     # filter the normal iv
     df = df[df[IV_NAME] > 0.01]
-    df[STRIKE_BIAS_NAME] = abs(df[S_PRICE_NAME] - df[U_PRICE_NAME]) / df[U_PRICE_NAME]
-    df[STRIKE_BIAS_NAME] = np.where(df[STRIKE_BIAS_NAME] > OPTION_BIAS_AA,
-                                    0,
-                                    np.square((df[STRIKE_BIAS_NAME] - OPTION_BIAS_AA) / OPTION_BIAS_AA))
-    # use price * volumes as turnovers
-    if column in [TURNOVER_NAME, TURNOVER_RDAYS_NAME]:
-        df[TURNOVER_NAME] = df[CLOSE_PRICE_NAME] * df[VOLUME_NAME]
-        df[TURNOVER_RDAYS_NAME] = np.where(df[REMAIN_DAYS_NAME] > 10,
-                                           df[TURNOVER_NAME] * 10,
-                                           df[TURNOVER_NAME] * df[REMAIN_DAYS_NAME])
-    # totals = df[[PRODUCT_GROUP_NAME, column]].groupby([df.index, PRODUCT_GROUP_NAME]).sum()
-    # df = df.join(totals, how = 'left', on = [df.index, PRODUCT_GROUP_NAME], rsuffix = '_all')
-    df['weights'] = df[STRIKE_BIAS_NAME] * df[column]
-    wm = lambda x: np.average(x[IV_NAME], weights = x['weights'])
-    group = df.groupby([df.index, PRODUCT_GROUP_NAME]).apply(wm)
-    df_in[IV_NAME] = np.where(
-        df_in[PRODUCT_ID_NAME] == total_key,
-        round(group[pd.MultiIndex.from_arrays([df_in.index, df_in[PRODUCT_GROUP_NAME]])], 3),
-        df_in[IV_NAME])
-    return df_in
+    siv = grouped_weighted_average(df, df[IV_NAME].to_numpy(dtype = float),
+                                   get_siv_weights(df, column))
+    return set_total_rows(df_in, IV_NAME, siv, total_key)
 
 
 #----------------------------------------------------------------------
@@ -358,12 +527,18 @@ class IRemoteHttpData(metaclass = ABCMeta):
     request_headers = {'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/73.0.3683.103 Safari/537.36'}
 
     def __init__(self, data_path: str, local: str, dates: pd.Index,
-                 df_extra: pd.DataFrame):
+                 df_extra: pd.DataFrame, via: SYNC_DATA_MODE = None,
+                 solver_mode: IVSolverMode = None):
         """Constructor"""
         self.data_path = data_path
         self.local = self.fix_file_name(local)
         self.dates = dates
         self.df_extra = self.fix_df_extra(df_extra)
+        # the iv solver, the last solved iv are kept for the incremental one
+        self.solver_mode = solver_mode or utilities_options.IV_SOLVER_MODE
+        self.iv_seeds = None
+        self.store = create_data_store(self.data_path, self.local,
+                                       dtypes = DATA_DTYPES.get(via, None))
 
     #----------------------------------------------------------------------
     def fix_df_extra(self, df: pd.DataFrame):
@@ -384,34 +559,58 @@ class IRemoteHttpData(metaclass = ABCMeta):
     #----------------------------------------------------------------------
     def get_local_path(self):
         """get the local file path"""
-        return os.path.join(self.data_path, self.get_local_file())
+        return self.store.get_local_path()
 
     #----------------------------------------------------------------------
-    def get_last_index(self):
-        """get the local last index"""
+    def get_last_index(self, columns: list = None):
+        """get the local last index, only the columns are loaded if given"""
         try:
-            df = load_futures_by_csv(self.get_local_path())
+            df = self.store.load(columns)
             return df.index[-1], df
         except (FileNotFoundError, IndexError):
             return None, None
 
+    #----------------------------------------------------------------------
+    def get_last_date(self):
+        """get the local last date by the manifest, None if no data"""
+        return self.store.get_last_date()
+
+    #----------------------------------------------------------------------
+    def get_dates_data(self, start: str = None, columns: list = None):
+        """get the local data from the start date, the whole data if no start,
+        only the columns are loaded if given"""
+        if start is None:
+            return self.store.load(columns)
+        return self.store.load_dates(start, columns = columns)
+
+    #----------------------------------------------------------------------
+    def get_last_date_data(self):
+        """get the local last date and the data of it"""
+        li = self.get_last_date()
+        if li is None:
+            return None, None
+        return li, self.store.load_dates(li)
+
     #----------------------------------------------------------------------
     def drop_local_last_date_data(self):
         """clear the last date data"""
-        lindex, df = self.get_last_index()
+        lindex = self.store.drop_last_date()
         if lindex:
-            index_names = df[df.index == lindex].index
-            df.drop(index = index_names, inplace = True)
-            df.to_csv(path_or_buf = self.get_local_path())
             logger.info(f'data of {lindex} has been dropped. ')
 
     #----------------------------------------------------------------------
     def sync_data(self):
         """sync the data if needed. """
         try:
-            li, ldf = self.get_last_index()
+            if CSV_WRITE_MODE.APPEND == self.csv_mode:
+                # only the rows of the last date are needed for appending
+                li, ldf = self.get_last_date_data()
+            else:
+                li, ldf = self.get_last_index()
             dates = self.get_the_request_dates(li)
             data = self.do_sync_data(dates, ldf)
+            # fold the segments written by the merges into the dataset
+            self.store.compact()
             logger.info(f'{self.get_local_path()} downloaded. ')
             return data
         except (http.client.RemoteDisconnected,
@@ -444,6 +643,8 @@ class IRemoteHttpData(metaclass = ABCMeta):
     #----------------------------------------------------------------------
     def do_sync_data_one_by_one(self, request_date, ldf: pd.DataFrame):
         """request one"""
+        if IVSolverMode.INCREMENTAL == self.solver_mode:
+            self.iv_seeds = get_iv_seeds(ldf)
         raw_data = self.do_query_remote(request_date)
         data = self.do_data_handle(raw_data, request_date)
         if data is None:
@@ -452,7 +653,7 @@ class IRemoteHttpData(metaclass = ABCMeta):
         # print(data)
         # with index
         if ldf is None:
-            data.to_csv(path_or_buf = self.get_local_path())
+            self.store.save(data)
         else:
             if CSV_WRITE_MODE.APPEND == self.csv_mode:
                 self.do_append_data_to_csv(ldf, data)
@@ -464,24 +665,37 @@ class IRemoteHttpData(metaclass = ABCMeta):
     #----------------------------------------------------------------------
     def do_append_data_to_csv(self, ldf: pd.DataFrame, data: pd.DataFrame):
         """append the data into"""
-        data.to_csv(path_or_buf = self.get_local_path(), mode = 'a', header = False)
+        self.store.append(data)
 
     #----------------------------------------------------------------------
     def do_merge_data_to_csv(self, ldf: pd.DataFrame, data: pd.DataFrame):
         """merge the data into"""
         # append data to the local path, this is not work due to the last
         # row is changed from time to time
-        data = pd.concat([ldf, data])
-        # drop the duplicated index rows
-        data = data[~data.index.duplicated(keep = 'last')]
-        data.to_csv(path_or_buf = self.get_local_path())
-        return data
+        return self.store.merge(ldf, data)
+
+    #----------------------------------------------------------------------
+    def get_iv_cache_path(self):
+        """get the iv cache file path"""
+        return os.path.join(self.data_path, IV_CACHE_DIR, self.get_local_file())
 
     #----------------------------------------------------------------------
     def recalculate_iv_test(self):
-        """recalculate the iv"""
+        """recalculate the iv, the unchanged ones are taken from the iv cache"""
         _li, df = self.get_last_index()
-        df = calculate_iv(df)
+        cache = IVCache(self.get_iv_cache_path(), self.solver_mode)
+        if IVSolverMode.INCREMENTAL == self.solver_mode:
+            df = calculate_iv_incremental(df, cache = cache)
+        else:
+            df = calculate_iv(df, cache = cache, solver_mode = self.solver_mode)
+        cache.save()
+        self.save_data_test(df)
+
+    #----------------------------------------------------------------------
+    def recalculate_index_test(self):
+        """recalculate the index of the total rows, e.g. its open, high and low"""
+        _li, df = self.get_last_index()
+        df = calculate_index(df)
         self.save_data_test(df)
 
     #----------------------------------------------------------------------
@@ -496,7 +710,7 @@ class IRemoteHttpData(metaclass = ABCMeta):
     #----------------------------------------------------------------------
     def save_data_test(self, df: pd.DataFrame):
         """save the data, for test only"""
-        df.to_csv(path_or_buf = self.get_local_path())
+        self.store.save(df)
 
     #----------------------------------------------------------------------
     def do_query_remote_once(self, url: str, data: dict,
@@ -773,7 +987,7 @@ class RemoteHttpCFFEOptionsData(RemoteHttpCFFEData):
         df[U_PRODUCT_ID_NAME] = df[U_PRODUCT_ID_NAME].str.replace('IO\d+', 'csidx300', regex = True)
         df2 = self.get_underlying_close_price(df, date_str)
         df2 = normalize_options_data(df2)
-        df2 = calculate_iv(df2)
+        df2 = calculate_iv(df2, seeds = self.iv_seeds, solver_mode = self.solver_mode)
         df2 = calculate_siv(df2)
         return df2
 
@@ -857,7 +1071,7 @@ class RemoteHttpSHFEOptionsData(RemoteHttpSHFEData):
         df = df[~df[PRODUCT_ID_NAME].str.contains(u'合计', regex = True)]
         df2 = self.get_underlying_close_price(df, date_str)
         df2 = normalize_options_data(df2)
-        df2 = calculate_iv(df2)
+        df2 = calculate_iv(df2, seeds = self.iv_seeds, solver_mode = self.solver_mode)
         df2 = calculate_siv(df2)
         return df2
 
@@ -986,7 +1200,7 @@ class RemoteHttpDCEOptionsData(RemoteHttpDCEData):
         df = parse_options_name(df, OPTIONS_NAME_DASH_RE)
         df2 = self.get_underlying_close_price(df, date_str)
         df2 = normalize_options_data(df2)
-        df2 = calculate_iv(df2)
+        df2 = calculate_iv(df2, seeds = self.iv_seeds, solver_mode = self.solver_mode)
         df2 = calculate_siv(df2)
         return df2
 
@@ -1077,7 +1291,7 @@ class RemoteHttpCZCEOptionsData(RemoteHttpCZCEData):
         df = df[~df[PRODUCT_ID_NAME].str.contains(u'合计', regex = True)]
         df2 = self.get_underlying_close_price(df, date_str)
         df2 = normalize_options_data(df2)
-        df2 = calculate_iv(df2)
+        df2 = calculate_iv(df2, seeds = self.iv_seeds, solver_mode = self.solver_mode)
         df2 = calculate_siv(df2)
         return df2
 
@@ -1104,8 +1318,9 @@ class RemoteDataFactory(metaclass = Singleton):
         make_sure_dirs_exist(self.data_path)
 
     #----------------------------------------------------------------------
-    def create(self, local: str, via: SYNC_DATA_MODE, dates: pd.Index, df_extra: pd.DataFrame):
-        """the creator of RemoteData"""
+    def create(self, local: str, via: SYNC_DATA_MODE, dates: pd.Index, df_extra: pd.DataFrame,
+               solver_mode: IVSolverMode = None):
+        """the creator of RemoteData, solver_mode is the iv solver of the options"""
         data_class = None
         if SYNC_DATA_MODE.HTTP_DOWNLOAD_CSINDEX_000300 == via:
             data_class = RemoteHttpCSIndex000300Data
@@ -1130,7 +1345,7 @@ class RemoteDataFactory(metaclass = Singleton):
         elif SYNC_DATA_MODE.HTTP_DOWNLOAD_CZCE_OPTIONS == via:
             data_class = RemoteHttpCZCEOptionsData
         if data_class != None:
-            return data_class(self.data_path, local, dates, df_extra)
+            return data_class(self.data_path, local, dates, df_extra, via, solver_mode)
         raise NotImplementedError
 
 
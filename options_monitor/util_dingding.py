@@ -121,6 +121,11 @@ def send_html_msg(date_str: str, df: pd.DataFrame, send: bool = True):
 #----------------------------------------------------------------------
 def scp_data(flag: bool = True):
     if flag:
+        # the segments are compacted and the parquet datasets are exported to
+        # csv for the remote
+        from .data_store import compact, export_csv
+        compact(DATA_ROOT)
+        export_csv(DATA_ROOT)
         logger.info('scp data to the server.')
         os.system(f'scp ./data/*.csv {REMOTE_PATH}')
         logger.info('scp done.')
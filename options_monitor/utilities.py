@@ -3,12 +3,18 @@
 import os, sys, datetime, hashlib, glob, re
 import pandas as pd
 import numpy as np
-from .data_ref import DATE_FORMAT, DATE_FORMAT_PATTERN, DATA_ROOT, \
-    INDEX_KEY, PRODUCT_GROUP_NAME, FUTURE_HV_NAMES, HV_250_NAME, HV_PER, IV_PER
+from .data_ref import DATE_FORMAT, DATE_FORMAT_PATTERN, DATA_ROOT, COMPACT_DTYPES, STORE_DECIMALS, \
+    INDEX_KEY, PRODUCT_GROUP_NAME, FUTURE_HV_NAMES, HV_250_NAME, HV_PER, IV_PER, RANGE_HV_PERS
 
 from functools import reduce, cached_property
 from .logger import logger
 
+try:
+    import pyarrow
+    CSV_ENGINE = 'pyarrow'
+except ImportError:
+    CSV_ENGINE = 'c'
+
 
 # markdown head and \n replace
 MD_HEAD_PATTERN = re.compile(r'\|(:?-{3,}:?\|){4,}\n')
@@ -194,20 +200,119 @@ def mk_notification(df: pd.DataFrame):
     # for test
     df = df[~df[HV_PER].isnull()]
     df2[HV_PER] = df[HV_PER].apply(lambda x: f"{int(x)}" if isinstance(x, float) else x)
-    df2[IV_PER] = pd.to_numeric(df[IV_PER], errors = 'coerce')
+    # the iv and the range based hv percentages may be missed
+    pers = [IV_PER] + [key for key in RANGE_HV_PERS if key in df.columns]
+    for key in pers:
+        df2[key] = pd.to_numeric(df[key], errors = 'coerce')
     df2.fillna('-', inplace = True)
-    df2[IV_PER] = df2[IV_PER].apply(lambda x: f"{int(x)}" if isinstance(x, float) else x)
+    for key in pers:
+        df2[key] = df2[key].apply(lambda x: f"{int(x)}" if isinstance(x, float) else x)
     return df2
 
 
 #----------------------------------------------------------------------
-def load_futures_by_csv(path: str):
-    """load futures info by csv"""
-    df = pd.read_csv(path)
+def read_csv_header(path):
+    """the column names of the csv, the path or a file object"""
+    if hasattr(path, 'readline'):
+        pos = path.tell()
+        header = path.readline()
+        path.seek(pos)
+    else:
+        with open(path, 'rb') as f:
+            header = f.readline()
+    if isinstance(header, bytes):
+        header = header.decode('utf-8')
+    return header.rstrip('\r\n').split(',')
+
+
+#----------------------------------------------------------------------
+def load_futures_by_csv(path, columns: list = None, dtypes: dict = None):
+    """load futures info by csv, only the columns if given, typed by the
+    dtypes and the others are inferred. the trade date is kept as string."""
+    header = read_csv_header(path)
+    usecols = None
+    if columns is not None:
+        usecols = [column for column in header if column == INDEX_KEY or column in columns]
+    # the pyarrow engine parses the dates, so it is only for the typed ones
+    engine = 'c' if dtypes is None else CSV_ENGINE
+    dtypes = {column: dtype for column, dtype in (dtypes or {}).items()
+              if column in (usecols or header)}
+    dtypes[INDEX_KEY] = str
+    pos = path.tell() if hasattr(path, 'tell') else None
+    try:
+        df = pd.read_csv(path, usecols = usecols, dtype = dtypes, engine = engine)
+    except ValueError:
+        # e.g. the empty volumes of the old rows, infer them
+        logger.warning(f'{path} does not match the dtypes, inferred. ')
+        if pos is not None:
+            path.seek(pos)
+        df = pd.read_csv(path, usecols = usecols, dtype = {INDEX_KEY: str}, engine = engine)
     df.set_index(INDEX_KEY, inplace = True)
     return df
 
 
+#----------------------------------------------------------------------
+def share_strings(values):
+    """the values with one object for each of the equal strings"""
+    codes, uniques = pd.factorize(values)
+    if (codes < 0).any():
+        return values
+    return uniques.to_numpy(dtype = object)[codes]
+
+
+#----------------------------------------------------------------------
+def fits_compact(values: np.ndarray, dtype: str, decimals: int = None):
+    """check the values are kept by the compact dtype, the integers without nan
+    in its range and the floats as they are written by the decimals"""
+    dtype = np.dtype(dtype)
+    if 0 == values.size:
+        return True
+    if 'i' == dtype.kind:
+        info = np.iinfo(dtype)
+        return not np.isnan(values).any() and (values == np.round(values)).all() and \
+            values.min() >= info.min and values.max() <= info.max
+    if decimals is None:
+        return False
+    return np.array_equal(np.round(values.astype(dtype).astype(float), decimals),
+                          np.round(values, decimals), equal_nan = True)
+
+
+#----------------------------------------------------------------------
+def compact_frame(df: pd.DataFrame, dtypes: dict = None):
+    """a compact copy of the frame to hold in memory, the ids of the dtypes are
+    categorical, the numbers are in COMPACT_DTYPES where they fit and the trade
+    dates share the strings"""
+    casts = {column: 'category' for column, dtype in (dtypes or {}).items()
+             if 'category' == dtype and column in df.columns and
+             'category' != df[column].dtype.name}
+    for column, dtype in COMPACT_DTYPES.items():
+        if column in df.columns and df[column].dtype.kind in 'fi' and fits_compact(
+           df[column].to_numpy(dtype = float), dtype, STORE_DECIMALS.get(column, None)):
+            casts[column] = dtype
+    df = df.astype(casts)
+    df.index = pd.Index(share_strings(df.index), name = df.index.name)
+    return df
+
+
+#----------------------------------------------------------------------
+def expand_frame(df: pd.DataFrame, dtypes: dict = None):
+    """the frame to store, the numbers of COMPACT_DTYPES are widened back to
+    the dtypes and the floats are rounded by STORE_DECIMALS"""
+    if df is None:
+        return df
+    widen = {}
+    for column in COMPACT_DTYPES.keys():
+        if column not in df.columns or df[column].dtype.kind not in 'fi' or \
+           df[column].dtype.itemsize >= 8:
+            continue
+        dtype = np.dtype((dtypes or {}).get(column, df[column].dtype))
+        widen[column] = np.float64 if 'f' == dtype.kind else np.int64
+    df = df.astype(widen) if widen else df
+    decimals = {column: n for column, n in STORE_DECIMALS.items()
+                if column in df.columns and 'f' == df[column].dtype.kind}
+    return df.round(decimals) if decimals else df
+
+
 #----------------------------------------------------------------------
 def is_futures_file(path: str):
     """check the file then return the delivery date"""
@@ -1,8 +1,11 @@
 # encoding: UTF-8
 
 from .data_ref import PRODUCT_GROUP_NAME, CLOSE_PRICE_NAME, \
+    OPEN_PRICE_NAME, HIGH_PRICE_NAME, LOW_PRICE_NAME, \
     HV_20_NAME, HV_250_NAME, HV_20_250_NAME, IV_NAME, \
-    HV_PER, HV_MIN, HV_MAX, IV_PER, IV_MIN, IV_MAX
+    HV_PER, HV_MIN, HV_MAX, IV_PER, IV_MIN, IV_MAX, RANGE_HV_NAMES, RANGE_HV_PERS
+from numpy.lib.stride_tricks import sliding_window_view
+from enum import Enum
 import pandas as pd
 import numpy as np
 import sys
@@ -12,14 +15,113 @@ import sys
 HV_DISTRIBUTION_PERIODS = 250
 
 
+class RangeEstimator(Enum):
+    PARKINSON    = 1
+    GARMAN_KLASS = 2
+    YANG_ZHANG   = 3
+
+
 #----------------------------------------------------------------------
 def historical_volatility(close: pd.Series, n: int):
     """calculate the historical volatility"""
+    return historical_volatilities(close, [n])[n]
+
+
+#----------------------------------------------------------------------
+def prefix_sums(values: np.ndarray):
+    """the prefix sums of the finite values, of their squares and their counts,
+    along the first axis"""
+    valid = np.isfinite(values)
+    values = np.where(valid, values, 0)
+    to_prefix = lambda x: np.concatenate([np.zeros((1, ) + x.shape[1:]), np.cumsum(x, axis = 0)])
+    return to_prefix(values), to_prefix(values * values), to_prefix(valid)
+
+
+#----------------------------------------------------------------------
+def rolling_moments(prefix: tuple, n: int):
+    """the rolling mean and variance of n values from the prefix sums, windows
+    with nan or inf are nan as the rolling does"""
+    sums, squares, counts = prefix
+    shape = (sums.shape[0] - 1, ) + sums.shape[1:]
+    size = shape[0]
+    mean = np.full(shape, np.nan)
+    var = np.full(shape, np.nan)
+    if 1 < n <= size:
+        sum_ = sums[n:] - sums[:-n]
+        full = counts[n:] - counts[:-n] == n
+        mean[n - 1:] = np.where(full, sum_ / n, np.nan)
+        var[n - 1:] = np.where(full, np.maximum(
+            (squares[n:] - squares[:-n] - sum_ * sum_ / n) / (n - 1), 0), np.nan)
+    return mean, var
+
+
+#----------------------------------------------------------------------
+def historical_volatilities(close: pd.Series, windows: list):
+    """calculate the historical volatility of the windows at once, the columns
+    are the windows. the log returns are calculated once, the variance of
+    each window is from the prefix sums of the returns and squared returns."""
+    hvs = pd.DataFrame(index = close.index)
+    for n, hv in rolling_historical_volatilities(close.to_numpy(dtype = float), windows).items():
+        hvs[n] = hv
+    return hvs
+
+
+#----------------------------------------------------------------------
+def rolling_historical_volatilities(closes: np.ndarray, windows: list):
+    """the historical volatility of the windows along the first axis of the
+    closes, the window to the hv array"""
     # NYSE = 252 trading days; Shanghai Stock Exchange = 242; Tokyo Stock Exchange = 246 days?
     # options strategy use 260
-    log_close = np.log(close / np.roll(close, 1))
-    log_close[0] = np.nan
-    return np.sqrt(np.multiply(HV_DISTRIBUTION_PERIODS, log_close.rolling(n).var()))
+    log_close = np.full(closes.shape, np.nan)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        log_close[1:] = np.log(closes[1:] / closes[:-1])
+    prefix = prefix_sums(log_close)
+    hvs = {}
+    for n in windows:
+        _mean, var = rolling_moments(prefix, n)
+        hvs[n] = np.sqrt(HV_DISTRIBUTION_PERIODS * var)
+    return hvs
+
+
+#----------------------------------------------------------------------
+def append_historical_volatilities(df: pd.DataFrame, windows: dict,
+                                   column_name: str = CLOSE_PRICE_NAME):
+    """append the historical volatility columns of the windows in one call,
+    windows is the map of the window to the column name"""
+    hvs = historical_volatilities(df[column_name], list(windows.keys()))
+    for n, key in windows.items():
+        df[key] = hvs[n].to_numpy()
+    return df
+
+
+#----------------------------------------------------------------------
+def range_volatility(df: pd.DataFrame, n: int,
+                     estimator: RangeEstimator = RangeEstimator.YANG_ZHANG):
+    """calculate the range based historical volatility by the open, high, low
+    and close, more efficient than the close to close one with less days"""
+    open_, high, low, close = [df[key].to_numpy(dtype = float) for key in
+                               [OPEN_PRICE_NAME, HIGH_PRICE_NAME, LOW_PRICE_NAME, CLOSE_PRICE_NAME]]
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        log_hl = np.log(high / low)
+        log_co = np.log(close / open_)
+        if RangeEstimator.PARKINSON == estimator:
+            var, _var = rolling_moments(prefix_sums(log_hl * log_hl / (4 * np.log(2))), n)
+        elif RangeEstimator.GARMAN_KLASS == estimator:
+            var, _var = rolling_moments(prefix_sums(
+                0.5 * log_hl * log_hl - (2 * np.log(2) - 1) * log_co * log_co), n)
+        else:
+            # overnight, open to close and rogers-satchell variance
+            log_oc = np.full(close.shape[0], np.nan)
+            log_oc[1:] = np.log(open_[1:] / close[:-1])
+            log_ho = np.log(high / open_)
+            log_lo = np.log(low / open_)
+            k = 0.34 / (1.34 + (n + 1) / (n - 1))
+            _mean, var_o = rolling_moments(prefix_sums(log_oc), n)
+            _mean, var_c = rolling_moments(prefix_sums(log_co), n)
+            var_rs, _var = rolling_moments(prefix_sums(
+                log_ho * (log_ho - log_co) + log_lo * (log_lo - log_co)), n)
+            var = var_o + k * var_c + (1 - k) * var_rs
+    return pd.Series(np.sqrt(HV_DISTRIBUTION_PERIODS * var), index = df.index)
 
 
 #----------------------------------------------------------------------
@@ -74,34 +176,128 @@ def percent_distribution(vix: pd.Series, val: float = None):
 
 
 #----------------------------------------------------------------------
-def calc_percentage(volatility: pd.Series):
-    """"""
-    return volatility.rolling(HV_DISTRIBUTION_PERIODS).apply(lambda rows: percent_distribution(rows))
+def calc_percentage(volatility: pd.Series, n: int = HV_DISTRIBUTION_PERIODS):
+    """the rolling percent_distribution of the whole series at once.
+
+    the percentage is the count of the split values less than the last one,
+    that is the count of the split indexes less than the count of the values
+    less than the last one in the window. windows with nan are not calculated
+    as the rolling does."""
+    return pd.Series(rolling_percentage(volatility.to_numpy(dtype = float), n),
+                     index = volatility.index, name = volatility.name)
 
 
 #----------------------------------------------------------------------
-def historical_max_min(df: pd.DataFrame, column_name: str, max_key: str, min_key: str):
-    """mark the historical max an min in the dataframe"""
-    # according to:
-    # https://stackoverflow.com/questions/61759149/apply-a-function-on-a-dataframe-that-depend-on-the-previous-row-values
-    # NOTE: I rename the variables with _ to avoid using builtin method names
-    max_ = sys.float_info.min
-    min_ = sys.float_info.max
-    # list for the results
-    l_res = []
-    for value in df[column_name].to_numpy():
-        # iterate over the values
-        if value >= max_:
-            max_ = value
-        if value <= min_:
-            min_ = value
-            # append the results in the list
-        if sys.float_info.min == max_ and sys.float_info.max == min_:
-            l_res.append(['-', '-'])
-        else:
-            l_res.append([max_, min_])
-        # create the three columns outside of the loop
-    df[[max_key, min_key]] = pd.DataFrame(l_res, index = df.index)
+def rolling_percentage(values: np.ndarray, n: int = HV_DISTRIBUTION_PERIODS):
+    """the rolling percentage along the first axis of the values"""
+    result = np.full(values.shape, np.nan)
+    if values.shape[0] >= n:
+        windows = sliding_window_view(values, n, axis = 0)
+        lesses = (windows < windows[..., -1:]).sum(axis = -1)
+        percentages = np.searchsorted(index_distribution_of_per(n), lesses, side = 'left')
+        nans = np.concatenate([np.zeros((1, ) + values.shape[1:]),
+                               np.cumsum(np.isnan(values), axis = 0)])
+        valid = nans[n:] == nans[:-n]
+        result[n - 1:] = np.where(valid, percentages, np.nan)
+    return result
+
+
+#----------------------------------------------------------------------
+def mark_no_value(values: np.ndarray, no_value: np.ndarray):
+    """mark the values with '-' where there is no value yet"""
+    if not no_value.any():
+        return values
+    values = values.astype(object)
+    values[no_value] = '-'
+    return values
+
+
+#----------------------------------------------------------------------
+def max_min_sentinels(values: np.ndarray):
+    """the values for the max and the min, nan and the values out of
+    sys.float_info.min and max are replaced by them"""
+    return (np.where(values >= sys.float_info.min, values, sys.float_info.min),
+            np.where(values <= sys.float_info.max, values, sys.float_info.max))
+
+
+#----------------------------------------------------------------------
+def accumulate_max_min(values: np.ndarray):
+    """the running max and min along the first axis, and where there is no
+    value yet"""
+    # the running max and min start from sys.float_info.min and max, nan and
+    # the values out of them are skipped
+    for_max, for_min = max_min_sentinels(values)
+    max_ = np.maximum.accumulate(for_max, axis = 0)
+    min_ = np.minimum.accumulate(for_min, axis = 0)
+    no_value = (sys.float_info.min == max_) & (sys.float_info.max == min_)
+    return max_, min_, no_value
+
+
+#----------------------------------------------------------------------
+def rolling_max_min(values: np.ndarray, n: int):
+    """the max and min of the last n values along the first axis, and where
+    there is no value in the window, skipped as accumulate_max_min"""
+    if 0 == values.shape[0]:
+        return values, values, np.zeros(values.shape, dtype = bool)
+    for_max, for_min = max_min_sentinels(values)
+    # the first windows are padded by the sentinels, so they are the running ones
+    pad = (n - 1, ) + values.shape[1:]
+    for_max = np.concatenate([np.full(pad, sys.float_info.min), for_max])
+    for_min = np.concatenate([np.full(pad, sys.float_info.max), for_min])
+    max_ = sliding_window_view(for_max, n, axis = 0).max(axis = -1)
+    min_ = sliding_window_view(for_min, n, axis = 0).min(axis = -1)
+    no_value = (sys.float_info.min == max_) & (sys.float_info.max == min_)
+    return max_, min_, no_value
+
+
+#----------------------------------------------------------------------
+def historical_max_min(df: pd.DataFrame, column_name: str, max_key: str, min_key: str,
+                       windows: dict = None):
+    """mark the historical max an min in the dataframe, '-' before the first
+    value. windows are the optional rolling periods mapped to their max and
+    min keys, e.g. {250: (max_1y_key, min_1y_key)}"""
+    values = df[column_name].to_numpy(dtype = float)
+    max_, min_, no_value = accumulate_max_min(values)
+    df[max_key] = mark_no_value(max_, no_value)
+    df[min_key] = mark_no_value(min_, no_value)
+    for n, (n_max_key, n_min_key) in (windows or {}).items():
+        max_, min_, no_value = rolling_max_min(values, n)
+        df[n_max_key] = mark_no_value(max_, no_value)
+        df[n_min_key] = mark_no_value(min_, no_value)
+
+
+#----------------------------------------------------------------------
+def to_panel(dfs: list, column_name: str):
+    """the column of the frames in a 2-D array, one column for each frame. the
+    row is the position in the frame, so the windows of each column are the
+    same as the frame's own trading days, padded by nan at the end"""
+    size = max([df.shape[0] for df in dfs], default = 0)
+    panel = np.full((size, len(dfs)), np.nan)
+    for idx, df in enumerate(dfs):
+        panel[:df.shape[0], idx] = df[column_name].to_numpy(dtype = float)
+    return panel
+
+
+#----------------------------------------------------------------------
+def analyze_hv_panel(dfs: list, windows: dict):
+    """analyze the hv of the products in one panel, the same columns as
+    FuturesDataManager.analyze_one_hv are appended to each frame"""
+    if not dfs:
+        return dfs
+    hvs = rolling_historical_volatilities(to_panel(dfs, CLOSE_PRICE_NAME), list(windows.keys()))
+    hvs = {key: hvs[n] for n, key in windows.items()}
+    ratio = hvs[HV_20_NAME] / hvs[HV_250_NAME]
+    percentage = rolling_percentage(hvs[HV_20_NAME])
+    max_, min_, no_value = accumulate_max_min(hvs[HV_20_NAME])
+    for idx, df in enumerate(dfs):
+        size = df.shape[0]
+        for key, hv in hvs.items():
+            df[key] = hv[:size, idx]
+        df[HV_20_250_NAME] = ratio[:size, idx]
+        df[HV_PER] = percentage[:size, idx]
+        df[HV_MAX] = mark_no_value(max_[:size, idx], no_value[:size, idx])
+        df[HV_MIN] = mark_no_value(min_[:size, idx], no_value[:size, idx])
+    return dfs
 
 
 #----------------------------------------------------------------------
@@ -114,8 +310,11 @@ def sort_hv20250(dfs: list):
             date = df.index[-1]
         products.append(df[df.index == date])
     final = pd.concat(products)
-    final = final[[PRODUCT_GROUP_NAME, HV_20_NAME, HV_MIN, HV_MAX, HV_250_NAME,
-                   IV_NAME, IV_MIN, IV_MAX, HV_PER, IV_PER, HV_20_250_NAME]]
+    # the range based hv analyzed, the csindex has none
+    ranges = [key for key in RANGE_HV_NAMES if key in final.columns]
+    range_pers = [key for key in RANGE_HV_PERS if key in final.columns]
+    final = final[[PRODUCT_GROUP_NAME, HV_20_NAME, HV_MIN, HV_MAX, HV_250_NAME] + ranges +
+                  [IV_NAME, IV_MIN, IV_MAX, HV_PER] + range_pers + [IV_PER, HV_20_250_NAME]]
     # final[HV_PER].fillna('', inplace = True)
     final.dropna(subset = [HV_20_250_NAME], inplace = True)
     final.sort_values(by = HV_20_250_NAME, ascending = False, inplace = True)
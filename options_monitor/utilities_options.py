@@ -10,24 +10,41 @@ try:
     # 欧式股票期权
     import black_scholes_cython as black_scholes
 except ImportError:
-    from .pricing import (
-        black_76, binomial_tree, black_scholes
-    )
     logger.info("Faile to import cython option pricing model, please rebuild with cython in cmd.")
     logger.info('pip3 install ./pricing/cython_model/binomial_tree_cython')
     logger.info('pip3 install ./pricing/cython_model/black_76_cython')
     logger.info('pip3 install ./pricing/cython_model/black_scholes_cython')
-
+    try:
+        # numba jit models, compiled on the first call and cached on disk
+        from pricing.numba_model import (
+            black_76_numba as black_76,
+            binomial_tree_numba as binomial_tree,
+            black_scholes_numba as black_scholes
+        )
+    except ImportError:
+        from pricing import (
+            black_76, binomial_tree, black_scholes
+        )
+        logger.info('Faile to import numba option pricing model, the pure python one is used.')
+
+# numpy batch models, solve the whole chain at once
+from pricing import black_76 as black_76_batch, \
+    binomial_tree as binomial_tree_batch, black_scholes as black_scholes_batch
+# 美式期货期权近似解
+from pricing import barone_adesi_whaley
+from pricing import implied_volatility
 
 from .singleton import Singleton
-from .data_ref import DATE_FORMAT
+from .data_ref import DATE_FORMAT, DATA_ROOT, make_sure_dirs_exist, \
+    OPTION_TYPE_NAME, S_PRICE_NAME
 from .utilities_calendar import get_next_trading_day_str
 
 from enum import Enum
 from functools import lru_cache
 from datetime import datetime, timedelta
 import pandas as pd
-import re
+import numpy as np
+import re, os
 
 
 class OptionsType(Enum):
@@ -49,14 +66,55 @@ class PriceModelIndex(Enum):
     EUROPEAN_FUTURES = 1
     EUROPEAN_STOCKS  = 2
     AMERICAN_FUTURES = 3
+    # Barone-Adesi-Whaley, faster but less precise than the binomial tree
+    AMERICAN_FUTURES_BAW = 4
+
+
+class IVSolverMode(Enum):
+    # Newton's method from a fixed initial guess
+    NEWTON   = 1
+    # Newton's method from a rational initial guess, safeguarded by bisection
+    RATIONAL = 2
+    # rational solver warm started from the last solved iv of the contracts
+    INCREMENTAL = 3
+
+
+IV_SOLVER_MODE = IVSolverMode.NEWTON
 
 
 PRICING_MODELS_MAP = {
     PriceModelIndex.EUROPEAN_FUTURES : black_76,
     PriceModelIndex.EUROPEAN_STOCKS  : black_scholes,
-    PriceModelIndex.AMERICAN_FUTURES : binomial_tree
+    PriceModelIndex.AMERICAN_FUTURES : binomial_tree,
+    PriceModelIndex.AMERICAN_FUTURES_BAW : barone_adesi_whaley
+}
+
+BATCH_PRICING_MODELS_MAP = {
+    PriceModelIndex.EUROPEAN_FUTURES : black_76_batch,
+    PriceModelIndex.EUROPEAN_STOCKS  : black_scholes_batch,
+    PriceModelIndex.AMERICAN_FUTURES : binomial_tree_batch,
+    PriceModelIndex.AMERICAN_FUTURES_BAW : barone_adesi_whaley
 }
 
+# the cython models built with the batch kernels or the numba jit models solve
+# the chain in parallel without the GIL, the numpy batch models otherwise
+KERNEL_PRICING_MODELS_MAP = {
+    idx: PRICING_MODELS_MAP.get(idx)
+    if hasattr(PRICING_MODELS_MAP.get(idx), 'calculate_impv_batch') else model
+    for idx, model in BATCH_PRICING_MODELS_MAP.items()
+}
+
+# bump the version after the model or its iv solver changes, the iv cache of
+# the model is invalidated
+PRICING_MODELS_VERSION = {
+    PriceModelIndex.EUROPEAN_FUTURES : 1,
+    PriceModelIndex.EUROPEAN_STOCKS  : 1,
+    PriceModelIndex.AMERICAN_FUTURES : 1,
+    PriceModelIndex.AMERICAN_FUTURES_BAW : 1
+}
+
+# use barone_adesi_whaley.compare_with_binomial_tree to check the error of
+# AMERICAN_FUTURES_BAW before switching a product to it
 OPTIONS_MODELS_MAP = {
     'csidx300' : PriceModelIndex.EUROPEAN_FUTURES,  # 沪深300
     'au_f'     : PriceModelIndex.EUROPEAN_FUTURES,  # 沪金
@@ -70,6 +128,11 @@ INTEREST_RATE = 0.12
 OPTIONS_NAME_PATTERN = r'^([a-z|A-Z]+)([0-9]+)([0-9]{2})(C|P|-C-|-P-)([0-9]+)$'
 COMPILED_OPTIONS_NAME_PATTERN = re.compile(OPTIONS_NAME_PATTERN)
 
+# columns of the parsed contracts
+CONTRACT_NAME = 'name'
+CONTRACT_MONTH = 'month'
+CONTRACT_FULL_DATE = 'full_date'
+
 
 START_DATE = '2017-01-01'
 endtime = datetime.now() + timedelta(days = 732)
@@ -77,6 +140,20 @@ THIRD_FRIDAYS = pd.date_range(start = START_DATE, end = endtime, freq = "WOM-3FR
 FIRST_BUSINESS_DAY = pd.date_range(start = START_DATE, end = endtime, freq = 'BMS')
 LAST_BUSINESS_DAY = pd.date_range(start = START_DATE, end = endtime, freq = 'BM')
 
+# the products of each expiry rule of get_expiry_date
+CFFE_EXPIRY_PRODUCTS = ['IO']
+SHFE_EXPIRY_PRODUCTS = ['cu', 'al', 'zn', 'au', 'ru']
+INE_EXPIRY_PRODUCTS = ['sc']
+DCE_EXPIRY_PRODUCTS = ['m', 'c', 'i', 'pg', 'l', 'v', 'pp', 'p']
+CZCE_EXPIRY_PRODUCTS = ['CF', 'SR', 'RM', 'MA', 'TA', 'ZC']
+# the products supported by get_expiry_date
+EXPIRY_DATE_PRODUCTS = CFFE_EXPIRY_PRODUCTS + SHFE_EXPIRY_PRODUCTS + INE_EXPIRY_PRODUCTS + \
+    DCE_EXPIRY_PRODUCTS + CZCE_EXPIRY_PRODUCTS
+# the expiry dates table, next to the calendar csv
+EXPIRY_DATES_FILE = 'expiry_dates.csv'
+# months of the listed contracts ahead of now, within the trading sessions known
+EXPIRY_DATES_MONTHS_AHEAD = 11
+
 
 #----------------------------------------------------------------------
 def get_pricing_model_by_gid(gid):
@@ -85,11 +162,21 @@ def get_pricing_model_by_gid(gid):
     return model
 
 
+#----------------------------------------------------------------------
+def get_iv_model_key(gid, solver_mode: IVSolverMode = None):
+    """get the key of the pricing model, its version and the iv solver"""
+    solver_mode = solver_mode or IV_SOLVER_MODE
+    idx = OPTIONS_MODELS_MAP.get(gid, PriceModelIndex.AMERICAN_FUTURES)
+    model = KERNEL_PRICING_MODELS_MAP.get(idx) if IVSolverMode.NEWTON == solver_mode \
+        else BATCH_PRICING_MODELS_MAP.get(idx)
+    return f'{idx.name}.{model.__name__}.{PRICING_MODELS_VERSION.get(idx)}.{solver_mode.name}'
+
+
 #----------------------------------------------------------------------
 @lru_cache
 def calc_remained_days(name: str, full_date: str, current: str):
     """calculate the days remaining of options"""
-    expiry_date = get_expiry_date(name, full_date)
+    expiry_date = expiry_mgr.get_expiry_date(name, full_date)
     intervals = datetime.strptime(expiry_date, DATE_FORMAT) - datetime.strptime(current, DATE_FORMAT)
     days = intervals.days + 1
     if days <= 0:
@@ -107,6 +194,42 @@ def calc_iv(gid: str, option_price: float, underlying_price: float,
                                 interest_rate, days / ANNUAL_DAYS, otype)
 
 
+#----------------------------------------------------------------------
+def calc_iv_batch(gids: np.ndarray, option_prices: np.ndarray, underlying_prices: np.ndarray,
+                  strike_prices: np.ndarray, days: np.ndarray, otype_strs: np.ndarray,
+                  interest_rate: float = INTEREST_RATE, solver_mode: IVSolverMode = None,
+                  v0: np.ndarray = None):
+    """calculate the iv of arrays, each pricing model solves its rows at once,
+    v0 is the initial guess for the incremental mode, 0 for no guess"""
+    solver_mode = solver_mode or IV_SOLVER_MODE
+    # map the categories only
+    idxes = pd.Series(gids, dtype = 'category').map(
+        lambda gid: OPTIONS_MODELS_MAP.get(gid, PriceModelIndex.AMERICAN_FUTURES)).to_numpy()
+    otypes = pd.Series(otype_strs, dtype = 'category').map(OPTIONS_TYPE_MAP).to_numpy(dtype = float)
+    days = np.asarray(days, dtype = float)
+    ivs = np.zeros(idxes.shape[0])
+    iterations = np.zeros(idxes.shape[0], dtype = int)
+    for idx in set(idxes):
+        mask = idxes == idx
+        model = BATCH_PRICING_MODELS_MAP.get(idx)
+        args = (np.asarray(option_prices, dtype = float)[mask],
+                np.asarray(underlying_prices, dtype = float)[mask],
+                np.asarray(strike_prices, dtype = float)[mask],
+                interest_rate, days[mask] / ANNUAL_DAYS, otypes[mask])
+        if IVSolverMode.RATIONAL == solver_mode:
+            ivs[mask], iterations[mask] = model.calculate_impv_rational_batch(*args)
+        elif IVSolverMode.INCREMENTAL == solver_mode:
+            ivs[mask], iterations[mask] = model.calculate_impv_rational_batch(
+                *args, v0 = None if v0 is None else np.asarray(v0, dtype = float)[mask])
+        else:
+            ivs[mask] = KERNEL_PRICING_MODELS_MAP.get(idx).calculate_impv_batch(*args)
+    failed = iterations == implied_volatility.FAILED_ITERATIONS
+    if failed.any():
+        logger.warning(f'failed to solve the iv of {failed.sum()} options: '
+                       f'{sorted(set(np.asarray(gids)[failed]))}')
+    return ivs
+
+
 #----------------------------------------------------------------------
 def fill_the_date(year_str: str, month_str: str, delta: int = 732):
     """fill the year and date 01"""
@@ -120,22 +243,34 @@ def fill_the_date(year_str: str, month_str: str, delta: int = 732):
     return str(year) + '-' + month_str + '-01'
 
 
+#----------------------------------------------------------------------
+def fill_the_dates(year_strs: np.ndarray, month_strs: np.ndarray, delta: int = 732):
+    """fill the year and date 01 of arrays, the same as fill_the_date"""
+    n2y = datetime.now() + timedelta(days = delta)
+    year_strs = np.asarray(year_strs, dtype = str)
+    dt = np.where(np.char.str_len(year_strs) == 2, 100, 10)
+    years = n2y.year // dt * dt + year_strs.astype(int)
+    years = np.where(years >= n2y.year, years - dt, years)
+    return np.char.add(np.char.add(years.astype(str), '-'),
+                       np.char.add(np.asarray(month_strs, dtype = str), '-01'))
+
+
 #----------------------------------------------------------------------
 def get_expiry_date(name: str, date_str: str):
     """get the expiry date by the options' name and date"""
-    if 'IO' == name:
+    if name in CFFE_EXPIRY_PRODUCTS:
         # 沪深300, 到期月份的第三个星期五，遇国家法定假日顺延
         dates = THIRD_FRIDAYS[THIRD_FRIDAYS > date_str]
         day_str = get_next_trading_day_str(dates[0])
-    elif name in ['cu', 'al', 'zn', 'au', 'ru']:
+    elif name in SHFE_EXPIRY_PRODUCTS:
         # 上期所，标的期货合约到期日前一个月的倒数第 5 个交易日
         dates = LAST_BUSINESS_DAY[LAST_BUSINESS_DAY < date_str]
         day_str = get_next_trading_day_str(dates[-1], -5)
-    elif name in ['sc']:
+    elif name in INE_EXPIRY_PRODUCTS:
         # 上期能源所，标的期货合约到期日前一个月的倒数第 13 个交易日
         dates = LAST_BUSINESS_DAY[LAST_BUSINESS_DAY < date_str]
         day_str = get_next_trading_day_str(dates[-1], -13)
-    elif name in ['m', 'c', 'i', 'pg', 'l', 'v', 'pp', 'p']:
+    elif name in DCE_EXPIRY_PRODUCTS:
         # 大商所，标的期货合约到期日前一个月的第 5 个交易日
         dates = FIRST_BUSINESS_DAY[FIRST_BUSINESS_DAY < date_str]
         day_str = get_next_trading_day_str(dates[-1], 5)
@@ -143,7 +278,7 @@ def get_expiry_date(name: str, date_str: str):
         # 郑商所，2019-09-01 之前为标的期货合约到期日前两个月的倒数第 5 个交易日
         dates = LAST_BUSINESS_DAY[LAST_BUSINESS_DAY < date_str]
         day_str = get_next_trading_day_str(dates[-2], -5)
-    elif name in ['CF', 'SR', 'RM', 'MA', 'TA', 'ZC']:
+    elif name in CZCE_EXPIRY_PRODUCTS:
         # 郑商所，标的期货合约到期日前一个月的第 3 个交易日
         dates = FIRST_BUSINESS_DAY[FIRST_BUSINESS_DAY < date_str]
         day_str = get_next_trading_day_str(dates[-1], 3)
@@ -152,6 +287,99 @@ def get_expiry_date(name: str, date_str: str):
     return day_str
 
 
+#----------------------------------------------------------------------
+class ExpiryDatesManager(object):
+    """the expiry date of each product and contract month. the expired ones
+    are persisted, the others are calculated once in each run as the holidays
+    may be announced later"""
+
+    #----------------------------------------------------------------------
+    def __init__(self, data_path: str = DATA_ROOT):
+        """Constructor"""
+        self.path = os.path.join(data_path, EXPIRY_DATES_FILE)
+        # (name, full_date) -> expiry date
+        self.dates = None
+        self.saved = 0
+
+    #----------------------------------------------------------------------
+    def load(self):
+        """load the persisted expiry dates"""
+        try:
+            df = pd.read_csv(self.path, dtype = str)
+            self.dates = dict(zip(zip(df['name'], df['month']), df['expiry']))
+        except FileNotFoundError:
+            self.dates = {}
+        self.saved = len(self.dates)
+
+    #----------------------------------------------------------------------
+    def build(self, names: list = EXPIRY_DATE_PRODUCTS, start: str = START_DATE):
+        """build the expiry dates of all the contract months till the listed ones"""
+        end = datetime.now() + timedelta(days = 31 * EXPIRY_DATES_MONTHS_AHEAD)
+        months = pd.date_range(start = start, end = end, freq = 'MS').strftime(DATE_FORMAT)
+        for name in names:
+            for full_date in months:
+                try:
+                    self.get_expiry_date(name, full_date)
+                except IndexError:
+                    # the months just after the start date are not covered
+                    pass
+        self.save()
+
+    #----------------------------------------------------------------------
+    def get_expiry_date(self, name: str, full_date: str):
+        """get the expiry date by the options' name and date"""
+        if self.dates is None:
+            self.load()
+        key = (str(name), str(full_date))
+        expiry_date = self.dates.get(key)
+        if expiry_date is None:
+            expiry_date = get_expiry_date(*key)
+            self.dates[key] = expiry_date
+        return expiry_date
+
+    #----------------------------------------------------------------------
+    def get_expiry_dates(self, names: np.ndarray, full_dates: np.ndarray):
+        """get the expiry dates of arrays, each contract month is looked up once"""
+        codes, uniques = pd.factorize(pd.MultiIndex.from_arrays(
+            [np.asarray(names, dtype = str), np.asarray(full_dates, dtype = str)]))
+        expiry_dates = np.array([self.get_expiry_date(name, full_date)
+                                 for name, full_date in uniques], dtype = 'datetime64[D]')
+        self.save()
+        return expiry_dates[codes]
+
+    #----------------------------------------------------------------------
+    def calc_remained_days_batch(self, names: np.ndarray, full_dates: np.ndarray,
+                                 currents: np.ndarray):
+        """calculate the days remaining of arrays"""
+        expiry_dates = self.get_expiry_dates(names, full_dates)
+        days = (expiry_dates - np.asarray(currents, dtype = 'datetime64[D]')).astype(int) + 1
+        if (days <= 0).any():
+            idx = np.argmax(days <= 0)
+            raise ValueError(f'remained days {expiry_dates[idx]} - {currents[idx]},  '
+                             f'{days[idx]} out of range. ')
+        return days
+
+    #----------------------------------------------------------------------
+    def save(self):
+        """persist the expired ones if changed"""
+        today = datetime.now().strftime(DATE_FORMAT)
+        expired = [(name, full_date, expiry_date) for (name, full_date), expiry_date
+                   in self.dates.items() if expiry_date < today]
+        if len(expired) <= self.saved:
+            return
+        make_sure_dirs_exist(os.path.dirname(self.path))
+        # the worker processes may save at the same time
+        tmp_path = f'{self.path}.{os.getpid()}'
+        pd.DataFrame(expired, columns = ['name', 'month', 'expiry']).to_csv(
+            path_or_buf = tmp_path, index = False)
+        os.replace(tmp_path, self.path)
+        self.saved = len(expired)
+        logger.info(f'{self.path} saved with {self.saved} expiry dates. ')
+
+
+expiry_mgr = ExpiryDatesManager()
+
+
 #----------------------------------------------------------------------
 class OptionsContractsManager(metaclass = Singleton):
 
@@ -171,6 +399,39 @@ class OptionsContractsManager(metaclass = Singleton):
         s_price = float(result.group(5))
         return name, full_date, o_type, s_price
 
+    #----------------------------------------------------------------------
+    def parse_the_contracts(self, contracts: np.ndarray):
+        """parse the contract names of a whole column, each distinct name is
+        parsed once and the string columns are categorical"""
+        contracts = pd.Categorical(np.asarray(contracts, dtype = str))
+        parsed = pd.Series(contracts.categories).str.extract(OPTIONS_NAME_PATTERN)
+        invalid = parsed[0].isna().to_numpy()
+        if invalid.any():
+            raise ValueError(f'options contract not supported: {contracts.categories[invalid].tolist()}')
+        df = pd.DataFrame({
+            CONTRACT_NAME: parsed[0],
+            CONTRACT_MONTH: parsed[1] + parsed[2],
+            CONTRACT_FULL_DATE: fill_the_dates(parsed[1], parsed[2]),
+            OPTION_TYPE_NAME: parsed[3].str.strip('-'),
+            S_PRICE_NAME: parsed[4].astype(float)})
+        # take the parsed rows back by the codes of the names
+        df = df.take(contracts.codes).reset_index(drop = True)
+        return df.astype({CONTRACT_NAME: 'category', CONTRACT_MONTH: 'category',
+                          CONTRACT_FULL_DATE: 'category', OPTION_TYPE_NAME: 'category'})
+
+    #----------------------------------------------------------------------
+    def get_iv_model_keys(self, contracts: np.ndarray, solver_mode: IVSolverMode = None):
+        """get the iv model keys of the contracts"""
+        names = self.parse_the_contracts(contracts)[CONTRACT_NAME]
+        return names.map(lambda name: get_iv_model_key(name, solver_mode)).to_numpy(dtype = object)
+
+    #----------------------------------------------------------------------
+    def calc_rdays_batch(self, contracts: np.ndarray, c_dates: np.ndarray):
+        """calculate the remained days of the contracts"""
+        parsed = self.parse_the_contracts(contracts)
+        return expiry_mgr.calc_remained_days_batch(parsed[CONTRACT_NAME],
+                                                   parsed[CONTRACT_FULL_DATE], c_dates)
+
     #----------------------------------------------------------------------
     def calc_iv_and_rdays(self, contract: str, o_price: float, u_price: float,
                           c_date: str, interest_rate: float = INTEREST_RATE):
@@ -181,5 +442,18 @@ class OptionsContractsManager(metaclass = Singleton):
         iv = calc_iv(name, o_price, u_price, s_price, days, o_type, interest_rate)
         return iv, days
 
+    #----------------------------------------------------------------------
+    def calc_iv_and_rdays_batch(self, contracts: np.ndarray, o_prices: np.ndarray,
+                                u_prices: np.ndarray, c_dates: np.ndarray,
+                                interest_rate: float = INTEREST_RATE,
+                                solver_mode: IVSolverMode = None, v0: np.ndarray = None):
+        """calculate the iv of the whole chain"""
+        parsed = self.parse_the_contracts(contracts)
+        names = parsed[CONTRACT_NAME]
+        days = expiry_mgr.calc_remained_days_batch(names, parsed[CONTRACT_FULL_DATE], c_dates)
+        ivs = calc_iv_batch(names, o_prices, u_prices, parsed[S_PRICE_NAME],
+                            days, parsed[OPTION_TYPE_NAME], interest_rate, solver_mode, v0)
+        return ivs, days
+
 
 oc_mgr = OptionsContractsManager()
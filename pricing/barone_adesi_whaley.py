@@ -0,0 +1,360 @@
+from scipy import stats
+from numpy import ndarray
+from typing import Tuple
+import numpy as np
+import time
+
+from . import binomial_tree, black_76, implied_volatility
+
+cdf = stats.norm.cdf
+pdf = stats.norm.pdf
+
+# Result of calculate_greeks_batch
+GREEKS_DTYPE = np.dtype([
+    ('price', float),
+    ('delta', float),
+    ('gamma', float),
+    ('theta', float),
+    ('vega', float)
+])
+
+
+def to_arrays(*args) -> Tuple[ndarray, ...]:
+    """Broadcast the inputs to float arrays of the same shape"""
+    return np.broadcast_arrays(
+        *[np.atleast_1d(np.asarray(x, dtype = float)) for x in args])
+
+
+def calculate_critical_price_batch(
+    f: ndarray,
+    k: ndarray,
+    r: ndarray,
+    t: ndarray,
+    v: ndarray,
+    cp: ndarray,
+    q: ndarray
+) -> ndarray:
+    """Calculate the critical futures price of early exercise of arrays"""
+    # Seed value according to Barone-Adesi and Whaley (1987)
+    v_sqrt_t = v * np.sqrt(t)
+    q_inf = 0.5 * (1 + cp * np.sqrt(1 + 8 * r / np.power(v, 2)))
+    s_inf = k / (1 - 1 / q_inf)
+    h = -2 * v_sqrt_t * k / (cp * (s_inf - k))
+    s = k + (s_inf - k) * (1 - np.exp(h))
+
+    # Calculate the critical price with Newton's method
+    discount = np.exp(-r * t)
+    for i in range(50):
+        d1 = black_76.calculate_d1_batch(s, k, r, t, v)
+        european = black_76.calculate_price_batch(s, k, r, t, v, cp, d1)
+        lhs = cp * (s - k)
+        rhs = european + cp * (1 - discount * cdf(cp * d1)) * s / q
+        slope = cp * discount * cdf(cp * d1) * (1 - 1 / q) + \
+            (cp - discount * pdf(d1) / v_sqrt_t) / q
+
+        # Check if error value meets requirement
+        if np.all(np.abs(lhs - rhs) < k * 0.000001):
+            break
+
+        s = (k + cp * (rhs - slope * s)) / (1 - cp * slope)
+
+    return s
+
+
+def calculate_price_batch(
+    f: ndarray,
+    k: ndarray,
+    r: ndarray,
+    t: ndarray,
+    v: ndarray,
+    cp: ndarray
+) -> ndarray:
+    """Calculate option price of arrays"""
+    f, k, r, t, v, cp = to_arrays(f, k, r, t, v, cp)
+    exercise = np.maximum(0, cp * (f - k))
+    price = exercise.copy()
+
+    # Return option space value if volatility not positive
+    valid = (v > 0) & (t > 0)
+    if not valid.any():
+        return price
+    f, k, r, t, v, cp = (x[valid] for x in (f, k, r, t, v, cp))
+    european = black_76.calculate_price_batch(f, k, r, t, v, cp)
+
+    # No early exercise without interest
+    early = r > 0
+    if not early.all():
+        price[valid] = european
+        valid[valid] = early
+        european = european[early]
+        f, k, r, t, v, cp = (x[early] for x in (f, k, r, t, v, cp))
+
+    # Early exercise premium, huge volatility may be tried by the iv solver
+    with np.errstate(divide = 'ignore', invalid = 'ignore', over = 'ignore'):
+        big_k = 1 - np.exp(-r * t)
+        root = np.sqrt(1 + 8 * r / (np.power(v, 2) * big_k))
+        q = 0.5 * (1 + cp * root)
+        critical = calculate_critical_price_batch(f, k, r, t, v, cp, q)
+        d1 = black_76.calculate_d1_batch(critical, k, r, t, v)
+        a = cp * critical / q * (1 - np.exp(-r * t) * cdf(cp * d1))
+        premium = a * np.power(f / critical, q)
+
+    # Exercise immediately beyond the critical price
+    price[valid] = np.where(cp * (critical - f) > 0,
+                            european + premium,
+                            exercise[valid])
+    return price
+
+
+def calculate_original_vega_batch(
+    f: ndarray,
+    k: ndarray,
+    r: ndarray,
+    t: ndarray,
+    v: ndarray,
+    cp: ndarray
+) -> ndarray:
+    """Calculate option vega of arrays"""
+    price_1 = calculate_price_batch(f, k, r, t, v, cp)
+    price_2 = calculate_price_batch(f, k, r, t, v * 1.001, cp)
+    vega = (price_2 - price_1) / (v * 0.001)
+    return vega
+
+
+def calculate_greeks_batch(
+    f: ndarray,
+    k: ndarray,
+    r: ndarray,
+    t: ndarray,
+    v: ndarray,
+    cp: ndarray,
+    annual_days: int = 240
+) -> ndarray:
+    """Calculate option price and greeks of arrays, as a GREEKS_DTYPE array"""
+    f, k, r, t, v, cp = to_arrays(f, k, r, t, v, cp)
+    df = f * 0.001
+    dt = np.minimum(t * 0.5, 1 / annual_days)
+    greeks: ndarray = np.empty(f.shape, dtype = GREEKS_DTYPE)
+
+    # Price
+    price = calculate_price_batch(f, k, r, t, v, cp)
+    greeks['price'] = price
+
+    # Delta and gamma by central difference
+    price_up = calculate_price_batch(f + df, k, r, t, v, cp)
+    price_down = calculate_price_batch(f - df, k, r, t, v, cp)
+    greeks['delta'] = (price_up - price_down) / (2 * df) * f * 0.01
+    greeks['gamma'] = (price_up - 2 * price + price_down) / np.power(df, 2) * \
+        np.power(f, 2) * 0.0001
+
+    # Theta
+    price_later = calculate_price_batch(f, k, r, t - dt, v, cp)
+    greeks['theta'] = (price_later - price) / (dt * annual_days)
+
+    # Vega
+    price_vega = calculate_price_batch(f, k, r, t, v * 1.001, cp)
+    greeks['vega'] = (price_vega - price) / (0.001 * v * 100)
+
+    return greeks
+
+
+def calculate_impv_batch(
+    price: ndarray,
+    f: ndarray,
+    k: ndarray,
+    r: ndarray,
+    t: ndarray,
+    cp: ndarray
+) -> ndarray:
+    """Calculate option implied volatility of arrays.
+
+    The plain Newton's method from a fixed guess diverges on the out of the
+    money options of the approximation, so it is solved inside the bracket
+    of implied_volatility, 0 for the ones failed to converge.
+    """
+    v, _iterations = calculate_impv_rational_batch(price, f, k, r, t, cp)
+    return v
+
+
+def calculate_impv_rational_batch(
+    price: ndarray,
+    f: ndarray,
+    k: ndarray,
+    r: ndarray,
+    t: ndarray,
+    cp: ndarray,
+    v0: ndarray = None
+) -> Tuple[ndarray, ndarray]:
+    """Calculate option implied volatility of arrays from the rational initial
+    guess of Black-76, or v0 where it is positive, with Newton's method
+    safeguarded by bisection. Returns the implied volatility and the
+    iterations of each element, implied_volatility.FAILED_ITERATIONS if
+    failed to converge."""
+    price, f, k, r, t, cp = to_arrays(price, f, k, r, t, cp)
+
+    # Check option price must be position and meets minimum value (exercise value)
+    meet: ndarray = (price > 0) & (t > 0) & (
+        ((cp == 1) & (price > (f - k))) | ((cp == -1) & (price > (k - f))))
+
+    guess: ndarray = implied_volatility.calculate_guess_batch(
+        price, f * np.exp(-r * t), k, r, np.where(t > 0, t, 1), cp)
+    if v0 is not None:
+        v0 = np.broadcast_to(np.asarray(v0, dtype = float), price.shape)
+        guess = np.where(v0 > 0, v0, guess)
+
+    def calculate(index: ndarray, v: ndarray) -> Tuple[ndarray, ndarray]:
+        fs, ks, rs, ts, cps = (x[index] for x in (f, k, r, t, cp))
+        p = calculate_price_batch(fs, ks, rs, ts, v, cps)
+        p_vega = calculate_price_batch(fs, ks, rs, ts, v * 1.001, cps)
+        return p, (p_vega - p) / (v * 0.001)
+
+    return implied_volatility.solve_batch(calculate, price, meet, guess)
+
+
+def calculate_price(
+    f: float,
+    k: float,
+    r: float,
+    t: float,
+    v: float,
+    cp: int
+) -> float:
+    """Calculate option price"""
+    return float(calculate_price_batch(f, k, r, t, v, cp)[0])
+
+
+def calculate_delta(
+    f: float,
+    k: float,
+    r: float,
+    t: float,
+    v: float,
+    cp: int
+) -> float:
+    """Calculate option delta"""
+    return float(calculate_greeks_batch(f, k, r, t, v, cp)['delta'][0])
+
+
+def calculate_gamma(
+    f: float,
+    k: float,
+    r: float,
+    t: float,
+    v: float,
+    cp: int
+) -> float:
+    """Calculate option gamma"""
+    return float(calculate_greeks_batch(f, k, r, t, v, cp)['gamma'][0])
+
+
+def calculate_theta(
+    f: float,
+    k: float,
+    r: float,
+    t: float,
+    v: float,
+    cp: int,
+    annual_days: int = 240
+) -> float:
+    """Calcualte option theta"""
+    return float(calculate_greeks_batch(f, k, r, t, v, cp, annual_days)['theta'][0])
+
+
+def calculate_vega(
+    f: float,
+    k: float,
+    r: float,
+    t: float,
+    v: float,
+    cp: int
+) -> float:
+    """Calculate option vega(%)"""
+    vega = calculate_original_vega(f, k, r, t, v, cp) / 100
+    return vega
+
+
+def calculate_original_vega(
+    f: float,
+    k: float,
+    r: float,
+    t: float,
+    v: float,
+    cp: int
+) -> float:
+    """Calculate option vega"""
+    return float(calculate_original_vega_batch(f, k, r, t, v, cp)[0])
+
+
+def calculate_greeks(
+    f: float,
+    k: float,
+    r: float,
+    t: float,
+    v: float,
+    cp: int,
+    annual_days: int = 240
+) -> Tuple[float, float, float, float, float]:
+    """Calculate option price and greeks"""
+    return tuple(calculate_greeks_batch(f, k, r, t, v, cp, annual_days)[0].tolist())
+
+
+def calculate_impv(
+    price: float,
+    f: float,
+    k: float,
+    r: float,
+    t: float,
+    cp: int
+) -> float:
+    """Calculate option implied volatility"""
+    return float(calculate_impv_batch(price, f, k, r, t, cp)[0])
+
+
+def calculate_impv_rational(
+    price: float,
+    f: float,
+    k: float,
+    r: float,
+    t: float,
+    cp: int,
+    v0: float = 0
+) -> Tuple[float, int]:
+    """Calculate option implied volatility and the iterations"""
+    v, iterations = calculate_impv_rational_batch(price, f, k, r, t, cp, v0 = v0)
+    return float(v[0]), int(iterations[0])
+
+
+def compare_with_binomial_tree(
+    f: ndarray,
+    k: ndarray,
+    r: ndarray,
+    t: ndarray,
+    v: ndarray,
+    cp: ndarray,
+    n: int = binomial_tree.DEFAULT_STEP
+) -> dict:
+    """Compare the price and time cost with the binomial tree of n steps,
+    helps to choose the model of speed or precision for the options."""
+    f, k, r, t, v, cp = to_arrays(f, k, r, t, v, cp)
+
+    start = time.perf_counter()
+    price = calculate_price_batch(f, k, r, t, v, cp)
+    baw_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tree_price = binomial_tree.calculate_price_batch(f, k, r, t, v, cp, n)
+    tree_seconds = time.perf_counter() - start
+
+    # Relative error is meaningless for the nearly worthless options
+    error = np.abs(price - tree_price)
+    priced = tree_price > k * 0.0001
+    relative_error = error[priced] / tree_price[priced]
+    return {
+        'size': f.shape[0],
+        'max_error': error.max(initial = 0),
+        'mean_error': error.mean() if error.size else 0,
+        'max_relative_error': relative_error.max(initial = 0),
+        'mean_relative_error': relative_error.mean() if relative_error.size else 0,
+        'seconds': baw_seconds,
+        'tree_seconds': tree_seconds
+    }
@@ -1,9 +1,23 @@
 from numpy import zeros, ndarray
 from math import exp, sqrt
 from typing import Tuple
+import numpy as np
+
+from . import implied_volatility
 
 
 DEFAULT_STEP = 15
+# Steps of the tree kept for the greeks
+HEAD_STEP = 2
+
+# Result of calculate_greeks_batch
+GREEKS_DTYPE = np.dtype([
+    ('price', float),
+    ('delta', float),
+    ('gamma', float),
+    ('theta', float),
+    ('vega', float)
+])
 
 
 def generate_tree(
@@ -15,14 +29,36 @@ def generate_tree(
     cp: int,
     n: int
 ) -> Tuple[ndarray, ndarray]:
-    """Generate binomial tree for pricing American option."""
+    """Generate binomial tree for pricing American option.
+
+    The whole (n + 1, n + 1) trees, kept for compatibility, the pricing only
+    needs the head of generate_tree_head.
+    """
+    return generate_tree_head(f, k, r, t, v, cp, n, n)
+
+
+def generate_tree_head(
+    f: float,
+    k: float,
+    r: float,
+    t: float,
+    v: float,
+    cp: int,
+    n: int,
+    head_step: int = HEAD_STEP
+) -> Tuple[ndarray, ndarray]:
+    """Price American option by binomial tree in a rolling buffer.
+
+    Only the head (first head_step steps) of the option and underlying trees
+    is returned, which is all the price and greeks need.
+    """
     dt = t / n
     u = exp(v * sqrt(dt))
     d = 1 / u
     a = 1
-    tree_size = n + 1
-    underlying_tree = zeros((tree_size, tree_size))
-    option_tree = zeros((tree_size, tree_size))
+    head_size = min(n, head_step) + 1
+    underlying_head = zeros((head_size, head_size))
+    option_head = zeros((head_size, head_size))
 
     # Calculate risk neutral probability
     p = (a - d) / (u - d)
@@ -30,28 +66,31 @@ def generate_tree(
     p2 = (1 - p) / a
     discount = exp(-r * dt)
 
-    # Calculate underlying price tree
-    underlying_tree[0, 0] = f
+    # Underlying price of node (j, i) is f * u ^ (i - j) * d ^ j
+    u_powers = [pow(u, i) for i in range(n + 1)]
+    d_powers = [pow(d, j) for j in range(n + 1)]
+    underlying = [f * u_powers[n - j] * d_powers[j] for j in range(n + 1)]
 
-    for i in range(1, n + 1):
-        underlying_tree[0, i] = underlying_tree[0, i - 1] * u
-        for j in range(1, n + 1):
-            underlying_tree[j, i] = underlying_tree[j - 1, i - 1] * d
+    # Calculate option price of the last step
+    option = [max(0, cp * (price - k)) for price in underlying]
 
-    # Calculate option price tree
-    for j in range(n + 1):
-        option_tree[j, n] = max(0, cp * (underlying_tree[j, n] - k))
+    for i in range(n, -1, -1):
+        if i < n:
+            # Step back, the buffer of step i + 1 is overwritten by step i
+            for j in range(i + 1):
+                underlying[j] = f * u_powers[i - j] * d_powers[j]
+                option[j] = max(
+                    (p1 * option[j] + p2 * option[j + 1]) * discount,
+                    cp * (underlying[j] - k),
+                    0
+                )
 
-    for i in range(n - 1, -1, -1):
-        for j in range(i + 1):
-            option_tree[j, i] = max(
-                (p1 * option_tree[j, i + 1] + p2 * option_tree[j + 1, i + 1]) * discount,
-                cp * (underlying_tree[j, i] - k),
-                0
-            )
+        if i < head_size:
+            underlying_head[:i + 1, i] = underlying[:i + 1]
+            option_head[:i + 1, i] = option[:i + 1]
 
-    # Return both trees
-    return option_tree, underlying_tree
+    # Return both tree heads
+    return option_head, underlying_head
 
 
 def calculate_price(
@@ -64,7 +103,7 @@ def calculate_price(
     n: int = DEFAULT_STEP
 ) -> float:
     """Calculate option price"""
-    option_tree, underlying_tree = generate_tree(f, k, r, t, v, cp, n)
+    option_tree, underlying_tree = generate_tree_head(f, k, r, t, v, cp, n)
     return option_tree[0, 0]
 
 
@@ -78,7 +117,7 @@ def calculate_delta(
     n: int = DEFAULT_STEP
 ) -> float:
     """Calculate option delta"""
-    option_tree, underlying_tree = generate_tree(f, k, r, t, v, cp, n)
+    option_tree, underlying_tree = generate_tree_head(f, k, r, t, v, cp, n)
 
     option_price_change: float = option_tree[0, 1] - option_tree[1, 1]
     underlying_price_change: float = underlying_tree[0, 1] - underlying_tree[1, 1]
@@ -98,7 +137,7 @@ def calculate_gamma(
     n: int = DEFAULT_STEP
 ) -> float:
     """Calculate option gamma"""
-    option_tree, underlying_tree = generate_tree(f, k, r, t, v, cp, n)
+    option_tree, underlying_tree = generate_tree_head(f, k, r, t, v, cp, n)
 
     gamma_delta_1: float = (option_tree[0, 2] - option_tree[1, 2]) / \
         (underlying_tree[0, 2] - underlying_tree[1, 2])
@@ -123,7 +162,7 @@ def calculate_theta(
     annual_days: int = 240
 ) -> float:
     """Calcualte option theta"""
-    option_tree, underlying_tree = generate_tree(f, k, r, t, v, cp, n)
+    option_tree, underlying_tree = generate_tree_head(f, k, r, t, v, cp, n)
 
     dt = t / n
     theta = (option_tree[1, 2] - option_tree[0, 0]) / (2 * dt * annual_days)
@@ -173,8 +212,8 @@ def calculate_greeks(
 ) -> Tuple[float, float, float, float, float]:
     """Calculate option price and greeks"""
     dt = t / n
-    option_tree, underlying_tree = generate_tree(f, k, r, t, v, cp, n)
-    option_tree_vega, underlying_tree_vega = generate_tree(f, k, r, t, v * 1.001, cp, n)
+    option_tree, underlying_tree = generate_tree_head(f, k, r, t, v, cp, n)
+    option_tree_vega, underlying_tree_vega = generate_tree_head(f, k, r, t, v * 1.001, cp, n)
 
     # Price
     price = option_tree[0, 0]
@@ -259,3 +298,240 @@ def calculate_impv(
     v = round(v, 4)
 
     return v
+
+
+def generate_tree_head_batch(
+    f: ndarray,
+    k: ndarray,
+    r: ndarray,
+    t: ndarray,
+    v: ndarray,
+    cp: ndarray,
+    n: int
+) -> Tuple[ndarray, ndarray]:
+    """Price American options of arrays by binomial tree, all the contracts
+    step back together in a rolling (contracts, n + 1) buffer.
+
+    The tree heads are returned shaped (contracts, HEAD_STEP + 1, HEAD_STEP + 1).
+    """
+    dt = t / n
+    u = np.exp(v * np.sqrt(dt))
+    d = 1 / u
+    a = 1
+    head_size = min(n, HEAD_STEP) + 1
+    underlying_head = zeros((f.shape[0], head_size, head_size))
+    option_head = zeros((f.shape[0], head_size, head_size))
+
+    # Calculate risk neutral probability, as columns for broadcasting
+    p = (a - d) / (u - d)
+    p1 = (p / a)[:, None]
+    p2 = ((1 - p) / a)[:, None]
+    discount = np.exp(-r * dt)[:, None]
+    f = f[:, None]
+    k = k[:, None]
+    cp = cp[:, None]
+
+    # Underlying price of node (j, i) is f * u ^ (i - j) * d ^ j
+    steps = np.arange(n + 1)
+    u_powers = np.power(u[:, None], steps)
+    d_powers = np.power(d[:, None], steps)
+    underlying = f * u_powers[:, ::-1] * d_powers
+
+    # Calculate option price of the last step
+    option = np.maximum(0, cp * (underlying - k))
+
+    for i in range(n, -1, -1):
+        if i < n:
+            # Step back, the buffer of step i + 1 is overwritten by step i
+            underlying[:, :i + 1] = f * u_powers[:, i::-1] * d_powers[:, :i + 1]
+            option[:, :i + 1] = np.maximum(
+                np.maximum(
+                    (p1 * option[:, :i + 1] + p2 * option[:, 1:i + 2]) * discount,
+                    cp * (underlying[:, :i + 1] - k)),
+                0
+            )
+
+        if i < head_size:
+            underlying_head[:, :i + 1, i] = underlying[:, :i + 1]
+            option_head[:, :i + 1, i] = option[:, :i + 1]
+
+    # Return both tree heads
+    return option_head, underlying_head
+
+
+def calculate_price_batch(
+    f: ndarray,
+    k: ndarray,
+    r: ndarray,
+    t: ndarray,
+    v: ndarray,
+    cp: ndarray,
+    n: int = DEFAULT_STEP
+) -> ndarray:
+    """Calculate option price of arrays"""
+    option_tree, underlying_tree = generate_tree_head_batch(f, k, r, t, v, cp, n)
+    return option_tree[:, 0, 0]
+
+
+def calculate_original_vega_batch(
+    f: ndarray,
+    k: ndarray,
+    r: ndarray,
+    t: ndarray,
+    v: ndarray,
+    cp: ndarray,
+    n: int = DEFAULT_STEP
+) -> ndarray:
+    """Calculate option vega of arrays"""
+    price_1 = calculate_price_batch(f, k, r, t, v, cp, n)
+    price_2 = calculate_price_batch(f, k, r, t, v * 1.001, cp, n)
+    vega = (price_2 - price_1) / (v * 0.001)
+    return vega
+
+
+def calculate_greeks_batch(
+    f: ndarray,
+    k: ndarray,
+    r: ndarray,
+    t: ndarray,
+    v: ndarray,
+    cp: ndarray,
+    n: int = DEFAULT_STEP,
+    annual_days: int = 240
+) -> ndarray:
+    """Calculate option price and greeks of arrays, as a GREEKS_DTYPE array"""
+    f, k, r, t, v, cp = np.broadcast_arrays(
+        *[np.atleast_1d(np.asarray(x, dtype = float)) for x in (f, k, r, t, v, cp)])
+
+    dt = t / n
+    option_tree, underlying_tree = generate_tree_head_batch(f, k, r, t, v, cp, n)
+    option_tree_vega, underlying_tree_vega = generate_tree_head_batch(f, k, r, t, v * 1.001, cp, n)
+    greeks: ndarray = np.empty(f.shape, dtype = GREEKS_DTYPE)
+
+    # Price
+    greeks['price'] = option_tree[:, 0, 0]
+
+    # Delta
+    option_price_change = option_tree[:, 0, 1] - option_tree[:, 1, 1]
+    underlying_price_change = underlying_tree[:, 0, 1] - underlying_tree[:, 1, 1]
+    _delta: ndarray = option_price_change / underlying_price_change
+    greeks['delta'] = _delta * f * 0.01
+
+    # Gamma
+    gamma_delta_1 = (option_tree[:, 0, 2] - option_tree[:, 1, 2]) / \
+        (underlying_tree[:, 0, 2] - underlying_tree[:, 1, 2])
+    gamma_delta_2 = (option_tree[:, 1, 2] - option_tree[:, 2, 2]) / \
+        (underlying_tree[:, 1, 2] - underlying_tree[:, 2, 2])
+    _gamma: ndarray = (gamma_delta_1 - gamma_delta_2) / \
+        (0.5 * (underlying_tree[:, 0, 2] - underlying_tree[:, 2, 2]))
+    greeks['gamma'] = _gamma * np.power(f, 2) * 0.0001
+
+    # Theta
+    greeks['theta'] = (option_tree[:, 1, 2] - option_tree[:, 0, 0]) / (2 * dt * annual_days)
+
+    # Vega
+    greeks['vega'] = (option_tree_vega[:, 0, 0] - option_tree[:, 0, 0]) / (0.001 * v * 100)
+
+    return greeks
+
+
+def calculate_impv_batch(
+    price: ndarray,
+    f: ndarray,
+    k: ndarray,
+    r: ndarray,
+    t: ndarray,
+    cp: ndarray,
+    n: int = DEFAULT_STEP
+) -> ndarray:
+    """Calculate option implied volatility of arrays"""
+    price, f, k, r, t, cp = np.broadcast_arrays(
+        *[np.atleast_1d(np.asarray(x, dtype = float)) for x in (price, f, k, r, t, cp)])
+
+    # Check option price must be position and meets minimum value (exercise value)
+    meet: ndarray = (price > 0) & (
+        ((cp == 1) & (price > (f - k))) | ((cp == -1) & (price > (k - f))))
+
+    # Calculate implied volatility with Newton's method, only the elements
+    # not converged yet are iterated
+    v: ndarray = np.full(price.shape, 0.3)      # Initial guess of volatility
+    active: ndarray = np.flatnonzero(meet)
+
+    for i in range(50):
+        if not active.size:
+            break
+
+        # Caculate option price and vega with current guess
+        ps, fs, ks, rs, ts, cps, vs = (x[active] for x in (price, f, k, r, t, cp, v))
+        p: ndarray = calculate_price_batch(fs, ks, rs, ts, vs, cps, n)
+        vega: ndarray = calculate_original_vega_batch(fs, ks, rs, ts, vs, cps, n)
+
+        # Calculate error value, stop where vega too close to 0 or error
+        # value meets requirement
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            dx: ndarray = (ps - p) / vega
+        going: ndarray = (vega != 0) & ~(np.abs(dx) < 0.00001)
+
+        # Calculate guessed implied volatility of next round
+        active = active[going]
+        v[active] += dx[going]
+
+        # Check new volatility to be non-negative
+        negative: ndarray = v[active] <= 0
+        meet[active[negative]] = False
+        active = active[~negative]
+
+    # Round to 4 decimal places
+    return np.where(meet, np.round(v, 4), 0)
+
+
+def calculate_impv_rational_batch(
+    price: ndarray,
+    f: ndarray,
+    k: ndarray,
+    r: ndarray,
+    t: ndarray,
+    cp: ndarray,
+    n: int = DEFAULT_STEP,
+    v0: ndarray = None
+) -> Tuple[ndarray, ndarray]:
+    """Calculate option implied volatility of arrays from the rational initial
+    guess of Black-76, or v0 where it is positive, with Newton's method
+    safeguarded by bisection. Returns the implied volatility and the
+    iterations of each element, implied_volatility.FAILED_ITERATIONS if
+    failed to converge."""
+    price, f, k, r, t, cp = np.broadcast_arrays(
+        *[np.atleast_1d(np.asarray(x, dtype = float)) for x in (price, f, k, r, t, cp)])
+
+    # Check option price must be position and meets minimum value (exercise value)
+    meet: ndarray = (price > 0) & (t > 0) & (
+        ((cp == 1) & (price > (f - k))) | ((cp == -1) & (price > (k - f))))
+
+    guess: ndarray = implied_volatility.calculate_guess_batch(
+        price, f * np.exp(-r * t), k, r, np.where(t > 0, t, 1), cp)
+    if v0 is not None:
+        v0 = np.broadcast_to(np.asarray(v0, dtype = float), price.shape)
+        guess = np.where(v0 > 0, v0, guess)
+
+    def calculate(index: ndarray, v: ndarray) -> Tuple[ndarray, ndarray]:
+        fs, ks, rs, ts, cps = (x[index] for x in (f, k, r, t, cp))
+        p = calculate_price_batch(fs, ks, rs, ts, v, cps, n)
+        p_vega = calculate_price_batch(fs, ks, rs, ts, v * 1.001, cps, n)
+        return p, (p_vega - p) / (v * 0.001)
+
+    return implied_volatility.solve_batch(calculate, price, meet, guess)
+
+
+def calculate_impv_rational(
+    price: float,
+    f: float,
+    k: float,
+    r: float,
+    t: float,
+    cp: int,
+    n: int = DEFAULT_STEP,
+    v0: float = 0
+) -> Tuple[float, int]:
+    """Calculate option implied volatility and the iterations"""
+    v, iterations = calculate_impv_rational_batch(price, f, k, r, t, cp, n, v0 = v0)
+    return float(v[0]), int(iterations[0])
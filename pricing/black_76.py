@@ -1,10 +1,23 @@
 from scipy import stats
 from math import log, pow, sqrt, exp
 from typing import Tuple
+from numpy import ndarray
+import numpy as np
+
+from . import implied_volatility
 
 cdf = stats.norm.cdf
 pdf = stats.norm.pdf
 
+# Result of calculate_greeks_batch
+GREEKS_DTYPE = np.dtype([
+    ('price', float),
+    ('delta', float),
+    ('gamma', float),
+    ('theta', float),
+    ('vega', float)
+])
+
 
 def calculate_d1(
     s: float,
@@ -215,3 +228,256 @@ def calculate_impv(
     v = round(v, 4)
 
     return v
+
+
+def calculate_d1_batch(
+    s: ndarray,
+    k: ndarray,
+    r: ndarray,
+    t: ndarray,
+    v: ndarray
+) -> ndarray:
+    """Calculate option D1 value of arrays"""
+    d1: ndarray = (np.log(s / k) + (0.5 * np.power(v, 2)) * t) / (v * np.sqrt(t))
+    return d1
+
+
+def calculate_price_batch(
+    s: ndarray,
+    k: ndarray,
+    r: ndarray,
+    t: ndarray,
+    v: ndarray,
+    cp: ndarray,
+    d1: ndarray = None
+) -> ndarray:
+    """Calculate option price of arrays"""
+    # Use option space value where volatility not positive
+    positive: ndarray = v > 0
+    v = np.where(positive, v, 1.0)
+
+    if d1 is None:
+        d1 = calculate_d1_batch(s, k, r, t, v)
+    d2: ndarray = d1 - v * np.sqrt(t)
+
+    price: ndarray = cp * (s * cdf(cp * d1) - k * cdf(cp * d2)) * np.exp(-r * t)
+    return np.where(positive, price, np.maximum(0, cp * (s - k)))
+
+
+def calculate_delta_batch(
+    s: ndarray,
+    k: ndarray,
+    r: ndarray,
+    t: ndarray,
+    v: ndarray,
+    cp: ndarray,
+    d1: ndarray = None
+) -> ndarray:
+    """Calculate option delta of arrays"""
+    positive: ndarray = v > 0
+    v = np.where(positive, v, 1.0)
+
+    if d1 is None:
+        d1 = calculate_d1_batch(s, k, r, t, v)
+
+    _delta: ndarray = cp * np.exp(-r * t) * cdf(cp * d1)
+    delta: ndarray = _delta * s * 0.01
+    return np.where(positive, delta, 0)
+
+
+def calculate_gamma_batch(
+    s: ndarray,
+    k: ndarray,
+    r: ndarray,
+    t: ndarray,
+    v: ndarray,
+    d1: ndarray = None
+) -> ndarray:
+    """Calculate option gamma of arrays"""
+    positive: ndarray = v > 0
+    v = np.where(positive, v, 1.0)
+
+    if d1 is None:
+        d1 = calculate_d1_batch(s, k, r, t, v)
+
+    _gamma: ndarray = np.exp(-r * t) * pdf(d1) / (s * v * np.sqrt(t))
+    gamma: ndarray = _gamma * np.power(s, 2) * 0.0001
+    return np.where(positive, gamma, 0)
+
+
+def calculate_theta_batch(
+    s: ndarray,
+    k: ndarray,
+    r: ndarray,
+    t: ndarray,
+    v: ndarray,
+    cp: ndarray,
+    d1: ndarray = None,
+    annual_days: int = 240
+) -> ndarray:
+    """Calculate option theta of arrays"""
+    positive: ndarray = v > 0
+    v = np.where(positive, v, 1.0)
+
+    if d1 is None:
+        d1 = calculate_d1_batch(s, k, r, t, v)
+    d2: ndarray = d1 - v * np.sqrt(t)
+
+    _theta: ndarray = -s * np.exp(-r * t) * pdf(d1) * v / (2 * np.sqrt(t)) \
+        + cp * r * s * np.exp(-r * t) * cdf(cp * d1) \
+        - cp * r * k * np.exp(-r * t) * cdf(cp * d2)
+    theta: ndarray = _theta / annual_days
+    return np.where(positive, theta, 0)
+
+
+def calculate_vega_batch(
+    s: ndarray,
+    k: ndarray,
+    r: ndarray,
+    t: ndarray,
+    v: ndarray,
+    d1: ndarray = None
+) -> ndarray:
+    """Calculate option vega(%) of arrays"""
+    vega: ndarray = calculate_original_vega_batch(s, k, r, t, v, d1) / 100
+    return vega
+
+
+def calculate_original_vega_batch(
+    s: ndarray,
+    k: ndarray,
+    r: ndarray,
+    t: ndarray,
+    v: ndarray,
+    d1: ndarray = None
+) -> ndarray:
+    """Calculate option vega of arrays"""
+    positive: ndarray = v > 0
+    v = np.where(positive, v, 1.0)
+
+    if d1 is None:
+        d1 = calculate_d1_batch(s, k, r, t, v)
+
+    vega: ndarray = s * np.exp(-r * t) * pdf(d1) * np.sqrt(t)
+    return np.where(positive, vega, 0)
+
+
+def calculate_greeks_batch(
+    s: ndarray,
+    k: ndarray,
+    r: ndarray,
+    t: ndarray,
+    v: ndarray,
+    cp: ndarray,
+    annual_days: int = 240
+) -> ndarray:
+    """Calculate option price and greeks of arrays, as a GREEKS_DTYPE array"""
+    s, k, r, t, v, cp = np.broadcast_arrays(
+        *[np.atleast_1d(np.asarray(x, dtype = float)) for x in (s, k, r, t, v, cp)])
+
+    # d1 is shared by all the greeks
+    d1: ndarray = calculate_d1_batch(s, k, r, t, np.where(v > 0, v, 1.0))
+
+    greeks: ndarray = np.empty(s.shape, dtype = GREEKS_DTYPE)
+    greeks['price'] = calculate_price_batch(s, k, r, t, v, cp, d1)
+    greeks['delta'] = calculate_delta_batch(s, k, r, t, v, cp, d1)
+    greeks['gamma'] = calculate_gamma_batch(s, k, r, t, v, d1)
+    greeks['theta'] = calculate_theta_batch(s, k, r, t, v, cp, d1, annual_days)
+    greeks['vega'] = calculate_vega_batch(s, k, r, t, v, d1)
+    return greeks
+
+
+def calculate_impv_batch(
+    price: ndarray,
+    s: ndarray,
+    k: ndarray,
+    r: ndarray,
+    t: ndarray,
+    cp: ndarray
+) -> ndarray:
+    """Calculate option implied volatility of arrays"""
+    price, s, k, r, t, cp = np.broadcast_arrays(
+        *[np.atleast_1d(np.asarray(x, dtype = float)) for x in (price, s, k, r, t, cp)])
+
+    # Check option price must be positive and meets minimum value (exercise value)
+    meet: ndarray = (price > 0) & (
+        ((cp == 1) & (price > (s - k) * np.exp(-r * t))) |
+        ((cp == -1) & (price > k * np.exp(-r * t) - s)))
+
+    # Calculate implied volatility with Newton's method, only the elements
+    # not converged yet are iterated
+    v: ndarray = np.full(price.shape, 0.01)     # Initial guess of volatility
+    active: ndarray = np.flatnonzero(meet)
+
+    for i in range(50):
+        if not active.size:
+            break
+
+        # Caculate option price and vega with current guess, vega takes the
+        # same arguments as calculate_impv to give the same result
+        ps, ss, ks, rs, ts, cps, vs = (x[active] for x in (price, s, k, r, t, cp, v))
+        p: ndarray = calculate_price_batch(ss, ks, rs, ts, vs, cps)
+        vega: ndarray = calculate_original_vega_batch(ss, ks, rs, ts, vs, cps)
+
+        # Calculate error value, stop where vega too close to 0 or error
+        # value meets requirement
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            dx: ndarray = (ps - p) / vega
+        going: ndarray = (vega != 0) & ~(np.abs(dx) < 0.00001)
+
+        # Calculate guessed implied volatility of next round
+        active = active[going]
+        v[active] += dx[going]
+
+    # Check end result to be non-negative, round to 4 decimal places
+    return np.where(meet & (v > 0), np.round(v, 4), 0)
+
+
+def calculate_impv_rational_batch(
+    price: ndarray,
+    s: ndarray,
+    k: ndarray,
+    r: ndarray,
+    t: ndarray,
+    cp: ndarray,
+    v0: ndarray = None
+) -> Tuple[ndarray, ndarray]:
+    """Calculate option implied volatility of arrays from a rational initial
+    guess, or v0 where it is positive, with Newton's method safeguarded by
+    bisection. Returns the implied volatility and the iterations of each
+    element, implied_volatility.FAILED_ITERATIONS if failed to converge."""
+    price, s, k, r, t, cp = np.broadcast_arrays(
+        *[np.atleast_1d(np.asarray(x, dtype = float)) for x in (price, s, k, r, t, cp)])
+
+    # Check option price must be positive and meets minimum value (exercise value)
+    meet: ndarray = (price > 0) & (t > 0) & (
+        ((cp == 1) & (price > (s - k) * np.exp(-r * t))) |
+        ((cp == -1) & (price > k * np.exp(-r * t) - s)))
+
+    guess: ndarray = implied_volatility.calculate_guess_batch(
+        price, s * np.exp(-r * t), k, r, np.where(t > 0, t, 1), cp)
+    if v0 is not None:
+        v0 = np.broadcast_to(np.asarray(v0, dtype = float), price.shape)
+        guess = np.where(v0 > 0, v0, guess)
+
+    def calculate(index: ndarray, v: ndarray) -> Tuple[ndarray, ndarray]:
+        ss, ks, rs, ts, cps = (x[index] for x in (s, k, r, t, cp))
+        d1 = calculate_d1_batch(ss, ks, rs, ts, v)
+        return (calculate_price_batch(ss, ks, rs, ts, v, cps, d1),
+                calculate_original_vega_batch(ss, ks, rs, ts, v, d1))
+
+    return implied_volatility.solve_batch(calculate, price, meet, guess)
+
+
+def calculate_impv_rational(
+    price: float,
+    s: float,
+    k: float,
+    r: float,
+    t: float,
+    cp: int,
+    v0: float = 0
+) -> Tuple[float, int]:
+    """Calculate option implied volatility and the iterations"""
+    v, iterations = calculate_impv_rational_batch(price, s, k, r, t, cp, v0)
+    return float(v[0]), int(iterations[0])
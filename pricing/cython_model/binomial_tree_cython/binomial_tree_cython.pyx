@@ -3,6 +3,9 @@ import numpy as np
 
 cimport numpy as np
 cimport cython
+from cython.parallel cimport prange
+from libc.stdlib cimport malloc, free
+from libc.math cimport NAN
 
 cdef extern from "math.h" nogil:
     double exp(double)
@@ -13,9 +16,24 @@ cdef extern from "math.h" nogil:
 
 
 DEFAULT_STEP = 15
+# Steps of the tree kept for the greeks
+HEAD_STEP = 2
 
+cdef enum:
+    # HEAD_STEP + 1, size of the tree head of the nogil kernels
+    HEAD_SIZE = 3
 
-cdef tuple generate_tree(
+# Result of calculate_greeks_batch
+GREEKS_DTYPE = np.dtype([
+    ('price', float),
+    ('delta', float),
+    ('gamma', float),
+    ('theta', float),
+    ('vega', float)
+])
+
+
+cdef tuple generate_tree_head(
     double f,
     double k,
     double r,
@@ -24,15 +42,23 @@ cdef tuple generate_tree(
     int cp,
     int n
 ):
-    """Generate binomial tree for pricing American option."""
+    """Price American option by binomial tree in a rolling buffer.
+
+    Only the head (first HEAD_STEP steps) of the option and underlying trees
+    is returned, which is all the price and greeks need.
+    """
     cdef double dt = t / n
     cdef double u = exp(v * sqrt(dt))
     cdef double d = 1 / u
     cdef double a = 1
-    
-    cdef int tree_size = n + 1
-    cdef np.ndarray[np.double_t, ndim = 2] underlying_tree = np.zeros((tree_size, tree_size))
-    cdef np.ndarray[np.double_t, ndim = 2] option_tree = np.zeros((tree_size, tree_size))
+
+    cdef int head_size = min(n, HEAD_STEP) + 1
+    cdef np.ndarray[np.double_t, ndim = 2] underlying_head = np.zeros((head_size, head_size))
+    cdef np.ndarray[np.double_t, ndim = 2] option_head = np.zeros((head_size, head_size))
+    cdef double[:] u_powers = np.empty(n + 1)
+    cdef double[:] d_powers = np.empty(n + 1)
+    cdef double[:] underlying = np.empty(n + 1)
+    cdef double[:] option = np.empty(n + 1)
 
     cdef int i, j
 
@@ -42,28 +68,34 @@ cdef tuple generate_tree(
     cdef double p2 = (1 - p) / a
     cdef double discount = exp(-r * dt)
 
-    # Calculate underlying price tree
-    underlying_tree[0, 0] = f
-
-    for i in range(1, n + 1):
-        underlying_tree[0, i] = underlying_tree[0, i - 1] * u
-        for j in range(1, n + 1):
-            underlying_tree[j, i] = underlying_tree[j - 1, i - 1] * d
+    # Underlying price of node (j, i) is f * u ^ (i - j) * d ^ j
+    for i in range(n + 1):
+        u_powers[i] = pow(u, i)
+        d_powers[i] = pow(d, i)
 
-    # Calculate option price tree
+    # Calculate underlying and option price of the last step
     for j in range(n + 1):
-        option_tree[j, n] = max(0, cp * (underlying_tree[j, n] - k))
+        underlying[j] = f * u_powers[n - j] * d_powers[j]
+        option[j] = fmax(0, cp * (underlying[j] - k))
 
-    for i in range(n - 1, -1, -1):
-        for j in range(i + 1):
-            option_tree[j, i] = max(
-                (p1 * option_tree[j, i + 1] + p2 * option_tree[j + 1, i + 1]) * discount,
-                cp * (underlying_tree[j, i] - k),
-                0
-            )
+    for i in range(n, -1, -1):
+        if i < n:
+            # Step back, the buffer of step i + 1 is overwritten by step i
+            for j in range(i + 1):
+                underlying[j] = f * u_powers[i - j] * d_powers[j]
+                option[j] = fmax(
+                    fmax((p1 * option[j] + p2 * option[j + 1]) * discount,
+                         cp * (underlying[j] - k)),
+                    0
+                )
+
+        if i < head_size:
+            for j in range(i + 1):
+                underlying_head[j, i] = underlying[j]
+                option_head[j, i] = option[j]
 
-    # Return both trees
-    return option_tree, underlying_tree
+    # Return both tree heads
+    return option_head, underlying_head
 
 
 def calculate_price(
@@ -76,7 +108,7 @@ def calculate_price(
     int n = DEFAULT_STEP
 ) -> float:
     """Calculate option price"""
-    option_tree, underlying_tree = generate_tree(f, k, r, t, v, cp, n)
+    option_tree, underlying_tree = generate_tree_head(f, k, r, t, v, cp, n)
     return option_tree[0, 0]
 
 
@@ -93,7 +125,7 @@ def calculate_delta(
     cdef double option_price_change, underlying_price_change
     cdef _delta, delta
 
-    option_tree, underlying_tree = generate_tree(f, k, r, t, v, cp, n)
+    option_tree, underlying_tree = generate_tree_head(f, k, r, t, v, cp, n)
     
     option_price_change = option_tree[0, 1] - option_tree[1, 1]
     underlying_price_change = underlying_tree[0, 1] - underlying_tree[1, 1]
@@ -115,7 +147,7 @@ def calculate_gamma(
     cdef double gamma_delta_1, gamma_delta_2
     cdef double _gamma, gamma
 
-    option_tree, underlying_tree = generate_tree(f, k, r, t, v, cp, n)
+    option_tree, underlying_tree = generate_tree_head(f, k, r, t, v, cp, n)
 
     gamma_delta_1 = (option_tree[0, 2] - option_tree[1, 2]) / \
         (underlying_tree[0, 2] - underlying_tree[1, 2])
@@ -142,7 +174,7 @@ def calculate_theta(
     """Calcualte option theta"""
     cdef double dt, theta
 
-    option_tree, underlying_tree = generate_tree(f, k, r, t, v, cp, n)
+    option_tree, underlying_tree = generate_tree_head(f, k, r, t, v, cp, n)
 
     dt = t / n
     theta = (option_tree[1, 2] - option_tree[0, 0]) / (2 * dt * annual_days)
@@ -197,8 +229,8 @@ def calculate_greeks(
     cdef double option_price_change, underlying_price_change
     cdef double gamma_delta_1, gamma_delta_2
 
-    option_tree, underlying_tree = generate_tree(f, k, r, t, v, cp, n)
-    option_tree_vega, underlying_tree_vega = generate_tree(f, k, r, t, v * 1.001, cp, n)
+    option_tree, underlying_tree = generate_tree_head(f, k, r, t, v, cp, n)
+    option_tree_vega, underlying_tree_vega = generate_tree_head(f, k, r, t, v * 1.001, cp, n)
 
     # Price
     price = option_tree[0, 0]
@@ -287,3 +319,236 @@ def calculate_impv(
     v = round(v, 4)
 
     return v
+
+
+cdef int generate_tree_head_nogil(
+    double f,
+    double k,
+    double r,
+    double t,
+    double v,
+    int cp,
+    int n,
+    double* option_head,
+    double* underlying_head
+) noexcept nogil:
+    """Price American option by binomial tree in a rolling buffer without the
+    GIL. The heads are HEAD_SIZE x HEAD_SIZE in row major, returns -1 if the
+    buffer can not be allocated."""
+    cdef double dt = t / n
+    cdef double u = exp(v * sqrt(dt))
+    cdef double d = 1 / u
+    cdef double a = 1
+    cdef int head_size = min(n + 1, HEAD_SIZE)
+    cdef double underlying
+    cdef int i, j
+
+    # Calculate risk neutral probability
+    cdef double p = (a - d) / (u - d)
+    cdef double p1 = p / a
+    cdef double p2 = (1 - p) / a
+    cdef double discount = exp(-r * dt)
+
+    # Buffers of the powers and the option price of one step
+    cdef double* u_powers = <double*> malloc(3 * (n + 1) * sizeof(double))
+    if u_powers == NULL:
+        return -1
+    cdef double* d_powers = u_powers + n + 1
+    cdef double* option = d_powers + n + 1
+
+    for i in range(HEAD_SIZE * HEAD_SIZE):
+        option_head[i] = 0
+        underlying_head[i] = 0
+
+    # Underlying price of node (j, i) is f * u ^ (i - j) * d ^ j
+    for i in range(n + 1):
+        u_powers[i] = pow(u, i)
+        d_powers[i] = pow(d, i)
+
+    for i in range(n, -1, -1):
+        for j in range(i + 1):
+            underlying = f * u_powers[i - j] * d_powers[j]
+            if i == n:
+                # Option price of the last step
+                option[j] = fmax(0, cp * (underlying - k))
+            else:
+                # Step back, the buffer of step i + 1 is overwritten by step i
+                option[j] = fmax(
+                    fmax((p1 * option[j] + p2 * option[j + 1]) * discount,
+                         cp * (underlying - k)),
+                    0
+                )
+
+            if i < head_size:
+                underlying_head[j * HEAD_SIZE + i] = underlying
+                option_head[j * HEAD_SIZE + i] = option[j]
+
+    free(u_powers)
+    return 0
+
+
+cdef double calculate_price_nogil(
+    double f,
+    double k,
+    double r,
+    double t,
+    double v,
+    int cp,
+    int n
+) noexcept nogil:
+    """Calculate option price without the GIL"""
+    cdef double option_head[HEAD_SIZE * HEAD_SIZE]
+    cdef double underlying_head[HEAD_SIZE * HEAD_SIZE]
+
+    if generate_tree_head_nogil(f, k, r, t, v, cp, n, option_head, underlying_head) < 0:
+        return NAN
+    return option_head[0]
+
+
+cdef void calculate_greeks_nogil(
+    double f,
+    double k,
+    double r,
+    double t,
+    double v,
+    int cp,
+    int n,
+    int annual_days,
+    double* greeks
+) noexcept nogil:
+    """Calculate option price and greeks into greeks[0:5] without the GIL"""
+    cdef double o[HEAD_SIZE * HEAD_SIZE]
+    cdef double u[HEAD_SIZE * HEAD_SIZE]
+    cdef double o_vega[HEAD_SIZE * HEAD_SIZE]
+    cdef double u_vega[HEAD_SIZE * HEAD_SIZE]
+    cdef double dt = t / n
+    cdef double gamma_delta_1, gamma_delta_2
+    cdef int i
+
+    if generate_tree_head_nogil(f, k, r, t, v, cp, n, o, u) < 0 or \
+       generate_tree_head_nogil(f, k, r, t, v * 1.001, cp, n, o_vega, u_vega) < 0:
+        for i in range(5):
+            greeks[i] = NAN
+        return
+
+    # Price
+    greeks[0] = o[0]
+
+    # Delta, node (j, i) is at j * HEAD_SIZE + i
+    greeks[1] = (o[1] - o[HEAD_SIZE + 1]) / (u[1] - u[HEAD_SIZE + 1]) * f * 0.01
+
+    # Gamma
+    gamma_delta_1 = (o[2] - o[HEAD_SIZE + 2]) / (u[2] - u[HEAD_SIZE + 2])
+    gamma_delta_2 = (o[HEAD_SIZE + 2] - o[2 * HEAD_SIZE + 2]) / \
+        (u[HEAD_SIZE + 2] - u[2 * HEAD_SIZE + 2])
+    greeks[2] = (gamma_delta_1 - gamma_delta_2) / \
+        (0.5 * (u[2] - u[2 * HEAD_SIZE + 2])) * pow(f, 2) * 0.0001
+
+    # Theta
+    greeks[3] = (o[HEAD_SIZE + 2] - o[0]) / (2 * dt * annual_days)
+
+    # Vega
+    greeks[4] = (o_vega[0] - o[0]) / (0.001 * v * 100)
+
+
+cdef double calculate_impv_nogil(
+    double price,
+    double f,
+    double k,
+    double r,
+    double t,
+    int cp,
+    int n
+) noexcept nogil:
+    """Calculate option implied volatility without the GIL, not rounded"""
+    cdef double p, v, dx, vega
+    cdef int i
+
+    # Check option price must be position and meets minimum value (exercise value)
+    if price <= 0:
+        return 0
+    if not ((cp == 1 and price > (f - k)) or (cp == -1 and price > (k - f))):
+        return 0
+
+    # Calculate implied volatility with Newton's method
+    v = 0.3     # Initial guess of volatility
+
+    for i in range(50):
+        # Caculate option price and vega with current guess
+        p = calculate_price_nogil(f, k, r, t, v, cp, n)
+        vega = (calculate_price_nogil(f, k, r, t, v * 1.001, cp, n) - p) / (v * 0.001)
+
+        # Break loop if vega too close to 0
+        if not vega:
+            break
+
+        # Calculate error value
+        dx = (price - p) / vega
+
+        # Check if error value meets requirement
+        if fabs(dx) < 0.00001:
+            break
+
+        # Calculate guessed implied volatility of next round
+        v += dx
+
+        # Check new volatility to be non-negative
+        if v <= 0:
+            return 0
+
+    return v
+
+
+def to_arrays(*args):
+    """Broadcast the inputs to contiguous float arrays of the same shape"""
+    return [np.ascontiguousarray(x) for x in np.broadcast_arrays(
+        *[np.atleast_1d(np.asarray(x, dtype = float)) for x in args])]
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def calculate_price_batch(f, k, r, t, v, cp, int n = DEFAULT_STEP) -> np.ndarray:
+    """Calculate option price of arrays in parallel without the GIL"""
+    cdef const double[:] f_, k_, r_, t_, v_, cp_
+    f_, k_, r_, t_, v_, cp_ = to_arrays(f, k, r, t, v, cp)
+    cdef Py_ssize_t i, size = f_.shape[0]
+    cdef double[:] price = np.empty(size)
+
+    for i in prange(size, nogil = True):
+        price[i] = calculate_price_nogil(f_[i], k_[i], r_[i], t_[i], v_[i], <int> cp_[i], n)
+
+    return np.asarray(price)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def calculate_greeks_batch(f, k, r, t, v, cp, int n = DEFAULT_STEP,
+                           int annual_days = 240) -> np.ndarray:
+    """Calculate option price and greeks of arrays in parallel without the
+    GIL, as a GREEKS_DTYPE array"""
+    cdef const double[:] f_, k_, r_, t_, v_, cp_
+    f_, k_, r_, t_, v_, cp_ = to_arrays(f, k, r, t, v, cp)
+    cdef Py_ssize_t i, size = f_.shape[0]
+    cdef double[:, ::1] greeks = np.empty((size, 5))
+
+    for i in prange(size, nogil = True):
+        calculate_greeks_nogil(f_[i], k_[i], r_[i], t_[i], v_[i], <int> cp_[i],
+                               n, annual_days, &greeks[i, 0])
+
+    return np.asarray(greeks).view(GREEKS_DTYPE)[:, 0]
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def calculate_impv_batch(price, f, k, r, t, cp, int n = DEFAULT_STEP) -> np.ndarray:
+    """Calculate option implied volatility of arrays in parallel without the GIL"""
+    cdef const double[:] price_, f_, k_, r_, t_, cp_
+    price_, f_, k_, r_, t_, cp_ = to_arrays(price, f, k, r, t, cp)
+    cdef Py_ssize_t i, size = price_.shape[0]
+    cdef double[:] v = np.empty(size)
+
+    for i in prange(size, nogil = True):
+        v[i] = calculate_impv_nogil(price_[i], f_[i], k_[i], r_[i], t_[i], <int> cp_[i], n)
+
+    # Round to 4 decimal places
+    return np.round(np.asarray(v), 4)
@@ -1,4 +1,8 @@
 from typing import Tuple
+import numpy as np
+
+cimport cython
+from cython.parallel cimport prange
 
 cdef extern from "math.h" nogil:
     double exp(double)
@@ -7,18 +11,19 @@ cdef extern from "math.h" nogil:
     double log(double)
     double erf(double)
     double fabs(double)
+    double fmax(double, double)
 
 
-cdef double cdf(double x):
+cdef double cdf(double x) noexcept nogil:
     return 0.5 * (1 + erf(x / sqrt(2.0)))
 
 
-cdef double pdf(double x):
+cdef double pdf(double x) noexcept nogil:
     # 1 / sqrt(2 * 3.1416) = 0.3989422804014327
     return exp(- pow(x, 2) * 0.5) * 0.3989422804014327
 
 
-cdef double calculate_d1(double s, double k, double r, double t, double v):
+cdef double calculate_d1(double s, double k, double r, double t, double v) noexcept nogil:
     """Calculate option D1 value"""
     return (log(s / k) + (0.5 * pow(v, 2)) * t) / (v * sqrt(t))
 
@@ -237,3 +242,182 @@ def calculate_impv(
     v = round(v, 4)
 
     return v
+
+
+# Result of calculate_greeks_batch
+GREEKS_DTYPE = np.dtype([
+    ('price', float),
+    ('delta', float),
+    ('gamma', float),
+    ('theta', float),
+    ('vega', float)
+])
+
+
+cdef double calculate_price_nogil(
+    double s,
+    double k,
+    double r,
+    double t,
+    double v,
+    int cp
+) noexcept nogil:
+    """Calculate option price without the GIL"""
+    cdef double d1, d2
+
+    # Return option space value if volatility not positive
+    if v <= 0:
+        return fmax(0, cp * (s - k))
+
+    d1 = calculate_d1(s, k, r, t, v)
+    d2 = d1 - v * sqrt(t)
+    return cp * (s * cdf(cp * d1) - k * cdf(cp * d2)) * exp(-r * t)
+
+
+cdef double calculate_original_vega_nogil(
+    double s,
+    double k,
+    double r,
+    double t,
+    double v,
+    double d1
+) noexcept nogil:
+    """Calculate option vega without the GIL"""
+    if v <= 0:
+        return 0
+
+    if not d1:
+        d1 = calculate_d1(s, k, r, t, v)
+    return s * exp(-r * t) * pdf(d1) * sqrt(t)
+
+
+cdef void calculate_greeks_nogil(
+    double s,
+    double k,
+    double r,
+    double t,
+    double v,
+    int cp,
+    int annual_days,
+    double* greeks
+) noexcept nogil:
+    """Calculate option price and greeks into greeks[0:5] without the GIL"""
+    cdef double d1, d2
+
+    # Return option space value if volatility not positive
+    if v <= 0:
+        greeks[0] = fmax(0, cp * (s - k))
+        greeks[1] = greeks[2] = greeks[3] = greeks[4] = 0
+        return
+
+    d1 = calculate_d1(s, k, r, t, v)
+    d2 = d1 - v * sqrt(t)
+    greeks[0] = cp * (s * cdf(cp * d1) - k * cdf(cp * d2)) * exp(-r * t)
+    greeks[1] = cp * exp(-r * t) * cdf(cp * d1) * s * 0.01
+    greeks[2] = exp(-r * t) * pdf(d1) / (s * v * sqrt(t)) * pow(s, 2) * 0.0001
+    greeks[3] = (-s * exp(-r * t) * pdf(d1) * v / (2 * sqrt(t))
+                 + cp * r * s * exp(-r * t) * cdf(cp * d1)
+                 - cp * r * k * exp(-r * t) * cdf(cp * d2)) / annual_days
+    greeks[4] = calculate_original_vega_nogil(s, k, r, t, v, d1) / 100
+
+
+cdef double calculate_impv_nogil(
+    double price,
+    double s,
+    double k,
+    double r,
+    double t,
+    int cp
+) noexcept nogil:
+    """Calculate option implied volatility without the GIL, not rounded"""
+    cdef double v, p, vega, dx
+    cdef int i
+
+    # Check option price must be positive and meets minimum value (exercise value)
+    if price <= 0:
+        return 0
+    if not ((cp == 1 and price > (s - k) * exp(-r * t)) or
+            (cp == -1 and price > k * exp(-r * t) - s)):
+        return 0
+
+    # Calculate implied volatility with Newton's method
+    v = 0.01    # Initial guess of volatility
+
+    for i in range(50):
+        # Caculate option price and vega with current guess, vega takes the
+        # same arguments as calculate_impv to give the same result
+        p = calculate_price_nogil(s, k, r, t, v, cp)
+        vega = calculate_original_vega_nogil(s, k, r, t, v, cp)
+
+        # Break loop if vega too close to 0
+        if not vega:
+            break
+
+        # Calculate error value
+        dx = (price - p) / vega
+
+        # Check if error value meets requirement
+        if fabs(dx) < 0.00001:
+            break
+
+        # Calculate guessed implied volatility of next round
+        v += dx
+
+    # Check end result to be non-negative
+    if v <= 0:
+        return 0
+    return v
+
+
+def to_arrays(*args):
+    """Broadcast the inputs to contiguous float arrays of the same shape"""
+    return [np.ascontiguousarray(x) for x in np.broadcast_arrays(
+        *[np.atleast_1d(np.asarray(x, dtype = float)) for x in args])]
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def calculate_price_batch(s, k, r, t, v, cp) -> np.ndarray:
+    """Calculate option price of arrays in parallel without the GIL"""
+    cdef const double[:] s_, k_, r_, t_, v_, cp_
+    s_, k_, r_, t_, v_, cp_ = to_arrays(s, k, r, t, v, cp)
+    cdef Py_ssize_t i, size = s_.shape[0]
+    cdef double[:] price = np.empty(size)
+
+    for i in prange(size, nogil = True):
+        price[i] = calculate_price_nogil(s_[i], k_[i], r_[i], t_[i], v_[i], <int> cp_[i])
+
+    return np.asarray(price)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def calculate_greeks_batch(s, k, r, t, v, cp, int annual_days = 240) -> np.ndarray:
+    """Calculate option price and greeks of arrays in parallel without the
+    GIL, as a GREEKS_DTYPE array"""
+    cdef const double[:] s_, k_, r_, t_, v_, cp_
+    s_, k_, r_, t_, v_, cp_ = to_arrays(s, k, r, t, v, cp)
+    cdef Py_ssize_t i, size = s_.shape[0]
+    cdef double[:, ::1] greeks = np.empty((size, 5))
+
+    for i in prange(size, nogil = True):
+        calculate_greeks_nogil(s_[i], k_[i], r_[i], t_[i], v_[i], <int> cp_[i],
+                               annual_days, &greeks[i, 0])
+
+    return np.asarray(greeks).view(GREEKS_DTYPE)[:, 0]
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def calculate_impv_batch(price, s, k, r, t, cp) -> np.ndarray:
+    """Calculate option implied volatility of arrays in parallel without the GIL"""
+    cdef const double[:] price_, s_, k_, r_, t_, cp_
+    price_, s_, k_, r_, t_, cp_ = to_arrays(price, s, k, r, t, cp)
+    cdef Py_ssize_t i, size = price_.shape[0]
+    cdef double[:] v = np.empty(size)
+
+    for i in prange(size, nogil = True):
+        v[i] = calculate_impv_nogil(price_[i], s_[i], k_[i], r_[i], t_[i], <int> cp_[i])
+
+    # Round to 4 decimal places
+    return np.round(np.asarray(v), 4)
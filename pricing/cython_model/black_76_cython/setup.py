@@ -1,7 +1,17 @@
 from distutils.core import setup
+from distutils.extension import Extension
 from Cython.Build import cythonize
+import numpy
+import sys
+
+# the batch kernels run in parallel with OpenMP
+openmp_args = ['/openmp'] if sys.platform == 'win32' else ['-fopenmp']
 
 setup(
     name='black_76_cython',
-    ext_modules=cythonize("black_76_cython.pyx"),
+    ext_modules=cythonize(Extension(
+        'black_76_cython', ['black_76_cython.pyx'],
+        extra_compile_args=openmp_args,
+        extra_link_args=[] if sys.platform == 'win32' else openmp_args)),
+    include_dirs=[numpy.get_include()]
 )
@@ -0,0 +1,94 @@
+from numpy import ndarray
+from typing import Callable, Tuple
+import numpy as np
+
+
+# Bracket of the implied volatility
+MIN_VOLATILITY = 0.0
+MAX_VOLATILITY = 10.0
+
+MAX_ITERATIONS = 100
+
+# Iterations reported for the elements failed to converge
+FAILED_ITERATIONS = -1
+
+
+def calculate_guess_batch(
+    price: ndarray,
+    s: ndarray,
+    k: ndarray,
+    r: ndarray,
+    t: ndarray,
+    cp: ndarray
+) -> ndarray:
+    """Initial guess of implied volatility by Corrado and Miller (1996).
+
+    s is the present value of the underlying, i.e. the futures price
+    discounted for Black-76. Brenner and Subrahmanyam (1988) is used where
+    the square root is not real.
+    """
+    k = k * np.exp(-r * t)
+    # Convert the put price to the call price by put call parity
+    call = np.where(cp == 1, price, price + s - k)
+    half = call - (s - k) / 2
+    root = np.sqrt(np.maximum(np.power(half, 2) - np.power(s - k, 2) / np.pi, 0))
+    v_sqrt_t = np.sqrt(2 * np.pi) / (s + k) * (half + root)
+    v = np.where(v_sqrt_t > 0, v_sqrt_t, np.sqrt(2 * np.pi) * call / s) / np.sqrt(t)
+    return np.clip(v, 0.01, MAX_VOLATILITY / 2)
+
+
+def solve_batch(
+    calculate: Callable[[ndarray, ndarray], Tuple[ndarray, ndarray]],
+    price: ndarray,
+    meet: ndarray,
+    v0: ndarray
+) -> Tuple[ndarray, ndarray]:
+    """Solve implied volatility of arrays by Newton's method, safeguarded by
+    bisection whenever the step leaves the bracket.
+
+    calculate(index, v) returns the price and vega of the elements at index.
+    Returns the implied volatility and the iterations of each element,
+    FAILED_ITERATIONS for the ones not converged.
+    """
+    v: ndarray = np.where(meet, v0, 0).astype(float)
+    iterations: ndarray = np.zeros(price.shape, dtype = int)
+    converged: ndarray = ~meet
+    lower: ndarray = np.full(price.shape, MIN_VOLATILITY)
+    upper: ndarray = np.full(price.shape, MAX_VOLATILITY)
+
+    # Price must be under the one of the max volatility
+    active: ndarray = np.flatnonzero(meet)
+    p, _vega = calculate(active, upper[active])
+    solvable = p > price[active]
+    iterations[active[~solvable]] = FAILED_ITERATIONS
+    active = active[solvable]
+
+    for i in range(MAX_ITERATIONS):
+        if not active.size:
+            break
+
+        iterations[active] += 1
+        vs = v[active]
+        p, vega = calculate(active, vs)
+
+        # Narrow the bracket, price goes up with volatility
+        above: ndarray = p > price[active]
+        upper[active] = np.where(above, vs, upper[active])
+        lower[active] = np.where(above, lower[active], vs)
+
+        # Newton's step, or bisection if it leaves the bracket
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            step: ndarray = (price[active] - p) / vega
+        newton: ndarray = vs + step
+        inside: ndarray = (vega > 0) & (newton > lower[active]) & (newton < upper[active])
+        nv: ndarray = np.where(inside, newton, (lower[active] + upper[active]) / 2)
+
+        # Check if error value meets requirement
+        done: ndarray = np.abs(nv - vs) < 0.00001
+        v[active] = nv
+        converged[active[done]] = True
+        active = active[~done]
+
+    iterations[active] = FAILED_ITERATIONS
+    v = np.where(converged & meet, np.round(v, 4), 0)
+    return v, iterations
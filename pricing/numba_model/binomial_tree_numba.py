@@ -0,0 +1,342 @@
+from math import exp, sqrt
+from typing import Tuple
+import numpy as np
+
+from numba import njit, prange
+
+
+DEFAULT_STEP = 15
+# Steps of the tree kept for the greeks
+HEAD_STEP = 2
+
+# Result of calculate_greeks_batch
+GREEKS_DTYPE = np.dtype([
+    ('price', float),
+    ('delta', float),
+    ('gamma', float),
+    ('theta', float),
+    ('vega', float)
+])
+
+
+@njit(cache = True, error_model = 'numpy')
+def generate_tree_head(
+    f: float,
+    k: float,
+    r: float,
+    t: float,
+    v: float,
+    cp: int,
+    n: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Price American option by binomial tree in a rolling buffer.
+
+    Only the head (first HEAD_STEP steps) of the option and underlying trees
+    is returned, which is all the price and greeks need.
+    """
+    dt = t / n
+    u = exp(v * sqrt(dt))
+    d = 1 / u
+    a = 1
+    head_size = min(n, HEAD_STEP) + 1
+    underlying_head = np.zeros((head_size, head_size))
+    option_head = np.zeros((head_size, head_size))
+    u_powers = np.empty(n + 1)
+    d_powers = np.empty(n + 1)
+    option = np.empty(n + 1)
+
+    # Calculate risk neutral probability
+    p = (a - d) / (u - d)
+    p1 = p / a
+    p2 = (1 - p) / a
+    discount = exp(-r * dt)
+
+    # Underlying price of node (j, i) is f * u ^ (i - j) * d ^ j
+    for i in range(n + 1):
+        u_powers[i] = u ** i
+        d_powers[i] = d ** i
+
+    for i in range(n, -1, -1):
+        for j in range(i + 1):
+            underlying = f * u_powers[i - j] * d_powers[j]
+            if i == n:
+                # Option price of the last step
+                option[j] = max(0.0, cp * (underlying - k))
+            else:
+                # Step back, the buffer of step i + 1 is overwritten by step i
+                option[j] = max(
+                    max((p1 * option[j] + p2 * option[j + 1]) * discount,
+                        cp * (underlying - k)),
+                    0.0
+                )
+
+            if i < head_size:
+                underlying_head[j, i] = underlying
+                option_head[j, i] = option[j]
+
+    # Return both tree heads
+    return option_head, underlying_head
+
+
+@njit(cache = True, error_model = 'numpy')
+def calculate_price(
+    f: float,
+    k: float,
+    r: float,
+    t: float,
+    v: float,
+    cp: int,
+    n: int = DEFAULT_STEP
+) -> float:
+    """Calculate option price"""
+    option_tree, underlying_tree = generate_tree_head(f, k, r, t, v, cp, n)
+    return option_tree[0, 0]
+
+
+@njit(cache = True, error_model = 'numpy')
+def calculate_delta(
+    f: float,
+    k: float,
+    r: float,
+    t: float,
+    v: float,
+    cp: int,
+    n: int = DEFAULT_STEP
+) -> float:
+    """Calculate option delta"""
+    option_tree, underlying_tree = generate_tree_head(f, k, r, t, v, cp, n)
+
+    option_price_change = option_tree[0, 1] - option_tree[1, 1]
+    underlying_price_change = underlying_tree[0, 1] - underlying_tree[1, 1]
+
+    return option_price_change / underlying_price_change * f * 0.01
+
+
+@njit(cache = True, error_model = 'numpy')
+def calculate_gamma(
+    f: float,
+    k: float,
+    r: float,
+    t: float,
+    v: float,
+    cp: int,
+    n: int = DEFAULT_STEP
+) -> float:
+    """Calculate option gamma"""
+    option_tree, underlying_tree = generate_tree_head(f, k, r, t, v, cp, n)
+
+    gamma_delta_1 = (option_tree[0, 2] - option_tree[1, 2]) / \
+        (underlying_tree[0, 2] - underlying_tree[1, 2])
+    gamma_delta_2 = (option_tree[1, 2] - option_tree[2, 2]) / \
+        (underlying_tree[1, 2] - underlying_tree[2, 2])
+
+    _gamma = (gamma_delta_1 - gamma_delta_2) / \
+        (0.5 * (underlying_tree[0, 2] - underlying_tree[2, 2]))
+    return _gamma * f ** 2 * 0.0001
+
+
+@njit(cache = True, error_model = 'numpy')
+def calculate_theta(
+    f: float,
+    k: float,
+    r: float,
+    t: float,
+    v: float,
+    cp: int,
+    n: int = DEFAULT_STEP,
+    annual_days: int = 240
+) -> float:
+    """Calcualte option theta"""
+    option_tree, underlying_tree = generate_tree_head(f, k, r, t, v, cp, n)
+
+    dt = t / n
+    return (option_tree[1, 2] - option_tree[0, 0]) / (2 * dt * annual_days)
+
+
+@njit(cache = True, error_model = 'numpy')
+def calculate_original_vega(
+    f: float,
+    k: float,
+    r: float,
+    t: float,
+    v: float,
+    cp: int,
+    n: int = DEFAULT_STEP
+) -> float:
+    """Calculate option vega"""
+    price_1 = calculate_price(f, k, r, t, v, cp, n)
+    price_2 = calculate_price(f, k, r, t, v * 1.001, cp, n)
+    return (price_2 - price_1) / (v * 0.001)
+
+
+@njit(cache = True, error_model = 'numpy')
+def calculate_vega(
+    f: float,
+    k: float,
+    r: float,
+    t: float,
+    v: float,
+    cp: int,
+    n: int = DEFAULT_STEP
+) -> float:
+    """Calculate option vega(%)"""
+    return calculate_original_vega(f, k, r, t, v, cp, n) / 100
+
+
+@njit(cache = True, error_model = 'numpy')
+def calculate_greeks(
+    f: float,
+    k: float,
+    r: float,
+    t: float,
+    v: float,
+    cp: int,
+    n: int = DEFAULT_STEP,
+    annual_days: int = 240
+) -> Tuple[float, float, float, float, float]:
+    """Calculate option price and greeks"""
+    dt = t / n
+
+    option_tree, underlying_tree = generate_tree_head(f, k, r, t, v, cp, n)
+    option_tree_vega, underlying_tree_vega = generate_tree_head(f, k, r, t, v * 1.001, cp, n)
+
+    # Price
+    price = option_tree[0, 0]
+
+    # Delta
+    option_price_change = option_tree[0, 1] - option_tree[1, 1]
+    underlying_price_change = underlying_tree[0, 1] - underlying_tree[1, 1]
+    delta = option_price_change / underlying_price_change * f * 0.01
+
+    # Gamma
+    gamma_delta_1 = (option_tree[0, 2] - option_tree[1, 2]) / \
+        (underlying_tree[0, 2] - underlying_tree[1, 2])
+    gamma_delta_2 = (option_tree[1, 2] - option_tree[2, 2]) / \
+        (underlying_tree[1, 2] - underlying_tree[2, 2])
+    _gamma = (gamma_delta_1 - gamma_delta_2) / \
+        (0.5 * (underlying_tree[0, 2] - underlying_tree[2, 2]))
+    gamma = _gamma * f ** 2 * 0.0001
+
+    # Theta
+    theta = (option_tree[1, 2] - option_tree[0, 0]) / (2 * dt * annual_days)
+
+    # Vega
+    vega = (option_tree_vega[0, 0] - option_tree[0, 0]) / (0.001 * v * 100)
+
+    return price, delta, gamma, theta, vega
+
+
+@njit(cache = True, error_model = 'numpy')
+def calculate_impv_raw(
+    price: float,
+    f: float,
+    k: float,
+    r: float,
+    t: float,
+    cp: int,
+    n: int = DEFAULT_STEP
+) -> float:
+    """Calculate option implied volatility, not rounded"""
+    # Check option price must be position and meets minimum value (exercise value)
+    if price <= 0:
+        return 0.0
+    if not ((cp == 1 and price > (f - k)) or (cp == -1 and price > (k - f))):
+        return 0.0
+
+    # Calculate implied volatility with Newton's method
+    v = 0.3     # Initial guess of volatility
+
+    for i in range(50):
+        # Caculate option price and vega with current guess
+        p = calculate_price(f, k, r, t, v, cp, n)
+        vega = (calculate_price(f, k, r, t, v * 1.001, cp, n) - p) / (v * 0.001)
+
+        # Break loop if vega too close to 0
+        if not vega:
+            break
+
+        # Calculate error value
+        dx = (price - p) / vega
+
+        # Check if error value meets requirement
+        if abs(dx) < 0.00001:
+            break
+
+        # Calculate guessed implied volatility of next round
+        v += dx
+
+        # Check new volatility to be non-negative
+        if v <= 0:
+            return 0.0
+
+    return v
+
+
+@njit(cache = True, error_model = 'numpy')
+def calculate_impv(
+    price: float,
+    f: float,
+    k: float,
+    r: float,
+    t: float,
+    cp: int,
+    n: int = DEFAULT_STEP
+) -> float:
+    """Calculate option implied volatility"""
+    # Round to 4 decimal places
+    return round(calculate_impv_raw(price, f, k, r, t, cp, n), 4)
+
+
+@njit(cache = True, error_model = 'numpy', parallel = True)
+def calculate_price_kernel(f, k, r, t, v, cp, n, price):
+    for i in prange(f.shape[0]):
+        price[i] = calculate_price(f[i], k[i], r[i], t[i], v[i], int(cp[i]), n)
+
+
+@njit(cache = True, error_model = 'numpy', parallel = True)
+def calculate_greeks_kernel(f, k, r, t, v, cp, n, annual_days, greeks):
+    for i in prange(f.shape[0]):
+        greeks[i, 0], greeks[i, 1], greeks[i, 2], greeks[i, 3], greeks[i, 4] = \
+            calculate_greeks(f[i], k[i], r[i], t[i], v[i], int(cp[i]), n, annual_days)
+
+
+@njit(cache = True, error_model = 'numpy', parallel = True)
+def calculate_impv_kernel(price, f, k, r, t, cp, n, v):
+    for i in prange(price.shape[0]):
+        v[i] = calculate_impv_raw(price[i], f[i], k[i], r[i], t[i], int(cp[i]), n)
+
+
+def to_arrays(*args):
+    """Broadcast the inputs to contiguous float arrays of the same shape, the
+    broadcasted ones are copied as numba does not take the read only views"""
+    arrays = [np.atleast_1d(np.asarray(x, dtype = float)) for x in args]
+    shape = np.broadcast_shapes(*[x.shape for x in arrays])
+    return [np.ascontiguousarray(np.broadcast_to(x, shape)) if x.shape != shape
+            else np.ascontiguousarray(x) for x in arrays]
+
+
+def calculate_price_batch(f, k, r, t, v, cp, n: int = DEFAULT_STEP) -> np.ndarray:
+    """Calculate option price of arrays in parallel by the jit kernel"""
+    args = to_arrays(f, k, r, t, v, cp)
+    price = np.empty(args[0].shape[0])
+    calculate_price_kernel(*args, n, price)
+    return price
+
+
+def calculate_greeks_batch(f, k, r, t, v, cp, n: int = DEFAULT_STEP,
+                           annual_days: int = 240) -> np.ndarray:
+    """Calculate option price and greeks of arrays in parallel by the jit
+    kernel, as a GREEKS_DTYPE array"""
+    args = to_arrays(f, k, r, t, v, cp)
+    greeks = np.empty((args[0].shape[0], 5))
+    calculate_greeks_kernel(*args, n, annual_days, greeks)
+    return greeks.view(GREEKS_DTYPE)[:, 0]
+
+
+def calculate_impv_batch(price, f, k, r, t, cp, n: int = DEFAULT_STEP) -> np.ndarray:
+    """Calculate option implied volatility of arrays in parallel by the jit kernel"""
+    args = to_arrays(price, f, k, r, t, cp)
+    v = np.empty(args[0].shape[0])
+    calculate_impv_kernel(*args, n, v)
+    # Round to 4 decimal places
+    return np.round(v, 4)
@@ -0,0 +1,292 @@
+from math import log, pow, sqrt, exp, erf
+from typing import Tuple
+import numpy as np
+
+from numba import njit, prange
+
+
+# Result of calculate_greeks_batch
+GREEKS_DTYPE = np.dtype([
+    ('price', float),
+    ('delta', float),
+    ('gamma', float),
+    ('theta', float),
+    ('vega', float)
+])
+
+
+@njit(cache = True, error_model = 'numpy')
+def cdf(x: float) -> float:
+    return 0.5 * (1 + erf(x / sqrt(2.0)))
+
+
+@njit(cache = True, error_model = 'numpy')
+def pdf(x: float) -> float:
+    # 1 / sqrt(2 * 3.1416) = 0.3989422804014327
+    return exp(- pow(x, 2) * 0.5) * 0.3989422804014327
+
+
+@njit(cache = True, error_model = 'numpy')
+def calculate_d1(
+    s: float,
+    k: float,
+    r: float,
+    t: float,
+    v: float
+) -> float:
+    """Calculate option D1 value"""
+    return (log(s / k) + (r + 0.5 * pow(v, 2)) * t) / (v * sqrt(t))
+
+
+@njit(cache = True, error_model = 'numpy')
+def calculate_price(
+    s: float,
+    k: float,
+    r: float,
+    t: float,
+    v: float,
+    cp: int,
+    d1: float = 0.0
+) -> float:
+    """Calculate option price"""
+    # Return option space value if volatility not positive
+    if v <= 0:
+        return max(0.0, cp * (s - k))
+
+    if not d1:
+        d1 = calculate_d1(s, k, r, t, v)
+    d2 = d1 - v * sqrt(t)
+
+    return cp * (s * cdf(cp * d1) - k * cdf(cp * d2) * exp(-r * t))
+
+
+@njit(cache = True, error_model = 'numpy')
+def calculate_delta(
+    s: float,
+    k: float,
+    r: float,
+    t: float,
+    v: float,
+    cp: int,
+    d1: float = 0.0
+) -> float:
+    """Calculate option delta"""
+    if v <= 0:
+        return 0.0
+
+    if not d1:
+        d1 = calculate_d1(s, k, r, t, v)
+
+    return cp * cdf(cp * d1) * s * 0.01
+
+
+@njit(cache = True, error_model = 'numpy')
+def calculate_gamma(
+    s: float,
+    k: float,
+    r: float,
+    t: float,
+    v: float,
+    d1: float = 0.0
+) -> float:
+    """Calculate option gamma"""
+    if v <= 0:
+        return 0.0
+
+    if not d1:
+        d1 = calculate_d1(s, k, r, t, v)
+
+    return pdf(d1) / (s * v * sqrt(t)) * pow(s, 2) * 0.0001
+
+
+@njit(cache = True, error_model = 'numpy')
+def calculate_theta(
+    s: float,
+    k: float,
+    r: float,
+    t: float,
+    v: float,
+    cp: int,
+    d1: float = 0.0,
+    annual_days: int = 240
+) -> float:
+    """Calculate option theta"""
+    if v <= 0:
+        return 0.0
+
+    if not d1:
+        d1 = calculate_d1(s, k, r, t, v)
+    d2 = d1 - v * sqrt(t)
+
+    return (-s * pdf(d1) * v / (2 * sqrt(t))
+            - cp * r * k * exp(-r * t) * cdf(cp * d2)) / annual_days
+
+
+@njit(cache = True, error_model = 'numpy')
+def calculate_original_vega(
+    s: float,
+    k: float,
+    r: float,
+    t: float,
+    v: float,
+    d1: float = 0.0
+) -> float:
+    """Calculate option vega"""
+    if v <= 0:
+        return 0.0
+
+    if not d1:
+        d1 = calculate_d1(s, k, r, t, v)
+
+    return s * pdf(d1) * sqrt(t)
+
+
+@njit(cache = True, error_model = 'numpy')
+def calculate_vega(
+    s: float,
+    k: float,
+    r: float,
+    t: float,
+    v: float,
+    d1: float = 0.0
+) -> float:
+    """Calculate option vega(%)"""
+    return calculate_original_vega(s, k, r, t, v, d1) / 100
+
+
+@njit(cache = True, error_model = 'numpy')
+def calculate_greeks(
+    s: float,
+    k: float,
+    r: float,
+    t: float,
+    v: float,
+    cp: int,
+    annual_days: int = 240
+) -> Tuple[float, float, float, float, float]:
+    """Calculate option price and greeks"""
+    # Return option space value if volatility not positive
+    if v <= 0:
+        return max(0.0, cp * (s - k)), 0.0, 0.0, 0.0, 0.0
+
+    d1 = calculate_d1(s, k, r, t, v)
+    price = calculate_price(s, k, r, t, v, cp, d1)
+    delta = calculate_delta(s, k, r, t, v, cp, d1)
+    gamma = calculate_gamma(s, k, r, t, v, d1)
+    theta = calculate_theta(s, k, r, t, v, cp, d1, annual_days)
+    vega = calculate_vega(s, k, r, t, v, d1)
+    return price, delta, gamma, theta, vega
+
+
+@njit(cache = True, error_model = 'numpy')
+def calculate_impv_raw(
+    price: float,
+    s: float,
+    k: float,
+    r: float,
+    t: float,
+    cp: int
+) -> float:
+    """Calculate option implied volatility, not rounded"""
+    # Check option price must be positive and meets minimum value (exercise value)
+    if price <= 0:
+        return 0.0
+    if not ((cp == 1 and price > (s - k) * exp(-r * t)) or
+            (cp == -1 and price > k * exp(-r * t) - s)):
+        return 0.0
+
+    # Calculate implied volatility with Newton's method
+    v = 0.01    # Initial guess of volatility
+
+    for i in range(50):
+        # Caculate option price and vega with current guess, vega takes the
+        # same arguments as calculate_impv to give the same result
+        p = calculate_price(s, k, r, t, v, cp)
+        vega = calculate_original_vega(s, k, r, t, v, cp)
+
+        # Break loop if vega too close to 0
+        if not vega:
+            break
+
+        # Calculate error value
+        dx = (price - p) / vega
+
+        # Check if error value meets requirement
+        if abs(dx) < 0.00001:
+            break
+
+        # Calculate guessed implied volatility of next round
+        v += dx
+
+    # Check end result to be non-negative
+    if v <= 0:
+        return 0.0
+    return v
+
+
+@njit(cache = True, error_model = 'numpy')
+def calculate_impv(
+    price: float,
+    s: float,
+    k: float,
+    r: float,
+    t: float,
+    cp: int
+) -> float:
+    """Calculate option implied volatility"""
+    # Round to 4 decimal places
+    return round(calculate_impv_raw(price, s, k, r, t, cp), 4)
+
+
+@njit(cache = True, error_model = 'numpy', parallel = True)
+def calculate_price_kernel(s, k, r, t, v, cp, price):
+    for i in prange(s.shape[0]):
+        price[i] = calculate_price(s[i], k[i], r[i], t[i], v[i], int(cp[i]))
+
+
+@njit(cache = True, error_model = 'numpy', parallel = True)
+def calculate_greeks_kernel(s, k, r, t, v, cp, annual_days, greeks):
+    for i in prange(s.shape[0]):
+        greeks[i, 0], greeks[i, 1], greeks[i, 2], greeks[i, 3], greeks[i, 4] = \
+            calculate_greeks(s[i], k[i], r[i], t[i], v[i], int(cp[i]), annual_days)
+
+
+@njit(cache = True, error_model = 'numpy', parallel = True)
+def calculate_impv_kernel(price, s, k, r, t, cp, v):
+    for i in prange(price.shape[0]):
+        v[i] = calculate_impv_raw(price[i], s[i], k[i], r[i], t[i], int(cp[i]))
+
+
+def to_arrays(*args):
+    """Broadcast the inputs to contiguous float arrays of the same shape, the
+    broadcasted ones are copied as numba does not take the read only views"""
+    arrays = [np.atleast_1d(np.asarray(x, dtype = float)) for x in args]
+    shape = np.broadcast_shapes(*[x.shape for x in arrays])
+    return [np.ascontiguousarray(np.broadcast_to(x, shape)) if x.shape != shape
+            else np.ascontiguousarray(x) for x in arrays]
+
+
+def calculate_price_batch(s, k, r, t, v, cp) -> np.ndarray:
+    """Calculate option price of arrays in parallel by the jit kernel"""
+    args = to_arrays(s, k, r, t, v, cp)
+    price = np.empty(args[0].shape[0])
+    calculate_price_kernel(*args, price)
+    return price
+
+
+def calculate_greeks_batch(s, k, r, t, v, cp, annual_days: int = 240) -> np.ndarray:
+    """Calculate option price and greeks of arrays in parallel by the jit
+    kernel, as a GREEKS_DTYPE array"""
+    args = to_arrays(s, k, r, t, v, cp)
+    greeks = np.empty((args[0].shape[0], 5))
+    calculate_greeks_kernel(*args, annual_days, greeks)
+    return greeks.view(GREEKS_DTYPE)[:, 0]
+
+
+def calculate_impv_batch(price, s, k, r, t, cp) -> np.ndarray:
+    """Calculate option implied volatility of arrays in parallel by the jit kernel"""
+    args = to_arrays(price, s, k, r, t, cp)
+    v = np.empty(args[0].shape[0])
+    calculate_impv_kernel(*args, v)
+    # Round to 4 decimal places
+    return np.round(v, 4)
@@ -12,8 +12,14 @@ pyrecalc_siv=
 recalc_siv=
 pyscp=
 scp=
+pyrebuild=
+rebuild=
+pysolver=
+solver=
+pyrecalc_index=
+recalc_index=
 
-while getopts "m:iprc" opt; do
+while getopts "m:iprcbs:x" opt; do
     case ${opt} in
         m)
             mode=$OPTARG
@@ -34,6 +40,18 @@ while getopts "m:iprc" opt; do
             pyscp='--scp=True'
             scp='-c'
             ;;
+        b)
+            pyrebuild='--rebuild_state=True'
+            rebuild='-b'
+            ;;
+        s)
+            pysolver="--iv_solver=$OPTARG"
+            solver="-s $OPTARG"
+            ;;
+        x)
+            pyrecalc_index='--recalculate_index=True'
+            recalc_index='-x'
+            ;;
         *)
             echo 'unknown argument. '
     esac
@@ -44,7 +62,7 @@ case "$mode" in
         if [ -f ./$PID ]; then
             echo "$SERVICE_NAME is started, please use the restart option. "
         else
-            nohup python3 ./options_monitor.py $pyimm $pypush $pyrecalc_siv $pyscp 2>&1 &
+            nohup python3 ./options_monitor.py $pyimm $pypush $pyrecalc_siv $pyscp $pyrebuild $pysolver $pyrecalc_index 2>&1 &
             echo $! > ./$PID
             echo "==== start $SERVICE_NAME ===="
         fi
@@ -57,7 +75,7 @@ case "$mode" in
     restart)
         $0 -m stop
         sleep 2
-        $0 -m start $imm $push $recalc_siv $scp
+        $0 -m start $imm $push $recalc_siv $scp $rebuild $solver $recalc_index
         ;;
     *)
         echo "Usage: bash start_monitor.sh -m [start|stop|restart]"
@@ -3,27 +3,190 @@
 import unittest as ut
 
 from options_monitor.data_ref import \
-    INDEX_KEY, TOTAL_ROW_KEY, IV_NAME, PRODUCT_ID_NAME, PRODUCT_GROUP_NAME, \
-    S_PRICE_NAME, U_PRICE_NAME, CLOSE_PRICE_NAME, VOLUME_NAME, REMAIN_DAYS_NAME
+    INDEX_KEY, TOTAL_ROW_KEY, IV_NAME, PRODUCT_ID_NAME, PRODUCT_GROUP_NAME, OPTION_TYPE_NAME, \
+    S_PRICE_NAME, U_PRICE_NAME, CLOSE_PRICE_NAME, VOLUME_NAME, REMAIN_DAYS_NAME, OPEN_INTEREST_NAME, \
+    SYNC_DATA_MODE, OPEN_PRICE_NAME, HIGH_PRICE_NAME, LOW_PRICE_NAME, HV_YZ_NAME
 from options_monitor.remote_data import \
-    calculate_iv, calculate_siv_by_volumes, calculate_siv_by_turnovers, calculate_siv_by_remaind_days
+    calculate_iv, calculate_siv_by_volumes, calculate_siv_by_turnovers, calculate_siv_by_remaind_days, \
+    calculate_iv_incremental, get_iv_seeds, get_iv_guesses, split_by_dates, calculate_index, \
+    remote_data_fac, fill_total_keys, sort_by_dates
+from options_monitor.data_manager import SHFEDataManager
 from options_monitor.utilities_options import \
-    calc_iv, fill_the_date, get_expiry_date, oc_mgr, calc_remained_days, \
-    OPTIONS_TYPE_CALL, OPTIONS_TYPE_PUT
+    calc_iv, calc_iv_batch, fill_the_date, fill_the_dates, get_expiry_date, oc_mgr, calc_remained_days, \
+    OPTIONS_TYPE_CALL, OPTIONS_TYPE_PUT, IVSolverMode, ExpiryDatesManager, EXPIRY_DATE_PRODUCTS, \
+    expiry_mgr
+from options_monitor.iv_cache import IVCache, IV_CACHE_DIR, MODEL_NAME
+from pricing import black_76, black_scholes, binomial_tree, barone_adesi_whaley, \
+    implied_volatility
 import pandas as pd
 import numpy as np
+import os, tempfile
+try:
+    from pricing.numba_model import black_76_numba, black_scholes_numba, binomial_tree_numba
+except ImportError:
+    black_76_numba = black_scholes_numba = binomial_tree_numba = None
 pd.set_option('mode.chained_assignment', None)
 
 
 #----------------------------------------------------------------------
 class TestOptionPrice(ut.TestCase):
 
+    #----------------------------------------------------------------------
+    def setUp(self):
+        """the expiry dates looked up by the tests are saved in a temporary
+        directory instead of the data root"""
+        self.expiry_dir = tempfile.TemporaryDirectory()
+        self.expiry_state = (expiry_mgr.path, expiry_mgr.dates, expiry_mgr.saved)
+        expiry_mgr.path = os.path.join(self.expiry_dir.name, os.path.basename(expiry_mgr.path))
+        expiry_mgr.dates, expiry_mgr.saved = None, 0
+
+    #----------------------------------------------------------------------
+    def tearDown(self):
+        """restore the expiry dates manager"""
+        expiry_mgr.path, expiry_mgr.dates, expiry_mgr.saved = self.expiry_state
+        self.expiry_dir.cleanup()
+
     #----------------------------------------------------------------------
     def testIV(self):
         current = '2021-01-25'
         iv, rdays = oc_mgr.calc_iv_and_rdays('IO2106-P-5600', 320, 5640, current)
         self.assertEqual(24.52, iv * 100)
 
+    #----------------------------------------------------------------------
+    def testIVBatch(self):
+        """the batch solver must give the same iv as the scalar one"""
+        gids = ['IO', 'IO', 'ZC', 'ZC', 'ZC', 'ZC', 'cu']
+        o_prices = [350.6, 1155, 6.4, 55, 0.2, 0, 2220]
+        u_prices = [5569.78, 5569.78, 770.8, 770.8, 770.8, 770.8, 58810]
+        s_prices = [5400, 4400, 810, 810, 780, 780, 57000]
+        days = [148, 333, 15, 15, 1, 15, 32]
+        otypes = [OPTIONS_TYPE_CALL, OPTIONS_TYPE_CALL, OPTIONS_TYPE_CALL,
+                  OPTIONS_TYPE_PUT, OPTIONS_TYPE_CALL, OPTIONS_TYPE_PUT, OPTIONS_TYPE_CALL]
+        ivs = calc_iv_batch(np.array(gids), np.array(o_prices), np.array(u_prices),
+                            np.array(s_prices), np.array(days), np.array(otypes))
+        expected = list(map(calc_iv, gids, o_prices, u_prices, s_prices, days, otypes))
+        self.assertEqual(expected, ivs.tolist())
+
+    #----------------------------------------------------------------------
+    def testGreeksBatch(self):
+        """the batch greeks must be the same as the scalar ones"""
+        s = np.array([5569.78, 5569.78, 58810, 390])
+        k = np.array([5400, 5600, 60000, 396])
+        t = np.array([148, 148, 32, 63]) / 365
+        v = np.array([0.19, 0.25, 0.17, 0.18])
+        cp = np.array([1, -1, -1, 1])
+        for model in [black_76, black_scholes]:
+            greeks = model.calculate_greeks_batch(s, k, 0.03, t, v, cp)
+            for idx in range(s.shape[0]):
+                expected = model.calculate_greeks(s[idx], k[idx], 0.03, t[idx], v[idx], cp[idx])
+                np.testing.assert_allclose(expected, greeks[idx].tolist())
+            # option space value for volatility not positive
+            greeks = model.calculate_greeks_batch(s, k, 0.03, t, 0, cp)
+            self.assertEqual([0, 0, 0, 0], greeks['delta'].tolist())
+            self.assertEqual([169.78, 30.22, 1190, 0], np.round(greeks['price'], 2).tolist())
+
+    #----------------------------------------------------------------------
+    def testBinomialTreeBatch(self):
+        """the batch tree must be the same as the scalar one"""
+        f = np.array([770.8, 770.8, 58810, 8170])
+        k = np.array([810, 810, 60000, 8100])
+        t = np.array([15, 15, 32, 77]) / 365
+        v = np.array([0.41, 0.41, 0.17, 0.22])
+        cp = np.array([1, -1, -1, -1])
+        greeks = binomial_tree.calculate_greeks_batch(f, k, 0.12, t, v, cp)
+        for idx in range(f.shape[0]):
+            expected = binomial_tree.calculate_greeks(f[idx], k[idx], 0.12, t[idx], v[idx], cp[idx])
+            np.testing.assert_allclose(expected, greeks[idx].tolist(), rtol = 1e-9)
+        # the same as the whole tree of generate_tree before the rolling buffer
+        golden = [(11.357018055008448, 2.221865512671059, 0.3211640937881244,
+                   -1.1193652299783923, 0.5655956920659642),
+                  (50.42260191232914, -5.464681807835018, 0.32246585790095006,
+                   -1.104386126147241, 0.565985251225832),
+                  (1875.7119188417512, -377.2566949640337, 44.63823662135748,
+                   -25.940072473564467, 61.963380909179136),
+                  (292.4686671342961, -35.80090959525379, 3.2340803542419496,
+                   -3.115844609628398, 14.838481966375058)]
+        for expected, values in zip(golden, greeks.tolist()):
+            np.testing.assert_allclose(expected, values, rtol = 1e-9)
+        option_tree, underlying_tree = binomial_tree.generate_tree(770.8, 810, 0.12, 0.1, 0.4, 1, 4)
+        self.assertEqual((5, 5), option_tree.shape)
+        option_head, underlying_head = binomial_tree.generate_tree_head(770.8, 810, 0.12, 0.1, 0.4, 1, 4)
+        np.testing.assert_allclose(option_head, option_tree[:3, :3], rtol = 1e-12)
+        np.testing.assert_allclose(underlying_head, underlying_tree[:3, :3], rtol = 1e-12)
+        # the head of the tree is enough for a short tree
+        self.assertAlmostEqual(binomial_tree.calculate_price(770.8, 810, 0.12, 0.1, 0.4, 1, 1),
+                               binomial_tree.calculate_price_batch(
+                                   f[:1], k[:1], np.array([0.12]), np.array([0.1]),
+                                   np.array([0.4]), cp[:1], 1)[0])
+
+    #----------------------------------------------------------------------
+    @ut.skipUnless(black_76_numba, 'numba not installed')
+    def testNumbaModels(self):
+        """the numba models must be the same as the numpy batch ones"""
+        s = np.array([5569.78, 5569.78, 770.8, 770.8, 58810])
+        k = np.array([5400, 4400, 810, 810, 57000])
+        t = np.array([148, 333, 15, 15, 32]) / 365
+        v = np.array([0.19, 0.25, 0.41, 0.41, 0.17])
+        cp = np.array([1, -1, 1, -1, 1])
+        for model, jit_model in [(black_76, black_76_numba),
+                                 (black_scholes, black_scholes_numba),
+                                 (binomial_tree, binomial_tree_numba)]:
+            prices = jit_model.calculate_price_batch(s, k, 0.03, t, v, cp)
+            np.testing.assert_allclose(model.calculate_price_batch(s, k, 0.03, t, v, cp), prices)
+            greeks = jit_model.calculate_greeks_batch(s, k, 0.03, t, v, cp)
+            expected = model.calculate_greeks_batch(s, k, 0.03, t, v, cp)
+            for name in expected.dtype.names:
+                np.testing.assert_allclose(expected[name], greeks[name], rtol = 1e-9)
+            ivs = jit_model.calculate_impv_batch(prices, s, k, 0.03, t, cp)
+            self.assertEqual(model.calculate_impv_batch(prices, s, k, 0.03, t, cp).tolist(),
+                             ivs.tolist())
+            self.assertEqual([jit_model.calculate_impv(prices[idx], s[idx], k[idx], 0.03, t[idx], cp[idx])
+                              for idx in range(s.shape[0])], ivs.tolist())
+
+    #----------------------------------------------------------------------
+    def testBaroneAdesiWhaley(self):
+        """the approximation must be close to the binomial tree"""
+        f = np.array([770.8, 770.8, 58810, 58810, 8170])
+        k = np.array([810, 810, 57000, 60000, 8100])
+        t = np.array([15, 15, 32, 32, 77]) / 365
+        v = np.array([0.41, 0.41, 0.17, 0.17, 0.22])
+        cp = np.array([1, -1, 1, -1, -1])
+        result = barone_adesi_whaley.compare_with_binomial_tree(f, k, 0.12, t, v, cp, 200)
+        self.assertLess(result['max_relative_error'], 0.005)
+        # american price is never under the european one
+        for idx in range(f.shape[0]):
+            price = barone_adesi_whaley.calculate_price(f[idx], k[idx], 0.12, t[idx], v[idx], cp[idx])
+            self.assertGreaterEqual(price, black_76.calculate_price(f[idx], k[idx], 0.12, t[idx], v[idx], cp[idx]))
+            self.assertEqual(round(v[idx], 4), barone_adesi_whaley.calculate_impv(
+                price, f[idx], k[idx], 0.12, t[idx], cp[idx]))
+        # deep in the money put is exercised at once
+        self.assertEqual(200, barone_adesi_whaley.calculate_price(600, 800, 0.12, 0.5, 0.2, -1))
+        # out of the money put must not diverge
+        self.assertEqual(0.5983, barone_adesi_whaley.calculate_impv(
+            10.7737, 1896.148, 1285.47, 0.12, 66.16 / 365, -1))
+
+    #----------------------------------------------------------------------
+    def testIVRational(self):
+        """the rational guess solver must recover the volatility in a few steps"""
+        s = np.array([5569.78, 5569.78, 58810, 390, 770.8])
+        k = np.array([5400, 4400, 60000, 396, 900])
+        t = np.array([148, 333, 32, 63, 15]) / 365
+        v = np.array([0.19, 0.25, 0.17, 0.18, 0.6])
+        cp = np.array([1, -1, -1, 1, 1])
+        for model in [black_76, black_scholes, binomial_tree, barone_adesi_whaley]:
+            price = model.calculate_price_batch(s, k, 0.03, t, v, cp)
+            ivs, iterations = model.calculate_impv_rational_batch(price, s, k, 0.03, t, cp)
+            np.testing.assert_allclose(v, ivs, atol = 0.0001)
+            self.assertTrue(((iterations > 0) & (iterations < 10)).all())
+        # no solution under the exercise value, failure for a price beyond the max volatility
+        self.assertEqual((0, 0), black_76.calculate_impv_rational(100, 5569.78, 5400, 0.03, 0.4, 1))
+        self.assertEqual((0, implied_volatility.FAILED_ITERATIONS),
+                         black_76.calculate_impv_rational(5600, 5569.78, 5400, 0.03, 0.4, 1))
+        # warm start from the last volatility
+        price = black_scholes.calculate_price(390, 396, 0.03, 0.17, 0.22, 1)
+        self.assertEqual((0.22, 1), black_scholes.calculate_impv_rational(
+            price, 390, 396, 0.03, 0.17, 1, v0 = 0.22))
+
     #----------------------------------------------------------------------
     def testSIV(self):
         """"""
@@ -58,6 +221,174 @@ class TestOptionPrice(ut.TestCase):
         self.assertEqual(0.298, df2.iloc[-1][IV_NAME])
         df2 = calculate_siv_by_turnovers(df2)
         self.assertEqual(0.309, df2.iloc[-1][IV_NAME])
+        # no weight when all the strikes are too far from the underlying
+        df3 = df[df[PRODUCT_ID_NAME].isin(['cu2105C40', TOTAL_ROW_KEY])]
+        df3[S_PRICE_NAME] = 60.
+        for calculate in [calculate_siv_by_volumes, calculate_siv_by_turnovers,
+                          calculate_siv_by_remaind_days]:
+            self.assertTrue(np.isnan(calculate(df3.copy()).iloc[-1][IV_NAME]))
+
+    #----------------------------------------------------------------------
+    def testCalculateIndex(self):
+        """the index is the close weighted by the open interest of each date and group"""
+        df = pd.DataFrame([['2021-01-04', 'cu2102', 'cu', 100., 10],
+                           ['2021-01-04', 'cu2103', 'cu', 110., 30],
+                           ['2021-01-04', TOTAL_ROW_KEY, 'cu', 100., 10],
+                           ['2021-01-04', 'al2102', 'al', 50., 0],
+                           ['2021-01-04', TOTAL_ROW_KEY, 'al', 50., 0],
+                           ['2021-01-05', 'cu2102', 'cu', 101., 20],
+                           ['2021-01-05', 'cu2103', 'cu', 104., 10],
+                           ['2021-01-05', TOTAL_ROW_KEY, 'cu', 101., 20]],
+                          columns = [INDEX_KEY, PRODUCT_ID_NAME, PRODUCT_GROUP_NAME,
+                                     CLOSE_PRICE_NAME, OPEN_INTEREST_NAME])
+        df.set_index(INDEX_KEY, inplace = True)
+        df_all = calculate_index(df.copy())
+        totals = df_all[df_all[PRODUCT_ID_NAME] == TOTAL_ROW_KEY][CLOSE_PRICE_NAME]
+        self.assertEqual([107.5, 102.0], totals[~np.isnan(totals)].tolist())
+        # no open interest
+        self.assertTrue(np.isnan(totals.iloc[1]))
+        self.assertEqual(df[CLOSE_PRICE_NAME][df[PRODUCT_ID_NAME] != TOTAL_ROW_KEY].tolist(),
+                         df_all[CLOSE_PRICE_NAME][df_all[PRODUCT_ID_NAME] != TOTAL_ROW_KEY].tolist())
+        # a nan close makes the group nan as np.average, not weighted as 0
+        df_nan = df.copy()
+        df_nan.iloc[0, df_nan.columns.get_loc(CLOSE_PRICE_NAME)] = np.nan
+        df_nan = calculate_index(df_nan)
+        totals = df_nan[df_nan[PRODUCT_ID_NAME] == TOTAL_ROW_KEY][CLOSE_PRICE_NAME]
+        self.assertTrue(np.isnan(totals.iloc[0]))
+        self.assertEqual(102.0, totals.iloc[2])
+
+    #----------------------------------------------------------------------
+    def testIndexRange(self):
+        """the open, high and low of the index are weighted as the close, so the
+        range based hv of the total rows can be analyzed"""
+        rng = np.random.default_rng(3)
+        size = 60
+        dates = pd.bdate_range('2021-01-04', periods = size).strftime('%Y-%m-%d')
+        close = 50000 * np.exp(np.cumsum(rng.normal(0, 0.015, (size, 2)), axis = 0))
+        rows = []
+        for i, date in enumerate(dates):
+            for j, pid in enumerate(['cu2102', 'cu2103']):
+                c = close[i, j]
+                rows.append([date, pid, 'cu_f', c * 0.995, c * 1.01, c * 0.99, c, 10 * (j + 1)])
+        # the not traded contract has no open, high and low
+        rows[-1][3:6] = [0, 0, 0]
+        df = pd.DataFrame(rows, columns = [INDEX_KEY, PRODUCT_ID_NAME, PRODUCT_GROUP_NAME,
+                                           OPEN_PRICE_NAME, HIGH_PRICE_NAME, LOW_PRICE_NAME,
+                                           CLOSE_PRICE_NAME, OPEN_INTEREST_NAME])
+        df.set_index(INDEX_KEY, inplace = True)
+        df = calculate_index(fill_total_keys(df))
+        totals = df[df[PRODUCT_ID_NAME] == TOTAL_ROW_KEY]
+        first = df.loc[dates[0]]
+        self.assertAlmostEqual(np.round((first[HIGH_PRICE_NAME][0] * 10 + first[HIGH_PRICE_NAME][1] * 20) / 30, 3),
+                               totals[HIGH_PRICE_NAME][0], 6)
+        # the not traded one is not weighted
+        self.assertGreater(totals[LOW_PRICE_NAME][-1], 0.9 * totals[CLOSE_PRICE_NAME][-1])
+        self.assertTrue((totals[HIGH_PRICE_NAME] >= totals[[OPEN_PRICE_NAME, CLOSE_PRICE_NAME]].max(axis = 1)).all())
+        self.assertTrue((totals[LOW_PRICE_NAME] <= totals[[OPEN_PRICE_NAME, CLOSE_PRICE_NAME]].min(axis = 1)).all())
+        analyzed = SHFEDataManager().analyze_products([totals.copy()])[0]
+        self.assertTrue(np.isfinite(analyzed[HV_YZ_NAME].iloc[-1]))
+        self.assertTrue(0.1 < analyzed[HV_YZ_NAME].iloc[-1] < 0.5)
+
+    #----------------------------------------------------------------------
+    def testIVIncremental(self):
+        """the incremental iv must be the same as the one solved from scratch"""
+        rows = [['2020-11-04', 'cu2103C30', 30, 33, 4.5],
+                ['2020-11-04', 'cu2103C35', 35, 33, 1.5],
+                ['2020-11-04', 'cu2105C35', 35, 33, 2.5],
+                ['2020-11-05', 'cu2103C30', 30, 33.5, 4.8],
+                ['2020-11-05', 'cu2103C35', 35, 33.5, 1.6],
+                ['2020-11-05', 'cu2103C40', 40, 33.5, 0.3],
+                ['2020-11-05', 'cu2105C35', 35, 33.5, 2.7]]
+        df = pd.DataFrame(rows, columns = [INDEX_KEY, PRODUCT_ID_NAME, S_PRICE_NAME,
+                                           U_PRICE_NAME, CLOSE_PRICE_NAME])
+        df.set_index(INDEX_KEY, inplace = True)
+        df[PRODUCT_GROUP_NAME] = 'cu'
+        # the new listed contract starts from the nearest strike's
+        seeds = get_iv_seeds(calculate_iv(df.iloc[:3].copy()))
+        self.assertEqual(seeds[IV_NAME].tolist()[1], get_iv_guesses(df.iloc[3:], seeds)[2])
+        expected = calculate_iv(df.copy(), solver_mode = IVSolverMode.RATIONAL)[IV_NAME].tolist()
+        self.assertEqual(expected, calculate_iv_incremental(df.copy())[IV_NAME].tolist())
+        # the solvers without the warm start ignore the seeds
+        self.assertEqual(calculate_iv(df.iloc[3:].copy(), solver_mode = IVSolverMode.NEWTON)[IV_NAME].tolist(),
+                         calculate_iv(df.iloc[3:].copy(), seeds = seeds,
+                                      solver_mode = IVSolverMode.NEWTON)[IV_NAME].tolist())
+
+    #----------------------------------------------------------------------
+    def testSolverMode(self):
+        """the solver mode is passed down to the remote data and its cache"""
+        remote = remote_data_fac.create('shfe_o', SYNC_DATA_MODE.HTTP_DOWNLOAD_SHFE_OPTIONS,
+                                        None, None, IVSolverMode.RATIONAL)
+        self.assertEqual(IVSolverMode.RATIONAL, remote.solver_mode)
+        keys = IVCache(remote.get_iv_cache_path(), remote.solver_mode).get_keys(
+            pd.DataFrame({PRODUCT_ID_NAME: ['cu2103C30'], CLOSE_PRICE_NAME: [4.5],
+                          U_PRICE_NAME: [33]}, index = ['2020-11-04']))
+        self.assertTrue(keys[MODEL_NAME][0].endswith(IVSolverMode.RATIONAL.name))
+
+    #----------------------------------------------------------------------
+    def testIVCache(self):
+        """only the contracts with changed inputs are solved again"""
+        rows = [['2020-11-04', 'cu2103C30', 30, 33, 4.5],
+                ['2020-11-04', 'cu2103C35', 35, 33, 1.5],
+                ['2020-11-04', TOTAL_ROW_KEY, 0, 0, 0]]
+        df = pd.DataFrame(rows, columns = [INDEX_KEY, PRODUCT_ID_NAME, S_PRICE_NAME,
+                                           U_PRICE_NAME, CLOSE_PRICE_NAME])
+        df.set_index(INDEX_KEY, inplace = True)
+        with tempfile.TemporaryDirectory() as path:
+            path = os.path.join(path, IV_CACHE_DIR, 'cu_o.csv')
+            cache = IVCache(path)
+            expected = calculate_iv(df.copy(), cache = cache)[IV_NAME].tolist()
+            cache.save()
+            cache = IVCache(path)
+            df[CLOSE_PRICE_NAME] = [4.5, 1.6, 0]
+            keys = cache.get_keys(df.iloc[:2])
+            ivs, _rdays = cache.lookup(keys)
+            self.assertEqual(expected[0], ivs[0])
+            self.assertTrue(np.isnan(ivs[1]))
+            df = calculate_iv(df, cache = cache)
+            self.assertEqual(expected[0], df[IV_NAME].iloc[0])
+            self.assertEqual(1, cache.updates[0].shape[0])
+            # the changed remained days miss the cache
+            cache.df[REMAIN_DAYS_NAME] += 1
+            ivs, _rdays = cache.lookup(keys)
+            self.assertTrue(np.isnan(ivs).all())
+
+    #----------------------------------------------------------------------
+    def testSplitByDates(self):
+        """the chunks keep the trade dates whole and in order"""
+        dates = ['2020-11-02'] * 3 + ['2020-11-03'] * 2 + ['2020-11-04'] * 3
+        df = pd.DataFrame({PRODUCT_ID_NAME: range(8)}, index = pd.Index(dates, name = INDEX_KEY))
+        chunks = split_by_dates(df, 2)
+        self.assertEqual([['2020-11-02'], ['2020-11-03', '2020-11-04']],
+                         [chunk.index.unique().tolist() for chunk in chunks])
+        self.assertTrue(pd.concat(chunks).equals(df))
+        self.assertEqual(3, len(split_by_dates(df, 10)))
+        # the rows of a date not together are still in one chunk, the order of
+        # the chunks is the one of sort_by_dates
+        df = df.iloc[[0, 3, 1, 5, 4, 2, 6, 7]]
+        chunks = split_by_dates(df, 2)
+        self.assertEqual([['2020-11-02'], ['2020-11-03', '2020-11-04']],
+                         [chunk.index.unique().tolist() for chunk in chunks])
+        self.assertEqual([0, 1, 2, 3, 4, 5, 6, 7], pd.concat(chunks)[PRODUCT_ID_NAME].tolist())
+        self.assertTrue(pd.concat(chunks).equals(df.take(sort_by_dates(df))))
+
+    #----------------------------------------------------------------------
+    def testParseTheContracts(self):
+        """the bulk parser must be the same as the one by one parser"""
+        contracts = ['IO2106C5000', 'IO2106-C-5000', 'm2201-P-3900', 'TA101C3300',
+                     'IO2106C5000', 'SR801C4500', 'cu2103C57000', 'm2201-P-3900']
+        df = oc_mgr.parse_the_contracts(contracts)
+        self.assertEqual([oc_mgr.parse_the_contract(contract) for contract in contracts],
+                         list(zip(df['name'], df['full_date'], df[OPTION_TYPE_NAME],
+                                  df[S_PRICE_NAME])))
+        self.assertEqual(['2106', '2106', '2201', '101'], df['month'][:4].tolist())
+        self.assertEqual(['IO', 'SR', 'TA', 'cu', 'm'], df['name'].cat.categories.tolist())
+        self.assertEqual(['C', 'P'], df[OPTION_TYPE_NAME].cat.categories.tolist())
+        years, months = ['9', '0', '1', '19', '21', '00', '99'], ['01', '09', '12', '05', '01', '01', '05']
+        for delta in [732, 365 * 80]:
+            self.assertEqual(list(map(lambda y, m: fill_the_date(y, m, delta), years, months)),
+                             fill_the_dates(years, months, delta).tolist())
+        with self.assertRaises(ValueError):
+            oc_mgr.parse_the_contracts(['IO2106C5000', 'IO2106X5000'])
 
 
     #----------------------------------------------------------------------
@@ -129,6 +460,32 @@ class TestOptionPrice(ut.TestCase):
         # test sc
         self.assertEqual('2021-08-13', oc_mgr.get_expiry_date_test('sc2109C440'))
 
+    #----------------------------------------------------------------------
+    def testExpiryDatesTable(self):
+        """the table must give the same expiry dates and persist the expired ones"""
+        with tempfile.TemporaryDirectory() as path:
+            mgr = ExpiryDatesManager(path)
+            names = np.array(['IO', 'IO', 'cu', 'SR', 'ZC', 'cu'])
+            full_dates = np.array(['2021-06-01', '2021-06-01', '2021-03-01',
+                                   '2019-09-01', '2021-05-01', '2021-03-01'])
+            currents = np.array(['2021-01-22', '2021-06-18', '2021-01-22',
+                                 '2019-01-22', '2021-04-06', '2021-02-22'])
+            days = mgr.calc_remained_days_batch(names, full_dates, currents)
+            expected = [calc_remained_days(name, full_date, current) for
+                        name, full_date, current in zip(names, full_dates, currents)]
+            self.assertEqual(expected, days.tolist())
+            self.assertEqual([148, 1, 32], days[:3].tolist())
+            with self.assertRaises(ValueError):
+                mgr.calc_remained_days_batch(names[:1], full_dates[:1], ['2021-06-19'])
+            # the expired ones are loaded by the next run
+            loaded = ExpiryDatesManager(path)
+            loaded.load()
+            self.assertEqual(4, len(loaded.dates))
+            self.assertEqual('2021-06-18', loaded.dates[('IO', '2021-06-01')])
+        # all the products of the table are supported by get_expiry_date
+        for name in EXPIRY_DATE_PRODUCTS:
+            self.assertLess('2021-01-01', get_expiry_date(name, '2021-06-01'))
+
     #----------------------------------------------------------------------
     def testCFFEOptionPrice(self):
         """"""
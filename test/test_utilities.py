@@ -5,6 +5,18 @@ import unittest as ut
 from datetime import datetime
 from options_monitor.data_ref import sse_calendar, DATE_FORMAT, check_date_in
 from options_monitor.utilities_calendar import get_last_trade_dates
+from options_monitor.utilities_hv import calc_percentage, percent_distribution, historical_max_min, \
+    historical_volatilities, append_historical_volatilities, HV_DISTRIBUTION_PERIODS, \
+    range_volatility, RangeEstimator, analyze_hv_panel
+from options_monitor.hv_state import HVState, HVStates
+from options_monitor.data_ref import FUTURES_DTYPES, O_DTYPES
+from options_monitor.utilities import load_futures_by_csv, expand_frame, compact_frame
+from options_monitor.data_store import CSVDataStore, ParquetDataStore, STORE_MODE, \
+    PARQUET_ENABLED, create_data_store, migrate_csv_to_parquet, export_csv, \
+    schema_hash, compact
+import pandas as pd
+import os, tempfile
+import numpy as np
 
 
 #----------------------------------------------------------------------
@@ -31,5 +43,353 @@ class TestUtilities(ut.TestCase):
         self.assertEqual(False, check_date_in('2021-01-10', dates))
 
 
+    def testCalcPercentage(self):
+        """the percentage must be the same as the rolling percent_distribution"""
+        rng = np.random.default_rng(0)
+        for size in [100, 250, 800]:
+            hvs = pd.Series(np.round(rng.uniform(0.1, 0.5, size), 2), name = 'hvm')
+            hvs.iloc[size // 2:size // 2 + 10] = np.nan
+            expected = hvs.rolling(250).apply(lambda rows: percent_distribution(rows))
+            pd.testing.assert_series_equal(expected, calc_percentage(hvs))
+
+
+    def testHistoricalVolatilities(self):
+        """the hv of each window must be the same as the rolling variance"""
+        rng = np.random.default_rng(0)
+        close = pd.Series(3000 * np.exp(np.cumsum(rng.normal(0, 0.015, 600))), name = 'Close')
+        close.iloc[300] = np.nan
+        hvs = historical_volatilities(close, [10, 20, 60, 120, 250])
+        log_close = np.log(close / close.shift(1))
+        for n in [10, 20, 60, 120, 250]:
+            expected = np.sqrt(HV_DISTRIBUTION_PERIODS * log_close.rolling(n).var())
+            np.testing.assert_allclose(expected, hvs[n], rtol = 1e-9)
+        df = append_historical_volatilities(close.to_frame(), {20: 'hvm', 250: 'hvy'})
+        np.testing.assert_array_equal(hvs[20], df['hvm'])
+        np.testing.assert_array_equal(hvs[250], df['hvy'])
+
+
+    def testRangeVolatility(self):
+        """the range based hv must be the same as the rolling formulas"""
+        rng = np.random.default_rng(1)
+        close = 3000 * np.exp(np.cumsum(rng.normal(0, 0.015, 300)))
+        open_ = close * np.exp(rng.normal(0, 0.005, 300))
+        high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, 0.005, 300)))
+        low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, 0.005, 300)))
+        df = pd.DataFrame({'Open': open_, 'High': high, 'Low': low, 'Close': close})
+        df.iloc[100, 0] = np.nan
+        hl = np.log(df['High'] / df['Low'])
+        co = np.log(df['Close'] / df['Open'])
+        n = 20
+        expected = hl.pow(2).rolling(n).mean() / (4 * np.log(2))
+        np.testing.assert_allclose(
+            np.sqrt(HV_DISTRIBUTION_PERIODS * expected),
+            range_volatility(df, n, RangeEstimator.PARKINSON), rtol = 1e-9)
+        expected = (0.5 * hl.pow(2) - (2 * np.log(2) - 1) * co.pow(2)).rolling(n).mean()
+        np.testing.assert_allclose(
+            np.sqrt(HV_DISTRIBUTION_PERIODS * expected),
+            range_volatility(df, n, RangeEstimator.GARMAN_KLASS), rtol = 1e-9)
+        oc = np.log(df['Open'] / df['Close'].shift(1))
+        ho = np.log(df['High'] / df['Open'])
+        lo = np.log(df['Low'] / df['Open'])
+        k = 0.34 / (1.34 + (n + 1) / (n - 1))
+        expected = oc.rolling(n).var() + k * co.rolling(n).var() + \
+            (1 - k) * (ho * (ho - co) + lo * (lo - co)).rolling(n).mean()
+        np.testing.assert_allclose(
+            np.sqrt(HV_DISTRIBUTION_PERIODS * expected),
+            range_volatility(df, n, RangeEstimator.YANG_ZHANG), rtol = 1e-9)
+
+
+    def testHistoricalMaxMin(self):
+        """'-' before the first value, nan is skipped"""
+        df = pd.DataFrame({'hvm': [np.nan, np.nan, 0.2, 0.1, np.nan, 0.5]})
+        historical_max_min(df, 'hvm', 'hmh', 'hml', {2: ('h2h', 'h2l'), 1: ('h1h', 'h1l')})
+        self.assertEqual(['-', '-', 0.2, 0.2, 0.2, 0.5], df['hmh'].tolist())
+        self.assertEqual(['-', '-', 0.2, 0.1, 0.1, 0.1], df['hml'].tolist())
+        self.assertEqual(['-', '-', 0.2, 0.2, 0.1, 0.5], df['h2h'].tolist())
+        self.assertEqual(['-', '-', 0.2, 0.1, 0.1, 0.5], df['h2l'].tolist())
+        self.assertEqual(['-', '-', 0.2, 0.1, '-', 0.5], df['h1h'].tolist())
+        self.assertEqual(['hvm', 'hmh', 'hml', 'h2h', 'h2l', 'h1h', 'h1l'], list(df.columns))
+        df = pd.DataFrame({'hvm': [0.3, 0.1, 0.2]})
+        historical_max_min(df, 'hvm', 'hmh', 'hml')
+        self.assertEqual([0.3, 0.3, 0.3], df['hmh'].tolist())
+        self.assertEqual([0.3, 0.1, 0.1], df['hml'].tolist())
+        # the windows longer than the history are the running ones
+        historical_max_min(df, 'hvm', 'hmh', 'hml', {5: ('h5h', 'h5l')})
+        self.assertEqual(df['hmh'].tolist(), df['h5h'].tolist())
+        self.assertEqual(df['hml'].tolist(), df['h5l'].tolist())
+
+    def testHVPanel(self):
+        """the panel must give the same as analyzing the products one by one"""
+        rng = np.random.default_rng(4)
+        windows = {20: 'hvm', 250: 'hvy'}
+        dfs = []
+        for pid, size in [('cu_f', 700), ('al_f', 300), ('sc_f', 100)]:
+            close = 3000 * np.exp(np.cumsum(rng.normal(0, 0.015, size)))
+            close[size // 2] = np.nan
+            dfs.append(pd.DataFrame({'GroupId': pid, 'Close': close},
+                                    index = [f'd{i:04d}' for i in range(size)]))
+        panel = analyze_hv_panel([df.copy() for df in dfs], windows)
+        for df, analyzed in zip(dfs, panel):
+            append_historical_volatilities(df, windows)
+            df['hvm/y'] = df['hvm'] / df['hvy']
+            df['hmp'] = calc_percentage(df['hvm'])
+            historical_max_min(df, 'hvm', 'hmh', 'hml')
+            pd.testing.assert_frame_equal(df, analyzed, check_names = False)
+
+
+    def testHVState(self):
+        """stepping the state must give the last day of the full analysis"""
+        rng = np.random.default_rng(2)
+        size = 700
+        index = pd.Index([f'd{i:04d}' for i in range(size)], name = 'Date')
+        df = pd.DataFrame({'GroupId': 'cu_f',
+                           'Close': 3000 * np.exp(np.cumsum(rng.normal(0, 0.015, size))),
+                           'iv': rng.uniform(0.1, 0.4, size)}, index = index)
+        df.iloc[500:510, 2] = np.nan
+        df.iloc[650, 1] = np.nan
+        df['Open'] = df['Close'].shift(1) * np.exp(rng.normal(0, 0.005, size))
+        df['High'] = df[['Open', 'Close']].max(axis = 1) * np.exp(np.abs(rng.normal(0, 0.005, size)))
+        df['Low'] = df[['Open', 'Close']].min(axis = 1) * np.exp(-np.abs(rng.normal(0, 0.005, size)))
+        windows = {20: 'hvm', 250: 'hvy'}
+        ranges = {RangeEstimator.YANG_ZHANG: (20, 'hyz', 'hyzp')}
+        def analyze(df):
+            df = df.copy()
+            df['hyz'] = range_volatility(df, 20, RangeEstimator.YANG_ZHANG)
+            df['hyzp'] = calc_percentage(df['hyz'])
+            append_historical_volatilities(df, windows)
+            df['hvm/y'] = df['hvm'] / df['hvy']
+            df['hmp'] = calc_percentage(df['hvm'])
+            historical_max_min(df, 'hvm', 'hmh', 'hml')
+            df['ivp'] = calc_percentage(df['iv'])
+            historical_max_min(df, 'iv', 'ivh', 'ivl')
+            return df
+        columns = ['hvm', 'hvy', 'hvm/y', 'hmp', 'hmh', 'hml', 'iv', 'ivp', 'ivh', 'ivl',
+                   'hyz', 'hyzp']
+        state = HVState.from_history(analyze(df[:400]), windows, ranges)
+        self.assertTrue(state.can_step(df))
+        for end in [401, 520, 655, size]:
+            state.update(df[:end], df['iv'][:end])
+            expected = analyze(df[:end]).iloc[-1]
+            row = state.to_frame().iloc[-1]
+            self.assertEqual(expected.name, row.name)
+            for key in columns:
+                if isinstance(expected[key], str) or np.isnan(expected[key]):
+                    self.assertEqual(str(expected[key]), str(row[key]), key)
+                else:
+                    self.assertAlmostEqual(expected[key], row[key], 9, key)
+        # only the rows of the window are needed, any change in it is found
+        self.assertEqual(df.index[-251], state.start)
+        self.assertTrue(state.can_step(df[df.index >= state.start]))
+        self.assertFalse(state.can_step(df[df.index > state.start]))
+        changed = df.copy()
+        changed.iloc[-100, 1] += 1
+        self.assertFalse(state.can_step(changed))
+        # so is the range of the window
+        changed = df.copy()
+        changed.iloc[-100, changed.columns.get_loc('High')] += 1
+        self.assertFalse(state.can_step(changed))
+        # persisted and loaded
+        with tempfile.TemporaryDirectory() as data_path:
+            path = os.path.join(data_path, 'hv_state', 'test.json')
+            states = HVStates(path)
+            states.set('cu_f', state)
+            states.save()
+            states = HVStates(path)
+            self.assertEqual((state.start, state.date), (states.get_start(), states.get_date()))
+            loaded = states.get('cu_f')
+        self.assertEqual(ranges, loaded.ranges)
+        pd.testing.assert_frame_equal(state.to_frame(), loaded.to_frame())
+        self.assertTrue(loaded.can_step(df))
+        df.iloc[-1, 1] = 1
+        self.assertFalse(loaded.can_step(df))
+
+    def checkDataStore(self, store):
+        """save, append, merge and load of the store"""
+        df = pd.DataFrame({'ProductId': ['cu2102', 'total', 'cu2102', 'total'],
+                           'Close': [1.5, 1.5, 2.5, 2.5], 'OI': [10, 10, 20, 20]},
+                          index = pd.Index(['2020-12-31', '2020-12-31', '2021-01-04', '2021-01-04'],
+                                           name = 'Trade Date'))
+        store.save(df[:2])
+        store.append(df[2:])
+        pd.testing.assert_frame_equal(df, store.load())
+        pd.testing.assert_frame_equal(df[['Close']], store.load(['Close']))
+        day = pd.DataFrame({'ProductId': ['total'], 'Close': [3.5], 'OI': [30]},
+                           index = pd.Index(['2021-01-04'], name = 'Trade Date'))
+        # one row of each date in the merge mode
+        store.save(df[df['ProductId'] == 'total'])
+        merged = store.merge(store.load(), day)
+        self.assertEqual([1.5, 3.5], merged['Close'].tolist())
+        pd.testing.assert_frame_equal(merged, store.load())
+        store.save(df)
+        return df
+
+
+    def testDataStore(self):
+        """the stores must give back what saved"""
+        with tempfile.TemporaryDirectory() as data_path:
+            self.checkDataStore(CSVDataStore(data_path, 'shfe', compact = False))
+            # the existing csv keeps its mode
+            self.assertIsInstance(create_data_store(data_path, 'shfe', STORE_MODE.PARQUET),
+                                  CSVDataStore)
+            self.assertIsInstance(create_data_store(data_path, 'dce', STORE_MODE.CSV),
+                                  CSVDataStore)
+
+
+    def testLoadFuturesByCsv(self):
+        """the csv must be loaded by the dtypes and only the columns asked"""
+        with tempfile.TemporaryDirectory() as data_path:
+            df = self.checkDataStore(CSVDataStore(data_path, 'shfe', compact = False))
+            store = CSVDataStore(data_path, 'shfe', dtypes = FUTURES_DTYPES, compact = False)
+            loaded = store.load()
+            self.assertEqual('category', loaded['ProductId'].dtype.name)
+            self.assertEqual('int64', loaded['OI'].dtype.name)
+            self.assertEqual(['Close'], list(load_futures_by_csv(
+                store.get_local_path(), ['Close', 'Volume'], FUTURES_DTYPES).columns))
+            pd.testing.assert_frame_equal(df, loaded.astype({'ProductId': object}))
+            # the empty values of the int columns are inferred
+            df.iloc[0, 2] = np.nan
+            df.to_csv(store.get_local_path())
+            self.assertTrue(np.isnan(load_futures_by_csv(store.get_local_path(),
+                                                         dtypes = FUTURES_DTYPES)['OI'][0]))
+
+
+    @ut.skipUnless(PARQUET_ENABLED, 'pyarrow is not installed')
+    def testParquetDataStore(self):
+        """the parquet store must give back what saved and migrate the csv"""
+        with tempfile.TemporaryDirectory() as data_path:
+            store = ParquetDataStore(data_path, 'shfe', compact = False)
+            self.checkDataStore(store)
+            self.assertEqual(['2020-12', '2021-01'], store.list_partitions())
+            self.assertIsInstance(create_data_store(data_path, 'shfe'), ParquetDataStore)
+            df = self.checkDataStore(CSVDataStore(data_path, 'dce', compact = False))
+            self.assertEqual(['dce'], migrate_csv_to_parquet(data_path))
+            pd.testing.assert_frame_equal(CSVDataStore(data_path, 'dce').load(),
+                                          ParquetDataStore(data_path, 'dce').load())
+            self.assertEqual(['dce', 'shfe'], export_csv(data_path))
+            pd.testing.assert_frame_equal(store.load(),
+                                          CSVDataStore(data_path, 'shfe', compact = False).load())
+            # the years written before are read, and re-partitioned by the next write
+            store = ParquetDataStore(data_path, 'czce', compact = False)
+            store.partition_length = 4
+            store.save(df[:2])
+            self.assertEqual(['2020'], store.list_partitions())
+            store = ParquetDataStore(data_path, 'czce', compact = False)
+            pd.testing.assert_frame_equal(df[:2], store.load_dates('2020-12-01'))
+            store.append(df[2:])
+            self.assertEqual(['2020-12', '2021-01'], store.list_partitions())
+            pd.testing.assert_frame_equal(df, store.load())
+            self.assertFalse(store.repartition())
+
+
+    def checkDataManifest(self, store):
+        """the last date and the rows of dates by the manifest"""
+        df = self.checkDataStore(store)
+        self.assertEqual('2021-01-04', store.get_last_date())
+        manifest = store.get_manifest()
+        self.assertEqual(4, manifest.rows)
+        self.assertEqual(schema_hash(df.columns), manifest.schema)
+        pd.testing.assert_frame_equal(df[2:], store.load_dates('2021-01-04'))
+        pd.testing.assert_frame_equal(df[:2][['Close']],
+                                      store.load_dates(end = '2021-01-03', columns = ['Close']))
+        self.assertTrue(store.load_dates('2021-01-05').empty)
+        self.assertEqual('2021-01-04', store.drop_last_date())
+        self.assertEqual('2020-12-31', store.get_last_date())
+        pd.testing.assert_frame_equal(df[:2], store.load())
+        store.append(df[2:])
+        self.assertEqual('2021-01-04', store.get_last_date())
+        pd.testing.assert_frame_equal(df, store.load())
+        # the manifest not matching the dataset is rebuilt
+        with open(store.get_manifest_path(), 'w') as f:
+            f.write('{}')
+        self.assertEqual(['2020-12-31', '2021-01-04'], list(store.get_manifest().dates.keys()))
+
+
+    def testDataManifest(self):
+        """the manifest must follow the writes of the csv store"""
+        with tempfile.TemporaryDirectory() as data_path:
+            store = CSVDataStore(data_path, 'shfe', compact = False)
+            self.assertIsNone(store.get_last_date())
+            self.checkDataManifest(store)
+            # written by others
+            store.load()[:2].to_csv(store.get_local_path())
+            self.assertEqual('2020-12-31', store.get_last_date())
+
+
+    @ut.skipUnless(PARQUET_ENABLED, 'pyarrow is not installed')
+    def testParquetDataManifest(self):
+        """the manifest must follow the writes of the parquet store"""
+        with tempfile.TemporaryDirectory() as data_path:
+            self.checkDataManifest(ParquetDataStore(data_path, 'shfe', compact = False))
+
+
+    def checkDataSegments(self, store):
+        """the merges are read over the base and compacted into it"""
+        df = pd.DataFrame({'Close': [1.5, 2.5]},
+                          index = pd.Index(['2020-12-31', '2021-01-04'], name = 'Trade Date'))
+        store.save(df)
+        day1 = pd.DataFrame({'Close': [3.5]}, index = pd.Index(['2021-01-04'], name = 'Trade Date'))
+        day2 = pd.DataFrame({'Close': [4.5]}, index = pd.Index(['2021-01-05'], name = 'Trade Date'))
+        merged = store.merge(store.load(), day1)
+        merged = store.merge(merged, day2)
+        self.assertEqual(2, len(store.list_segments()))
+        self.assertEqual([1.5, 3.5, 4.5], merged['Close'].tolist())
+        pd.testing.assert_frame_equal(merged, store.load())
+        self.assertEqual('2021-01-05', store.get_last_date())
+        pd.testing.assert_frame_equal(merged[1:], store.load_dates('2021-01-01'))
+        self.assertTrue(store.compact())
+        self.assertEqual([], store.list_segments())
+        pd.testing.assert_frame_equal(merged, store.load_base())
+        self.assertEqual('2021-01-05', store.get_last_date())
+        self.assertFalse(store.compact())
+
+
+    def testDataSegments(self):
+        """the segments must be read with the last write wins"""
+        with tempfile.TemporaryDirectory() as data_path:
+            self.checkDataSegments(CSVDataStore(data_path, 'shfe', True))
+            store = CSVDataStore(data_path, 'dce', True)
+            store.merge(None, pd.DataFrame({'Close': [1.5]},
+                                           index = pd.Index(['2021-01-04'], name = 'Trade Date')))
+            self.assertTrue(store.exists())
+            self.assertEqual(['dce'], compact(data_path))
+            self.assertEqual([1.5], store.load_base()['Close'].tolist())
+            if PARQUET_ENABLED:
+                self.checkDataSegments(ParquetDataStore(data_path, 'czce', True))
+
+
+    def testCompactFrame(self):
+        """the compact frame must be widened back to what loaded"""
+        with tempfile.TemporaryDirectory() as data_path:
+            df = self.checkDataStore(CSVDataStore(data_path, 'shfe', compact = False))
+            df['iv'] = [0.2345, 0.0, 0.1, np.nan]
+            df['Volume'] = [1, np.nan, 2, 3]
+            df['rdays'] = [10., 0., 3., 5.]
+            store = CSVDataStore(data_path, 'shfe', dtypes = O_DTYPES)
+            store.save(df)
+            loaded = store.load()
+            self.assertEqual(['category', 'float64', 'int32', 'float32', 'float64', 'int16'],
+                             [dtype.name for dtype in loaded.dtypes])
+            self.assertIs(loaded.index[0], loaded.index[1])
+            # the analytics still compare the trade date by string
+            self.assertEqual(2, (loaded.index > '2021-01-01').sum())
+            store.save(loaded)
+            pd.testing.assert_frame_equal(df, expand_frame(store.load(), O_DTYPES).astype(
+                {'ProductId': object}), check_exact = True)
+            # the written back values are not changed
+            with open(store.get_local_path()) as f:
+                self.assertIn(',0.2345,', f.read())
+            # the iv are written by the decimals, so are the compact ones
+            df['iv'] = [0.23456789, 0.0, 12.3456789, np.nan]
+            store.save(df)
+            loaded = store.load()
+            self.assertEqual('float32', loaded['iv'].dtype.name)
+            self.assertEqual([0.234568, 0.0, 12.345679], expand_frame(loaded)['iv'].tolist()[:3])
+            # the ones not kept by float32 stay in float64, the frame is not changed
+            df['iv'] = [0.234568, 0.0, 123.456789, np.nan]
+            self.assertEqual('float64', compact_frame(df, O_DTYPES)['iv'].dtype.name)
+            self.assertEqual(['object', 'float64', 'int64', 'float64', 'float64', 'float64'],
+                             [dtype.name for dtype in df.dtypes])
+
+
 if __name__ == '__main__':
     ut.main()